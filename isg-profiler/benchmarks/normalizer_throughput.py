@@ -0,0 +1,526 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
+
+"""Throughput and peak memory of quant_normalizer, on synthetic Salmon outputs.
+
+Builds a synthetic reference directory (a gene2refseq list shaped like the
+`Isoform_241003_salmon` index: every gene of `Aves_Mam_mbio_ISGcntl_mnsd.txt` in the
+species of `Amniota398_sp_id.list`, a few isoforms each, some of them mapped to several
+species) and, for each cohort size, `<sample_id>_quant.sf` files listing every isoform of
+the index, with sample metadata over Aves, Mammalia, Marsupialia and other clades.
+
+Each cohort is processed as `quant_normalizer` does, without and with `--per_species`,
+timing every stage:
+
+    load_reference_data   read the reference files and the sample metadata
+    process_samples       summarize the quant.sf file of every sample
+    combine               concatenate the samples (and attach species with --per_species)
+    calculate_isg_scores  ISG_score of every sample (not with --per_species)
+    write_output          per_gene_count.tsv (per_gene_per_species_count.tsv), ISG_score.tsv
+
+Every run is a fresh process, which reports the peak RSS reached at the end of each stage.
+Times are the fastest of `--repeat` runs. A run which fails (e.g. with `--memory_limit_mb`,
+as `--per_species` outputs grow by about 16 MB per sample on the full index) is reported
+with its error and the stages done so far. The time per sample of every stage and its
+scaling exponent (slope of log time against log samples between the smallest and the
+largest cohort; 1 is linear) are printed as well.
+
+Results are compared with a baseline (JSON, see `--baseline`): the script fails (exit
+code 1) when a stage is slower or uses more memory than its baseline by more than
+`--threshold`, ignoring differences below `--min_seconds` and `--min_mb`.
+`--update_baseline` writes the results as the new baseline instead. Baselines depend on
+the machine: record one on the machine used for the comparisons.
+
+Cohorts above `--distinct_files` samples reuse the quant.sf files of the first samples
+(as symbolic links), so that 10000 samples do not need 10000 distinct files (about 7 MB
+each) on disk; these are read from the page cache, unlike a real cohort.
+
+    python benchmarks/normalizer_throughput.py --sizes 10 100 1000
+    python benchmarks/normalizer_throughput.py --update_baseline
+"""
+
+import argparse
+import json
+import math
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from quant_normalizer import __version__
+from quant_normalizer.core.isg_scorer import calculate_isg_scores
+from quant_normalizer.core.sample_processor import process_samples
+from quant_normalizer.io.csv_writer import set_write_jobs
+from quant_normalizer.io.output_writer import write_to_tsv
+from quant_normalizer.io.reference_loader import ReferenceFiles, load_reference_data
+
+REFERENCE_DIR = Path(__file__).resolve().parents[1] / "reference"
+
+STAGES = [
+    "load_reference_data",
+    "process_samples",
+    "combine",
+    "calculate_isg_scores",
+    "write_output",
+]
+
+MODES = {"default": False, "per_species": True}
+"""Runs of each cohort: name and `--per_species`."""
+
+CLADES = {"Aves": 0.4, "Mammalia": 0.4, "Marsupialia": 0.1, "Reptilia": 0.1}
+"""Clade of the synthetic samples and its share."""
+
+BASELINE_PATH = Path(__file__).with_name("normalizer_throughput_baseline.json")
+
+BASELINE_FORMAT_VERSION = 1
+"""Increase when the stages, the synthetic data or the file layout change."""
+
+
+def build_reference(
+    reference_dir: Path,
+    isoforms_per_gene: float = 2.5,
+    shared_fraction: float = 0.02,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Write a reference directory with a synthetic gene2refseq list, and copies of the
+    shipped reference files.
+
+    Each species of `Amniota398_sp_id.list` has 1 + Poisson(`isoforms_per_gene` - 1)
+    isoforms of about 95% of the genes; `shared_fraction` of the isoforms are also mapped
+    to 1 or 2 other species (one gene2refseq row per species, as for identical sequences).
+
+    :return: the gene2refseq list (`Isoform`, `hum_symbol`, `type`, `tax_id`)
+    """
+    rng = np.random.default_rng(seed)
+    reference_dir.mkdir(parents=True, exist_ok=True)
+    for name in [
+        ReferenceFiles.AVES_REM,
+        ReferenceFiles.MARS_REM,
+        ReferenceFiles.AVES_MAM_MBIO_ISG_CNTL_MNSD,
+        ReferenceFiles.SP_ID_LIST,
+    ]:
+        shutil.copy(REFERENCE_DIR / name, reference_dir / name)
+
+    genes = pd.read_csv(REFERENCE_DIR / ReferenceFiles.AVES_MAM_MBIO_ISG_CNTL_MNSD, sep="\t")
+    tax_ids = pd.read_csv(REFERENCE_DIR / ReferenceFiles.SP_ID_LIST, sep="\t")["tax_id"]
+
+    # One row per (species, gene) present, repeated for each isoform
+    species_gene = rng.random((len(tax_ids), len(genes))) < 0.95
+    species_idx, gene_idx = np.nonzero(species_gene)
+    n_isoforms = 1 + rng.poisson(isoforms_per_gene - 1, len(species_idx))
+    species_idx = np.repeat(species_idx, n_isoforms)
+    gene_idx = np.repeat(gene_idx, n_isoforms)
+    prefixes = rng.choice(np.array(["NM_", "XM_"], dtype=object), len(gene_idx), p=[0.2, 0.8])
+    isoforms = prefixes + pd.Series(np.arange(len(gene_idx)) + 100000000).astype(str) + ".1"
+    gene2refseq = pd.DataFrame(
+        {
+            "Isoform": isoforms.to_numpy(),
+            "hum_symbol": genes["hum_symbol"].to_numpy()[gene_idx],
+            "type": genes["type"].to_numpy()[gene_idx],
+            "tax_id": tax_ids.to_numpy()[species_idx],
+        }
+    )
+
+    # Isoforms shared by several species
+    shared = gene2refseq[rng.random(len(gene2refseq)) < shared_fraction]
+    extra = [shared.assign(tax_id=rng.choice(tax_ids.to_numpy(), len(shared))) for _ in range(2)]
+    extra[1] = extra[1][rng.random(len(shared)) < 0.5]
+    gene2refseq = pd.concat([gene2refseq, *extra], ignore_index=True)
+    gene2refseq = gene2refseq.drop_duplicates(["Isoform", "tax_id"]).sort_values(
+        "Isoform", kind="stable"
+    )
+    gene2refseq.to_csv(reference_dir / ReferenceFiles.GENE2REFSEQ, sep="\t", index=False)
+    return gene2refseq
+
+
+def build_cohort(
+    n_samples: int,
+    cohort_dir: Path,
+    gene2refseq: pd.DataFrame,
+    distinct_files: int = 100,
+    seed: int = 0,
+):
+    """
+    Write `sample_metadata.tsv` and the `sf/<sample_id>_quant.sf` files of `n_samples`
+    synthetic samples (see `build_reference`).
+
+    Every quant.sf file lists all isoforms of the index, in index order. Reads go to the
+    isoforms of the host species, scaled by the read depth and (for ISGs) the interferon
+    response of the sample; a few reads are multi-mapped to other species.
+    """
+    rng = np.random.default_rng(seed)
+    sf_dir = cohort_dir / "sf"
+    sf_dir.mkdir(parents=True, exist_ok=True)
+
+    species = pd.read_csv(REFERENCE_DIR / ReferenceFiles.SP_ID_LIST, sep="\t")
+    host = rng.integers(len(species), size=n_samples)
+    sample_ids = [f"SRR{30000000 + i}" for i in range(n_samples)]
+    pd.DataFrame(
+        {
+            "sample_id": sample_ids,
+            "species_host": species["species"].to_numpy()[host],
+            "order_host": [f"Order{h % 40}formes" for h in host],
+            "clade_host": rng.choice(list(CLADES), size=n_samples, p=list(CLADES.values())),
+        }
+    ).to_csv(cohort_dir / "sample_metadata.tsv", sep="\t", index=False)
+
+    index = gene2refseq.drop_duplicates("Isoform")
+    names = index["Isoform"].to_numpy()
+    length = rng.integers(500, 6000, len(index))
+    effective_length = np.maximum(length - 180.0, 1.0)
+    is_isg = (index["type"] == "ISG").to_numpy()
+    level = rng.lognormal(np.where(is_isg, 2.0, 4.0), 1.0)
+    tax_id = index["tax_id"].to_numpy()
+
+    for i, sample_id in enumerate(sample_ids):
+        path = sf_dir / f"{sample_id}_quant.sf"
+        if i >= distinct_files:
+            path.symlink_to(f"{sample_ids[i % distinct_files]}_quant.sf")
+            continue
+        depth = rng.lognormal(0.0, 0.7)
+        response = rng.lognormal(0.0, 1.5)
+        mean = level * depth * np.where(is_isg, response, 1.0)
+        mean = np.where(tax_id == species["tax_id"].iat[host[i]], mean, mean * 0.002)
+        num_reads = np.where(rng.random(len(index)) < 0.6, rng.gamma(1.0, mean), 0.0)
+        rpk = num_reads / effective_length
+        tpm = rpk / max(rpk.sum(), 1e-12) * 1e6
+        pd.DataFrame(
+            {
+                "Name": names,
+                "Length": length,
+                "EffectiveLength": effective_length,
+                "TPM": tpm.round(6),
+                "NumReads": num_reads.round(3),
+            }
+        ).to_csv(path, sep="\t", index=False)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def run_stages(
+    reference_dir: Path,
+    cohort_dir: Path,
+    out_dir: Path,
+    per_species: bool,
+    memory_limit_mb: Optional[int] = None,
+    write_jobs: int = 1,
+) -> dict:
+    """
+    Process a cohort stage by stage, as `quant_normalizer` does (run in a fresh process).
+
+    :param memory_limit_mb: limit of the address space of the process
+    :param write_jobs: `--write_jobs` of `quant_normalizer`
+    :return: `{"stages": {stage: {"seconds": ..., "peak_rss_mb": ...}}}`, and `"error"`
+        if a stage failed
+    """
+    import logging
+
+    logging.disable(logging.INFO)
+    if memory_limit_mb is not None:
+        limit = memory_limit_mb << 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    set_write_jobs(write_jobs)
+    results = {}
+    try:
+        _run_stages(reference_dir, cohort_dir, out_dir, per_species, results)
+    except MemoryError:
+        return {"stages": results, "error": "out of memory"}
+    except Exception as e:
+        return {"stages": results, "error": f"{type(e).__name__}: {e}"}
+    return {"stages": results}
+
+
+def _run_stages(
+    reference_dir: Path, cohort_dir: Path, out_dir: Path, per_species: bool, results: dict
+):
+
+    def stage(name, func):
+        start = time.perf_counter()
+        value = func()
+        results[name] = {"seconds": time.perf_counter() - start, "peak_rss_mb": _peak_rss_mb()}
+        return value
+
+    ref = stage(
+        "load_reference_data",
+        lambda: load_reference_data(reference_dir, cohort_dir / "sample_metadata.tsv", per_species),
+    )
+    sample_dfs = stage(
+        "process_samples",
+        lambda: process_samples(
+            sample_metadata=ref.sample_metadata,
+            gene_info=ref.gene_info,
+            sf_dir=cohort_dir / "sf",
+            aves_neg_genes=ref.aves_neg_genes,
+            mars_neg_genes=ref.mars_neg_genes,
+            gene_mean_sd_list=ref.gene_mean_sd_list,
+            per_species=per_species,
+        ),
+    )
+
+    def combine():
+        df = pd.concat(sample_dfs, ignore_index=True)
+        if per_species:
+            df = df.merge(ref.species_map_df, on="tax_id", how="left")
+        return df
+
+    all_sample_gene_count_df = stage("combine", combine)
+    isg_score_df = None
+    if not per_species:
+        isg_score_df = stage(
+            "calculate_isg_scores",
+            lambda: calculate_isg_scores(all_sample_gene_count_df, ref.sample_metadata),
+        )
+
+    def write_output():
+        name = "per_gene_per_species_count.tsv" if per_species else "per_gene_count.tsv"
+        write_to_tsv(all_sample_gene_count_df, out_dir / name)
+        if isg_score_df is not None:
+            write_to_tsv(isg_score_df, out_dir / "ISG_score.tsv")
+
+    stage("write_output", write_output)
+
+
+def benchmark(n_samples: int, work_dir: Path, gene2refseq: pd.DataFrame, args) -> dict:
+    """`{mode: {"stages": {stage: {"seconds": ..., "peak_rss_mb": ...}}}}` of a cohort."""
+    cohort_dir = work_dir / f"cohort_{n_samples}"
+    build_cohort(n_samples, cohort_dir, gene2refseq, args.distinct_files, args.seed)
+
+    results = {}
+    for mode, per_species in MODES.items():
+        runs = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                runs.append(
+                    executor.submit(
+                        run_stages,
+                        work_dir / "reference",
+                        cohort_dir,
+                        work_dir / "out",
+                        per_species,
+                        args.memory_limit_mb,
+                        args.write_jobs,
+                    ).result()
+                )
+        # Stages done by every run
+        names = [name for name in STAGES if all(name in run["stages"] for run in runs)]
+        results[mode] = {
+            "stages": {
+                name: {
+                    "seconds": min(run["stages"][name]["seconds"] for run in runs),
+                    "peak_rss_mb": max(run["stages"][name]["peak_rss_mb"] for run in runs),
+                }
+                for name in names
+            }
+        }
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            results[mode]["error"] = errors[0]
+    shutil.rmtree(cohort_dir)
+    return results
+
+
+def print_scaling(results: dict):
+    """Time per sample of every stage, and its scaling exponent."""
+    sizes = sorted(results, key=int)
+    print(f"\nms per sample{'':<22}" + "".join(f"{size:>10}" for size in sizes) + "  exponent")
+    for mode in MODES:
+        for name in STAGES:
+            # Cohorts where the stage was done
+            done = [size for size in sizes if name in results[size][mode]["stages"]]
+            if not done:
+                continue
+            seconds = [results[size][mode]["stages"][name]["seconds"] for size in done]
+            per_sample = "".join(
+                f"{seconds[done.index(size)] / int(size) * 1000:10.3f}"
+                if size in done
+                else f"{'-':>10}"
+                for size in sizes
+            )
+            exponent = ""
+            if len(done) > 1 and seconds[0] > 0:
+                exponent = math.log(seconds[-1] / seconds[0]) / math.log(
+                    int(done[-1]) / int(done[0])
+                )
+                exponent = f"{exponent:10.2f}"
+            print(f"{mode + ' ' + name:<35}{per_sample}{exponent}")
+
+
+def machine() -> dict:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "quant_normalizer": __version__,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, min_seconds: float, min_mb: float
+) -> list[str]:
+    """Regressions of `results` (by cohort size and mode) against `baseline`."""
+    regressions = []
+    for size, modes in results.items():
+        for mode, run in modes.items():
+            base_run = baseline.get(size, {}).get(mode, {})
+            # Runs failing in the baseline as well (e.g. out of memory) are not regressions
+            if "error" in run and base_run and "error" not in base_run:
+                regressions.append(f"{size} samples, {mode}: {run['error']}")
+            for name, result in run["stages"].items():
+                base = base_run.get("stages", {}).get(name)
+                if base is None:
+                    continue
+                for key, floor, unit in [
+                    ("seconds", min_seconds, "s"),
+                    ("peak_rss_mb", min_mb, "MB"),
+                ]:
+                    if (
+                        result[key] > base[key] * (1 + threshold)
+                        and result[key] - base[key] > floor
+                    ):
+                        regressions.append(
+                            f"{size} samples, {mode} {name}: {result[key]:.3f} {unit} "
+                            f"(baseline {base[key]:.3f} {unit}, "
+                            f"+{result[key] / base[key] - 1:.0%})"
+                        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000],
+        help="Number of samples of each cohort.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs per cohort and mode; the fastest is kept."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument(
+        "--isoforms_per_gene",
+        type=float,
+        default=2.5,
+        help="Mean number of isoforms of a gene in a species.",
+    )
+    parser.add_argument(
+        "--distinct_files",
+        type=int,
+        default=100,
+        help="Distinct quant.sf files of a cohort; further samples link to them.",
+    )
+    parser.add_argument(
+        "--memory_limit_mb",
+        type=int,
+        default=None,
+        help="Address space limit of each run; a run above it fails with 'out of memory'.",
+    )
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file (JSON).")
+    parser.add_argument(
+        "--update_baseline",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing them.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Maximum relative increase of the time or peak RSS of a stage.",
+    )
+    parser.add_argument(
+        "--min_seconds",
+        type=float,
+        default=0.05,
+        help="Time increases below this are never regressions.",
+    )
+    parser.add_argument(
+        "--min_mb",
+        type=float,
+        default=10.0,
+        help="Peak RSS increases below this are never regressions.",
+    )
+    parser.add_argument(
+        "--write_jobs",
+        type=int,
+        default=1,
+        help="Number of processes formatting the output tables (--write_jobs).",
+    )
+    parser.add_argument("--json_out", default=None, help="Also write the results to this file.")
+    parser.add_argument(
+        "--work_dir", default=None, help="Directory of the synthetic data (default: temporary)."
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="quant_normalizer_bench_", dir=args.work_dir) as d:
+        work_dir = Path(d)
+        gene2refseq = build_reference(
+            work_dir / "reference", args.isoforms_per_gene, seed=args.seed
+        )
+        print(
+            f"Reference: {gene2refseq['Isoform'].nunique()} isoforms, "
+            f"{len(gene2refseq)} gene2refseq rows"
+        )
+        for n_samples in args.sizes:
+            modes = benchmark(n_samples, work_dir, gene2refseq, args)
+            results[str(n_samples)] = modes
+            print(f"{n_samples} samples")
+            for mode, run in modes.items():
+                for name, result in run["stages"].items():
+                    print(
+                        f"  {mode + ' ' + name:<33}{result['seconds']:9.3f} s"
+                        f"{result['peak_rss_mb']:10.1f} MB peak RSS"
+                    )
+                if "error" in run:
+                    print(f"  {mode} failed: {run['error']}")
+    print_scaling(results)
+
+    report = {"format": BASELINE_FORMAT_VERSION, "machine": machine(), "results": results}
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {baseline_path}.")
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline in {baseline_path}; run with --update_baseline.")
+        return
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("format") != BASELINE_FORMAT_VERSION:
+        print(f"{baseline_path}: unsupported baseline format; run with --update_baseline.")
+        return
+    if baseline["machine"] != report["machine"]:
+        print("Warning: the baseline was recorded on another machine or with other versions.")
+
+    regressions = compare(
+        results, baseline["results"], args.threshold, args.min_seconds, args.min_mb
+    )
+    for regression in regressions:
+        print(f"FAIL: {regression}")
+    if not regressions:
+        print(f"No stage regressed by more than {args.threshold:.0%}.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,9 +11,15 @@ FASTQ_DIR=""
 OUTPUT_DIR=""
 SALMON_INDEX_PATH=""
 SALMON_BIN="salmon" # Default to using command in PATH
+SUBSAMPLE=""          # Default is empty (= all reads)
+SUBSAMPLE_MODE="head"
+SUBSAMPLE_SEED=0
+SAMPLE_IDS_FILE=""    # Default is empty (= all samples found)
 
 usage() {
   echo "Usage: $0 --thread <int> --fastq_dir <path> --out_dir <path> --index <path> [--salmon_bin <path>]"
+  echo "       [--subsample <reads> [--subsample_mode <head|random>] [--subsample_seed <int>]]"
+  echo "       [--sample_ids <file>]"
   exit 1
 }
 
@@ -21,7 +27,8 @@ usage() {
 while [[ $# -gt 0 ]]; do
   key="$1"
   case "$key" in
-  --thread | --fastq_dir | --out_dir | --salmon_index | --salmon_bin)
+  --thread | --fastq_dir | --out_dir | --salmon_index | --salmon_bin | --subsample | \
+    --subsample_mode | --subsample_seed | --sample_ids)
     if [[ -z "${2:-}" ]] || [[ "${2:-}" == --* ]]; then
       echo "Error: Argument for $key is missing"
       usage
@@ -33,6 +40,10 @@ while [[ $# -gt 0 ]]; do
     --out_dir) OUTPUT_DIR="$2" ;;
     --salmon_index) SALMON_INDEX_PATH="$2" ;;
     --salmon_bin) SALMON_BIN="$2" ;;
+    --subsample) SUBSAMPLE="$2" ;;
+    --subsample_mode) SUBSAMPLE_MODE="$2" ;;
+    --subsample_seed) SUBSAMPLE_SEED="$2" ;;
+    --sample_ids) SAMPLE_IDS_FILE="$2" ;;
     esac
     shift 2
     ;;
@@ -48,22 +59,212 @@ if [[ -z "$THREAD" ]] || [[ -z "$FASTQ_DIR" ]] || [[ -z "$OUTPUT_DIR" ]] || [[ -
   echo "Error: Missing required arguments."
   usage
 fi
+
+if [[ -n "$SUBSAMPLE" ]]; then
+  if [[ ! "$SUBSAMPLE" =~ ^[1-9][0-9]*$ ]]; then
+    echo "Error: --subsample must be a positive number of reads: ${SUBSAMPLE}"
+    usage
+  fi
+  case "$SUBSAMPLE_MODE" in
+  head) ;;
+  random)
+    if ! command -v seqtk >/dev/null 2>&1; then
+      echo "Error: 'seqtk' is required by --subsample_mode random." >&2
+      exit 1
+    fi
+    ;;
+  *)
+    echo "Error: Unknown subsample mode: ${SUBSAMPLE_MODE}"
+    usage
+    ;;
+  esac
+fi
 # ==================
 
+# Salmon writes the quantification of each sample to ${OUTPUT_DIR}/<ID>/ (quant.sf, run
+# statistics in aux_info/meta_info.json and lib_format_counts.json); TMP_DIR only holds
+# the named pipes and timings of the running sample
 TMP_DIR="${OUTPUT_DIR}_tmp"
 REF="${SALMON_INDEX_PATH}"
+LEDGER="${OUTPUT_DIR}/salmon_ledger.tsv"
+
+# GNU time, to record the peak memory of Salmon (optional)
+TIME_BIN=$(type -P time || true)
+if [[ -n "$TIME_BIN" ]] && ! "$TIME_BIN" -f "%M" -o /dev/null true >/dev/null 2>&1; then
+  TIME_BIN=""
+fi
+
+# Accepted FASTQ file suffixes, in order of preference when a read file exists in several
+FASTQ_SUFFIXES=("cleaned.fastq" "cleaned.fastq.gz" "cleaned.fq.gz" "cleaned.fastq.zst")
+FASTQ_SUFFIX_REGEX='cleaned\.(fastq|fastq\.gz|fq\.gz|fastq\.zst)'
 
 mkdir -p "${OUTPUT_DIR}" "${TMP_DIR}"
 
+# Print the path of "<prefix>.<suffix>" for the first suffix of FASTQ_SUFFIXES found
+find_fastq() {
+  local prefix=$1
+  local suffix
+  for suffix in "${FASTQ_SUFFIXES[@]}"; do
+    if [[ -f "${prefix}.${suffix}" ]]; then
+      echo "${prefix}.${suffix}"
+      return 0
+    fi
+  done
+  return 1
+}
+
+# Print the command decompressing a FASTQ file to stdout, or nothing if Salmon can read the
+# file itself (uncompressed, or gzip without pigz)
+decompress_command() {
+  case "$1" in
+  *.gz)
+    if command -v pigz >/dev/null 2>&1; then
+      echo "pigz -dc"
+    fi
+    ;;
+  *.zst)
+    echo "zstd -dcq"
+    ;;
+  esac
+}
+
+# Write the reads of a FASTQ file to stdout, decompressed and (with --subsample) subsampled
+stream_reads() {
+  local fq=$1
+  local cmd
+  cmd=$(decompress_command "$fq")
+  if [[ -z "$cmd" ]]; then
+    case "$fq" in
+    *.gz) cmd="gzip -dc" ;;
+    *) cmd="cat" ;;
+    esac
+  fi
+
+  if [[ -z "$SUBSAMPLE" ]]; then
+    $cmd "$fq"
+  elif [[ "$SUBSAMPLE_MODE" == "random" ]]; then
+    # Both mates are sampled with the same seed, so that the sampled reads stay paired
+    $cmd "$fq" | seqtk sample -s "$SUBSAMPLE_SEED" - "$SUBSAMPLE"
+  else
+    # 4 lines per FASTQ record
+    $cmd "$fq" | head -n $((SUBSAMPLE * 4))
+  fi
+}
+
+# Pids of the read streams of the current sample
+DECOMPRESS_PIDS=()
+
+# Print the path Salmon reads a FASTQ file from: the file itself, or a named pipe in
+# <tmp_dir> fed by a background stream_reads (no decompressed copy is written)
+fastq_input() {
+  local fq=$1
+  local fifo=$2
+  local cmd
+  cmd=$(decompress_command "$fq")
+  if [[ -z "$cmd" && -z "$SUBSAMPLE" ]]; then
+    echo "$fq"
+    return 0
+  fi
+  if [[ -n "$cmd" ]] && ! command -v "${cmd%% *}" >/dev/null 2>&1; then
+    echo "Error: '${cmd%% *}' is required to read ${fq}." >&2
+    return 1
+  fi
+  mkfifo "$fifo"
+  echo "$fifo"
+}
+
+# Start the read stream of fastq_input (if any); run in the main shell to keep its pid
+start_decompress() {
+  local fq=$1
+  local input=$2
+  if [[ "$input" != "$fq" ]]; then
+    stream_reads "$fq" >"$input" &
+    DECOMPRESS_PIDS+=($!)
+  fi
+}
+
+# Size in bytes of the FASTQ files of a sample (same choice of files as run_salmon)
+sample_bytes() {
+  local ID=$1
+  local fq1 fq2 fq
+  fq1=$(find_fastq "${FASTQ_DIR}/${ID}_1" || true)
+  fq2=$(find_fastq "${FASTQ_DIR}/${ID}_2" || true)
+  if [[ -n "$fq1" && -n "$fq2" ]]; then
+    echo $(($(wc -c <"$fq1") + $(wc -c <"$fq2")))
+  elif fq=$(find_fastq "${FASTQ_DIR}/${ID}"); then
+    echo $(($(wc -c <"$fq")))
+  else
+    echo 0
+  fi
+}
+
+# Current time in seconds (with microseconds on bash >= 5)
+now() {
+  echo "${EPOCHREALTIME:-$(date +%s)}"
+}
+
+# CPU seconds (user + system) of the child processes in the output of `times` (run in the
+# main shell: a command substitution would only report its own children)
+cpu_seconds() {
+  awk 'NR == 2 {
+    for (i = 1; i <= 2; i++) { split($i, t, "m"); s += t[1] * 60 + t[2] }
+    printf "%.2f\n", s
+  }' "$1"
+}
+
+# Print the value of a numeric key of a Salmon JSON file, or NA
+json_number() {
+  local key=$1
+  local file=$2
+  local value=""
+  if [[ -f "$file" ]]; then
+    value=$(sed -nE "s/^[[:space:]]*\"${key}\":[[:space:]]*([-+.eE0-9]+),?[[:space:]]*\$/\1/p" "$file" |
+      head -n 1)
+  fi
+  echo "${value:-NA}"
+}
+
+# Append the row of a sample to the ledger; Salmon statistics are read from its output
+write_ledger_row() {
+  local ID=$1
+  local layout=$2
+  local bytes=$3
+  local wall=$4
+  local cpu=$5
+  local max_rss=$6
+  local status=$7
+  local meta_info="${OUTPUT_DIR}/${ID}/aux_info/meta_info.json"
+  printf '%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' \
+    "${ID}" "${layout}" "${bytes}" \
+    "$(json_number num_processed "$meta_info")" \
+    "$(json_number num_mapped "$meta_info")" \
+    "$(json_number percent_mapped "$meta_info")" \
+    "${wall}" "${cpu}" "${THREAD}" "${max_rss}" "${status}" >>"${LEDGER}"
+}
+
 run_salmon() {
   local ID=$1
+  local SAMPLE_OUT="${OUTPUT_DIR}/${ID}"
   local SAMPLE_TMP="${TMP_DIR}/${ID}"
-  local FQ1="${FASTQ_DIR}/${ID}_1.cleaned.fastq"
-  local FQ2="${FASTQ_DIR}/${ID}_2.cleaned.fastq"
-  local FQ_SINGLE="${FASTQ_DIR}/${ID}.cleaned.fastq"
+  local FQ1 FQ2 FQ_SINGLE
+  FQ1=$(find_fastq "${FASTQ_DIR}/${ID}_1" || true)
+  FQ2=$(find_fastq "${FASTQ_DIR}/${ID}_2" || true)
+  FQ_SINGLE=$(find_fastq "${FASTQ_DIR}/${ID}" || true)
 
   echo ">>> Processing ID: ${ID}"
+  if [[ -n "$SUBSAMPLE" ]]; then
+    echo "Subsample: ${SUBSAMPLE} reads (${SUBSAMPLE_MODE})"
+  fi
+  # A screening quantification linked here (see isg_profiler.sh) is replaced, not written
+  if [[ -L "${SAMPLE_OUT}" ]]; then
+    rm "${SAMPLE_OUT}"
+  fi
   mkdir -p "${SAMPLE_TMP}"
+  DECOMPRESS_PIDS=()
+  local start bytes
+  start=$(now)
+  times >"${SAMPLE_TMP}/times_start"
+  bytes=$(sample_bytes "${ID}")
 
   # common options to be passed to `salmon quant`
   local salmon_opts=(
@@ -71,35 +272,99 @@ run_salmon() {
     "-l" "A"
     "-p" "${THREAD}"
     "--validateMappings"
-    "-o" "${SAMPLE_TMP}"
+    "-o" "${SAMPLE_OUT}"
   )
 
   # different options by fastq file
-  if [[ -f "$FQ1" && -f "$FQ2" ]]; then
-    echo "Mode: Paired-end"
-    salmon_opts+=("-1" "$FQ1" "-2" "$FQ2")
+  local IN1 IN2 IN_SINGLE layout
+  if [[ -n "$FQ1" && -n "$FQ2" ]]; then
+    layout="paired"
+    echo "Mode: Paired-end ($(basename "$FQ1"), $(basename "$FQ2"))"
+    IN1=$(fastq_input "$FQ1" "${SAMPLE_TMP}/reads_1.fastq")
+    IN2=$(fastq_input "$FQ2" "${SAMPLE_TMP}/reads_2.fastq")
+    salmon_opts+=("-1" "$IN1" "-2" "$IN2")
+    start_decompress "$FQ1" "$IN1"
+    start_decompress "$FQ2" "$IN2"
 
-  elif [[ -f "$FQ_SINGLE" ]]; then
-    echo "Mode: Single-end"
-    salmon_opts+=("-r" "$FQ_SINGLE")
+  elif [[ -n "$FQ_SINGLE" ]]; then
+    layout="single"
+    echo "Mode: Single-end ($(basename "$FQ_SINGLE"))"
+    IN_SINGLE=$(fastq_input "$FQ_SINGLE" "${SAMPLE_TMP}/reads.fastq")
+    salmon_opts+=("-r" "$IN_SINGLE")
+    start_decompress "$FQ_SINGLE" "$IN_SINGLE"
 
   else
     echo "Warning: Files for ${ID} not found. Skipping."
+    write_ledger_row "${ID}" "NA" 0 0 0 "NA" 1
+    rm -r "${SAMPLE_TMP}"
     return 1
   fi
 
-  # Call salmon using the variable
-  "${SALMON_BIN}" quant "${salmon_opts[@]}"
+  # Peak memory of Salmon, if GNU time is available
+  local measure=()
+  if [[ -n "$TIME_BIN" ]]; then
+    measure=("$TIME_BIN" "-f" "%M" "-o" "${SAMPLE_TMP}/max_rss_kb")
+  fi
 
-  if [ -f "${SAMPLE_TMP}/quant.sf" ]; then
-    cp "${SAMPLE_TMP}/quant.sf" "${OUTPUT_DIR}/${ID}_quant.sf"
+  # Call salmon using the variable; compressed reads are streamed through named pipes
+  local salmon_status=0
+  ${measure[@]+"${measure[@]}"} "${SALMON_BIN}" quant "${salmon_opts[@]}" || salmon_status=$?
+
+  local pid
+  for pid in ${DECOMPRESS_PIDS[@]+"${DECOMPRESS_PIDS[@]}"}; do
+    if [[ $salmon_status -ne 0 ]]; then
+      # Salmon may have exited without reading the pipe
+      kill "$pid" 2>/dev/null || true
+      wait "$pid" 2>/dev/null || true
+    elif ! wait "$pid"; then
+      echo "Error: Failed to decompress the reads of ${ID}." >&2
+      salmon_status=1
+    fi
+  done
+
+  # Record the sample in the ledger
+  local wall cpu max_rss="NA"
+  wall=$(awk -v a="$start" -v b="$(now)" 'BEGIN { printf "%.2f\n", b - a }')
+  times >"${SAMPLE_TMP}/times_end"
+  cpu=$(awk -v a="$(cpu_seconds "${SAMPLE_TMP}/times_start")" \
+    -v b="$(cpu_seconds "${SAMPLE_TMP}/times_end")" 'BEGIN { printf "%.2f\n", b - a }')
+  if [[ -s "${SAMPLE_TMP}/max_rss_kb" ]]; then
+    # GNU time writes a "Command exited with non-zero status" line first on failure
+    max_rss=$(tail -n 1 "${SAMPLE_TMP}/max_rss_kb")
   fi
+  write_ledger_row "${ID}" "${layout}" "${bytes}" "${wall}" "${cpu}" "${max_rss}" "${salmon_status}"
+  DONE_BYTES=$((DONE_BYTES + bytes))
+
   rm -r "${SAMPLE_TMP}"
+  return "$salmon_status"
+}
+
+# Print the progress of the run and its ETA, extrapolated from the FASTQ bytes processed
+print_progress() {
+  local done_samples=$1
+  local elapsed
+  elapsed=$(awk -v a="$RUN_START" -v b="$(now)" 'BEGIN { print b - a }')
+  awk -v n="$done_samples" -v total="${#IDS[@]}" -v done_bytes="$DONE_BYTES" \
+    -v total_bytes="$TOTAL_BYTES" -v elapsed="$elapsed" '
+    function duration(s) {
+      if (s >= 3600) return sprintf("%dh%02dm", s / 3600, (s % 3600) / 60)
+      return sprintf("%dm%02ds", s / 60, s % 60)
+    }
+    function size(b) {
+      return b >= 1e9 ? sprintf("%.1f GB", b / 1e9) : sprintf("%.1f MB", b / 1e6)
+    }
+    BEGIN {
+      eta = (done_bytes > 0) ? duration(elapsed * (total_bytes - done_bytes) / done_bytes) : "NA"
+      printf "Progress: %d/%d samples, %s of %s in %s (%.1f MB/s), ETA %s\n",
+        n, total, size(done_bytes), size(total_bytes), duration(elapsed),
+        (elapsed > 0) ? done_bytes / 1e6 / elapsed : 0, eta
+    }'
 }
 
 IFS=$'\n'
-IDS=($(find "${FASTQ_DIR}" -maxdepth 1 -name "*.cleaned.fastq" -exec basename {} \; |
-  sed -E 's/(_[12])?\.cleaned\.fastq//' |
+IDS=($(find "${FASTQ_DIR}" -maxdepth 1 \( -name "*.cleaned.fastq" -o -name "*.cleaned.fastq.gz" \
+  -o -name "*.cleaned.fq.gz" -o -name "*.cleaned.fastq.zst" \) -exec basename {} \; |
+  sed -E "s/(_[12])?\.${FASTQ_SUFFIX_REGEX}\$//" |
   sort -u))
 unset IFS
 
@@ -109,6 +374,35 @@ if [ ${#IDS[@]} -eq 0 ]; then
   exit 1
 fi
 
+# Keep the samples listed in --sample_ids (one ID per line)
+if [[ -n "$SAMPLE_IDS_FILE" ]]; then
+  SELECTED_IDS=()
+  for ID in "${IDS[@]}"; do
+    if grep -Fxq -- "${ID}" "${SAMPLE_IDS_FILE}"; then
+      SELECTED_IDS+=("${ID}")
+    fi
+  done
+  if [ ${#SELECTED_IDS[@]} -eq 0 ]; then
+    echo "No sample of '${SAMPLE_IDS_FILE}' to process."
+    exit 0
+  fi
+  IDS=("${SELECTED_IDS[@]}")
+fi
+
+# Ledger of the run: one row per sample
+printf 'sample_id\tlayout\tfastq_bytes\tnum_processed\tnum_mapped\tpercent_mapped\twall_seconds\tcpu_seconds\tthreads\tmax_rss_kb\texit_status\n' \
+  >"${LEDGER}"
+
+TOTAL_BYTES=0
+for ID in "${IDS[@]}"; do
+  TOTAL_BYTES=$((TOTAL_BYTES + $(sample_bytes "${ID}")))
+done
+DONE_BYTES=0
+RUN_START=$(now)
+
+N_DONE=0
 for ID in "${IDS[@]}"; do
   run_salmon "${ID}"
+  N_DONE=$((N_DONE + 1))
+  print_progress "${N_DONE}"
 done
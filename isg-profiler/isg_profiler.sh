@@ -14,6 +14,10 @@ SALMON_INDEX_DIR_NAME="Isoform_241003_salmon"
 SAMPLE_METADATA="input/sample_metadata.tsv"
 PER_SPECIES_OPT="" # Default is empty (= disabled)
 SALMON_BIN="salmon" # Default command
+SCREEN_READS=""     # Default is empty (= screening disabled)
+SCREEN_MODE="head"
+SCREEN_SEED=0
+SCREEN_BAND=""
 # ======================
 
 # Help messages
@@ -21,12 +25,19 @@ usage() {
   echo "Usage: $0 [OPTIONS]"
   echo "Options:"
   echo "  --thread <int>          Number of threads (default: ${THREAD})"
-  echo "  --fastq_dir <path>      Directory containing fastq files (default: ${FASTQ_DIR})"
+  echo "  --fastq_dir <path>      Directory containing fastq files (.fastq, .fastq.gz, .fq.gz or .fastq.zst)"
+  echo "                          (default: ${FASTQ_DIR})"
   echo "  --out_dir <path>        Output directory for salmon (default: ${OUTPUT_DIR})"
   echo "  --ref_dir <path>        Reference directory (default: ${REF_DIR})"
   echo "  --metadata <path>       Sample metadata file (default: ${SAMPLE_METADATA})"
   echo "  --salmon_bin <path>     Path to salmon executable (default: ${SALMON_BIN})"
   echo "  --per_species           (Optional) If set, group counts by hum_symbol and tax_id"
+  echo "  --screen_reads <int>    (Optional) Screen each sample on this many reads first, and"
+  echo "                          re-quantify with all reads only the samples in --screen_band"
+  echo "  --screen_band <lo>,<hi> ISG_score range re-quantified with all reads (e.g. 0.5,2)"
+  echo "  --screen_mode <mode>    Screening reads: head (first reads) or random (seeded, needs"
+  echo "                          seqtk) (default: ${SCREEN_MODE})"
+  echo "  --screen_seed <int>     Seed of --screen_mode random (default: ${SCREEN_SEED})"
   echo "  --help                  Show this help message"
   exit 0
 }
@@ -36,7 +47,8 @@ while [[ $# -gt 0 ]]; do
   key="$1"
   # Error if argument has no value, except help and boolean flags
   case "$key" in
-  --thread | --fastq_dir | --out_dir | --ref_dir | --metadata | --salmon_bin)
+  --thread | --fastq_dir | --out_dir | --ref_dir | --metadata | --salmon_bin | --screen_reads | \
+    --screen_band | --screen_mode | --screen_seed)
     if [[ -z "${2:-}" ]] || [[ "${2:-}" == --* ]]; then
       echo "Error: Argument for $key is missing"
       usage
@@ -49,6 +61,10 @@ while [[ $# -gt 0 ]]; do
     --ref_dir) REF_DIR="$2" ;;
     --metadata) SAMPLE_METADATA="$2" ;;
     --salmon_bin) SALMON_BIN="$2" ;;
+    --screen_reads) SCREEN_READS="$2" ;;
+    --screen_band) SCREEN_BAND="$2" ;;
+    --screen_mode) SCREEN_MODE="$2" ;;
+    --screen_seed) SCREEN_SEED="$2" ;;
     esac
     shift 2
     ;;
@@ -67,6 +83,18 @@ while [[ $# -gt 0 ]]; do
   esac
 done
 
+# Screening band: <low>,<high>
+if [[ -n "${SCREEN_READS}" ]]; then
+  NUMBER_REGEX='^-?[0-9]+(\.[0-9]+)?$'
+  SCREEN_LOW="${SCREEN_BAND%%,*}"
+  SCREEN_HIGH="${SCREEN_BAND#*,}"
+  if [[ ! "${SCREEN_BAND}" == *,* ]] || [[ ! "${SCREEN_LOW}" =~ ${NUMBER_REGEX} ]] ||
+    [[ ! "${SCREEN_HIGH}" =~ ${NUMBER_REGEX} ]]; then
+    echo "Error: --screen_reads requires --screen_band <low>,<high> (e.g. 0.5,2)."
+    usage
+  fi
+fi
+
 # ==== macOS/Bash 3.2 Compatible Path Normalization ====
 get_abs_path() {
   local target="$1"
@@ -146,20 +174,83 @@ if [[ -n "${PER_SPECIES_OPT}" ]]; then
 else
   echo "Per Species Mode:     Disabled"
 fi
+if [[ -n "${SCREEN_READS}" ]]; then
+  echo "Screening:            ${SCREEN_READS} reads (${SCREEN_MODE}), band ${SCREEN_LOW} to ${SCREEN_HIGH}"
+else
+  echo "Screening:            Disabled"
+fi
 echo "====================="
 
 # WARNING
 SALMON_INDEX_PATH="${REF_DIR}/${SALMON_INDEX_DIR_NAME}"
 
-"${BIN_DIR}/run_salmon.sh" \
-  --thread "${THREAD}" \
-  --fastq_dir "${FASTQ_DIR}" \
-  --out_dir "${OUTPUT_DIR}" \
-  --salmon_index "${SALMON_INDEX_PATH}" \
-  --salmon_bin "${SALMON_BIN}"
-
 # quant_normalizer result output directory
 PROFILER_OUT_DIR="${OUTPUT_DIR}/isg_profiler_res"
+SCORE_TIERS="" # Default is empty (= no tier column)
+
+if [[ -n "${SCREEN_READS}" ]]; then
+  SCREEN_DIR="${OUTPUT_DIR}/screening"
+  SCORE_TIERS="${OUTPUT_DIR}/screening_tiers.tsv"
+
+  # Tier 1: ISG_score of every sample on a subsample of its reads
+  "${BIN_DIR}/run_salmon.sh" \
+    --thread "${THREAD}" \
+    --fastq_dir "${FASTQ_DIR}" \
+    --out_dir "${SCREEN_DIR}" \
+    --salmon_index "${SALMON_INDEX_PATH}" \
+    --salmon_bin "${SALMON_BIN}" \
+    --subsample "${SCREEN_READS}" \
+    --subsample_mode "${SCREEN_MODE}" \
+    --subsample_seed "${SCREEN_SEED}"
+
+  python3 -m quant_normalizer \
+    --reference_dir "${REF_DIR}" \
+    --sample_metadata "${SAMPLE_METADATA}" \
+    --sf_dir "${SCREEN_DIR}" \
+    --out_dir "${SCREEN_DIR}/isg_profiler_res"
+
+  # Samples scored inside the band (or without a score) are re-quantified with all reads
+  awk -F '\t' -v low="${SCREEN_LOW}" -v high="${SCREEN_HIGH}" '
+    NR == 1 {
+      for (i = 1; i <= NF; i++) if ($i == "ISG_score") col = i
+      print "sample_id\ttier"
+      next
+    }
+    {
+      in_band = $col == "" || $col == "NaN" || ($col + 0 >= low + 0 && $col + 0 <= high + 0)
+      print $1 "\t" (in_band ? "full" : "screening")
+    }
+  ' "${SCREEN_DIR}/isg_profiler_res/ISG_score.tsv" >"${SCORE_TIERS}"
+
+  awk -F '\t' 'NR > 1 && $2 == "full" { print $1 }' "${SCORE_TIERS}" >"${SCREEN_DIR}/full_ids.txt"
+  echo "Screening: $(wc -l <"${SCREEN_DIR}/full_ids.txt" | tr -d ' ') sample(s) in the band."
+
+  # Samples outside the band keep their screening quantification, linked (not copied)
+  mkdir -p "${OUTPUT_DIR}"
+  awk -F '\t' 'NR > 1 && $2 == "screening" { print $1 }' "${SCORE_TIERS}" |
+    while IFS= read -r ID; do
+      if [[ -d "${SCREEN_DIR}/${ID}" ]]; then
+        rm -rf "${OUTPUT_DIR:?}/${ID}"
+        ln -s "screening/${ID}" "${OUTPUT_DIR}/${ID}"
+      fi
+    done
+
+  # Tier 2: all reads of the samples in the band
+  "${BIN_DIR}/run_salmon.sh" \
+    --thread "${THREAD}" \
+    --fastq_dir "${FASTQ_DIR}" \
+    --out_dir "${OUTPUT_DIR}" \
+    --salmon_index "${SALMON_INDEX_PATH}" \
+    --salmon_bin "${SALMON_BIN}" \
+    --sample_ids "${SCREEN_DIR}/full_ids.txt"
+else
+  "${BIN_DIR}/run_salmon.sh" \
+    --thread "${THREAD}" \
+    --fastq_dir "${FASTQ_DIR}" \
+    --out_dir "${OUTPUT_DIR}" \
+    --salmon_index "${SALMON_INDEX_PATH}" \
+    --salmon_bin "${SALMON_BIN}"
+fi
 
 # NOTE: ${PER_SPECIES_OPT} is intentionally unquoted to allow it to be empty
 python3 -m quant_normalizer \
@@ -167,4 +258,6 @@ python3 -m quant_normalizer \
   --sample_metadata "${SAMPLE_METADATA}" \
   --sf_dir "${OUTPUT_DIR}" \
   --out_dir "${PROFILER_OUT_DIR}" \
+  ${SCORE_TIERS:+--score_tiers "${SCORE_TIERS}"} \
+  --write_jobs "${THREAD}" \
   ${PER_SPECIES_OPT}
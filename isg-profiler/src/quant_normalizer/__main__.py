@@ -9,8 +9,15 @@ import sys
 def main():
     """Run the ISG-Profiler python CLI.
 
-    This invokes the main function from cli.py.
+    This invokes the main function from cli.py, or from build_reference.py for
+    `quant_normalizer build-reference`.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == "build-reference":
+        from .build_reference import main as run_build_reference
+
+        run_build_reference(sys.argv[2:])
+        return
+
     try:
         from .cli import main as run_pipeline
     except ImportError as e:
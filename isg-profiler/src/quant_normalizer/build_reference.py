@@ -0,0 +1,356 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
+
+"""`quant_normalizer build-reference`: recompute `Aves_Mam_mbio_ISGcntl_mnsd.txt`.
+
+The per-gene mean and SD of `normalized_count` are computed in a single pass over the
+quant.sf files of a cohort (normalized as by `quant_normalizer`) or over `per_gene_count.tsv`
+files. Samples can be split over processes (`--jobs`) and over machines (`--shard i/N`
+with `--partial_out`), and the partial statistics merged afterwards (`--merge`).
+"""
+
+import argparse
+import logging
+import math
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from quant_normalizer import __version__
+from quant_normalizer.core.reference_stats import GENE_COLS, GeneStats
+from quant_normalizer.core.sample_processor import (
+    find_quant_files,
+    normalize_gene_counts,
+    read_quant_file,
+)
+from quant_normalizer.io.output_writer import write_to_tsv
+from quant_normalizer.io.reference_loader import ReferenceFiles, load_reference_data
+from quant_normalizer.utils.logger import parse_args_as_log_level, setup_logger
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_PER_BATCH = 256
+"""Samples normalized before their values are added to the statistics."""
+
+PER_GENE_COUNT_CHUNK_ROWS = 1_000_000
+"""Rows of a per_gene_count.tsv file read at once."""
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse `i/N` (shard i of N, 0 <= i < N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"expected 0 <= i < N, got {value!r}")
+    return index, count
+
+
+def in_shard(sample_ids: pd.Series, shard: Optional[tuple[int, int]]) -> pd.Series:
+    """Whether each sample belongs to `shard` (by CRC32 of its ID, stable across runs)."""
+    if shard is None:
+        return pd.Series(True, index=sample_ids.index)
+    index, count = shard
+    return sample_ids.map(lambda sample_id: zlib.crc32(str(sample_id).encode()) % count == index)
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    """Parse arguments"""
+    parser = argparse.ArgumentParser(
+        prog="quant_normalizer build-reference",
+        description="ISG Profiler: compute the per-gene mean and SD of normalized counts "
+        "(Aves_Mam_mbio_ISGcntl_mnsd.txt) from a cohort.",
+    )
+
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+
+    parser.add_argument(
+        "--reference_dir",
+        required=False,
+        default=None,
+        help="Directory containing reference files (needed with --sf_dir).",
+    )
+    parser.add_argument(
+        "--sample_metadata",
+        required=False,
+        default=None,
+        help="Path to sample metadata table (TSV) of the cohort: sample_id and clade_host. "
+        "Needed with --sf_dir and --group_by; with --per_gene_count, only its samples are used.",
+    )
+    parser.add_argument(
+        "--sf_dir",
+        required=False,
+        default=None,
+        help="Directory containing the Salmon output of each sample (as for quant_normalizer).",
+    )
+    parser.add_argument(
+        "--per_gene_count",
+        nargs="+",
+        default=[],
+        help="per_gene_count.tsv files written by quant_normalizer (not --per_species).",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        default=[],
+        help="Partial statistics files written with --partial_out, to merge.",
+    )
+    parser.add_argument(
+        "--group_by",
+        choices=["clade_host"],
+        default=None,
+        help="Compute the statistics per group of samples, written to <out_dir>/<group>/.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="i/N: use only shard i of N of the samples (0-based, by sample_id).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes.",
+    )
+    parser.add_argument(
+        "--partial_out",
+        required=False,
+        default=None,
+        help="Write the partial statistics to this file, for --merge.",
+    )
+    parser.add_argument(
+        "--out_dir",
+        required=False,
+        default=None,
+        help=f"Directory to write {ReferenceFiles.AVES_MAM_MBIO_ISG_CNTL_MNSD} to.",
+    )
+
+    parser.add_argument(
+        "--log_level",
+        choices=["info", "debug", "warning"],
+        default="info",
+        help="Log level",
+    )
+
+    args = parser.parse_args(argv)
+
+    if not (args.sf_dir or args.per_gene_count or args.merge):
+        parser.error("one of --sf_dir, --per_gene_count or --merge is required")
+    if args.sf_dir and not (args.reference_dir and args.sample_metadata):
+        parser.error("--sf_dir requires --reference_dir and --sample_metadata")
+    if args.group_by and (args.sf_dir or args.per_gene_count) and not args.sample_metadata:
+        parser.error("--group_by requires --sample_metadata")
+    if not (args.out_dir or args.partial_out):
+        parser.error("one of --out_dir or --partial_out is required")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    reference_dir = Path(args.reference_dir) if args.reference_dir else None
+    sample_metadata_path = Path(args.sample_metadata) if args.sample_metadata else None
+    sf_dir = Path(args.sf_dir) if args.sf_dir else None
+    per_gene_count_paths = [Path(path) for path in args.per_gene_count]
+    partial_paths = [Path(path) for path in args.merge]
+    group_cols = [args.group_by] if args.group_by else []
+    partial_out = Path(args.partial_out) if args.partial_out else None
+    out_dir = Path(args.out_dir) if args.out_dir else None
+
+    log_level = args.log_level
+
+    return (
+        reference_dir,
+        sample_metadata_path,
+        sf_dir,
+        per_gene_count_paths,
+        partial_paths,
+        group_cols,
+        args.shard,
+        args.jobs,
+        partial_out,
+        out_dir,
+        log_level,
+    )
+
+
+def quant_file_stats(
+    samples: list[tuple[str, str]],
+    quant_files: dict[str, Path],
+    gene_info: pd.DataFrame,
+    aves_neg_genes: set[str],
+    mars_neg_genes: set[str],
+    group_cols: list[str],
+) -> GeneStats:
+    """
+    Statistics of the normalized counts of the quant.sf files of `samples`.
+
+    :param samples: sample_id and clade_host of each sample
+    :param quant_files: output of `find_quant_files`
+    """
+    stats = GeneStats(group_cols)
+    batch = []
+    for sample_id, clade_host in samples:
+        sf_path = quant_files.get(sample_id)
+        sf_data = read_quant_file(sf_path) if sf_path is not None else None
+        if sf_data is None:
+            logger.warning(f"No quant.sf file of {sample_id} was found.")
+            continue
+
+        counts = normalize_gene_counts(
+            sf_data, clade_host, gene_info, aves_neg_genes, mars_neg_genes
+        )
+        counts["clade_host"] = clade_host
+        batch.append(counts)
+        if len(batch) == SAMPLES_PER_BATCH:
+            stats.add(pd.concat(batch, ignore_index=True))
+            batch = []
+    if batch:
+        stats.add(pd.concat(batch, ignore_index=True))
+    return stats
+
+
+def per_gene_count_stats(
+    path: Path,
+    clade_hosts: Optional[dict[str, str]],
+    shard: Optional[tuple[int, int]],
+    group_cols: list[str],
+) -> GeneStats:
+    """
+    Statistics of the normalized counts of a per_gene_count.tsv file, read in chunks.
+
+    :param clade_hosts: clade_host of each sample to use (None: all samples)
+    :raises ValueError: if the file was written with --per_species
+    """
+    columns = pd.read_csv(path, sep="\t", nrows=0).columns
+    if "tax_id" in columns:
+        raise ValueError(f"{path} holds per-species counts (--per_species), not per-gene counts.")
+
+    stats = GeneStats(group_cols)
+    chunks = pd.read_csv(
+        path,
+        sep="\t",
+        usecols=["sample_id", *GENE_COLS, "normalized_count"],
+        dtype={"sample_id": str},
+        chunksize=PER_GENE_COUNT_CHUNK_ROWS,
+    )
+    for chunk in chunks:
+        if clade_hosts is not None:
+            chunk = chunk.loc[chunk["sample_id"].isin(clade_hosts.keys())].copy()
+            chunk["clade_host"] = chunk["sample_id"].map(clade_hosts)
+        stats.add(chunk.loc[in_shard(chunk["sample_id"], shard)])
+    logger.info(f"Processed {path}")
+    return stats
+
+
+def _run(tasks: list[tuple], jobs: int, group_cols: list[str]) -> GeneStats:
+    """Run (function, *args) tasks in `jobs` processes and merge their statistics in order."""
+    stats = GeneStats(group_cols)
+    if jobs == 1 or len(tasks) <= 1:
+        for func, *args in tasks:
+            stats.merge(func(*args))
+        return stats
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(func, *args) for func, *args in tasks]
+        for future in futures:
+            stats.merge(future.result())
+    return stats
+
+
+def build_reference(
+    reference_dir: Optional[Path],
+    sample_metadata_path: Optional[Path],
+    sf_dir: Optional[Path],
+    per_gene_count_paths: list[Path],
+    partial_paths: list[Path],
+    group_cols: list[str],
+    shard: Optional[tuple[int, int]] = None,
+    jobs: int = 1,
+) -> GeneStats:
+    """
+    Statistics of the normalized counts of the samples of `sf_dir` and `per_gene_count_paths`,
+    merged with the partial statistics of `partial_paths`.
+
+    :raises ValueError: if a partial statistics file is not grouped by `group_cols`
+    """
+    sample_metadata = None
+    if sample_metadata_path is not None:
+        sample_metadata = pd.read_csv(sample_metadata_path, sep="\t", dtype={"sample_id": str})
+        sample_metadata = sample_metadata.drop_duplicates("sample_id")
+
+    tasks = []
+    if sf_dir is not None:
+        ref = load_reference_data(reference_dir, sample_metadata_path, per_species=False)
+        quant_files = find_quant_files(sf_dir)
+        samples = sample_metadata.loc[in_shard(sample_metadata["sample_id"], shard)]
+        samples = list(samples[["sample_id", "clade_host"]].itertuples(index=False, name=None))
+        logger.info(f"{len(samples)} samples in {sf_dir}")
+        # Several tasks per process, for the load balance
+        size = max(1, math.ceil(len(samples) / (jobs * 4)))
+        for start in range(0, len(samples), size):
+            tasks.append(
+                (
+                    quant_file_stats,
+                    samples[start : start + size],
+                    quant_files,
+                    ref.gene_info,
+                    ref.aves_neg_genes,
+                    ref.mars_neg_genes,
+                    group_cols,
+                )
+            )
+
+    clade_hosts = None
+    if sample_metadata is not None:
+        clade_hosts = dict(zip(sample_metadata["sample_id"], sample_metadata["clade_host"]))
+    for path in per_gene_count_paths:
+        tasks.append((per_gene_count_stats, path, clade_hosts, shard, group_cols))
+
+    stats = _run(tasks, jobs, group_cols)
+    for path in partial_paths:
+        stats.merge(GeneStats.read(path))
+    return stats
+
+
+def main(argv: Optional[list[str]] = None):
+    (
+        reference_dir,
+        sample_metadata_path,
+        sf_dir,
+        per_gene_count_paths,
+        partial_paths,
+        group_cols,
+        shard,
+        jobs,
+        partial_out,
+        out_dir,
+        log_level,
+    ) = parse_args(argv)
+    setup_logger(None, level=parse_args_as_log_level(log_level))
+
+    stats = build_reference(
+        reference_dir=reference_dir,
+        sample_metadata_path=sample_metadata_path,
+        sf_dir=sf_dir,
+        per_gene_count_paths=per_gene_count_paths,
+        partial_paths=partial_paths,
+        group_cols=group_cols,
+        shard=shard,
+        jobs=jobs,
+    )
+
+    if partial_out is not None:
+        stats.write(partial_out)
+    if out_dir is not None:
+        for group in stats.groups():
+            write_to_tsv(
+                stats.to_reference(group),
+                out_dir.joinpath(*group) / ReferenceFiles.AVES_MAM_MBIO_ISG_CNTL_MNSD,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,9 @@ from pathlib import Path
 import pandas as pd
 
 from quant_normalizer import __version__
-from quant_normalizer.core.isg_scorer import calculate_isg_scores
+from quant_normalizer.core.isg_scorer import add_score_tiers, calculate_isg_scores
 from quant_normalizer.core.sample_processor import process_samples
+from quant_normalizer.io.csv_writer import set_write_jobs
 from quant_normalizer.io.output_writer import write_to_tsv
 from quant_normalizer.io.reference_loader import load_reference_data
 from quant_normalizer.utils.logger import parse_args_as_log_level, setup_logger
@@ -41,7 +42,9 @@ def parse_args():
     parser.add_argument(
         "--sf_dir",
         required=True,
-        help="Directory containing Salmon quant.sf files (named as <sample_id>_quant.sf).",
+        help="Directory containing the Salmon output of each sample, <sample_id>/quant.sf "
+        "(as written by run_salmon.sh), or <sample_id>_quant.sf files. "
+        "quant.sf files may be compressed (.gz, .bz2, .xz, .zst).",
     )
     parser.add_argument(
         "--out_dir",
@@ -54,6 +57,20 @@ def parse_args():
         help="If set, group counts by both hum_symbol and tax_id and attach species. "
         "ISG_score will NOT be computed in this mode.",
     )
+    parser.add_argument(
+        "--score_tiers",
+        required=False,
+        default=None,
+        help="TSV of sample_id and tier (written by the screening mode of isg_profiler.sh). "
+        "If set, a tier column is added to ISG_score.tsv.",
+    )
+    parser.add_argument(
+        "--write_jobs",
+        type=int,
+        default=1,
+        help="Number of processes formatting large output tables. "
+        "Outputs are identical to a single-process run.",
+    )
 
     parser.add_argument(
         "--log_level",
@@ -63,21 +80,44 @@ def parse_args():
     )
 
     args = parser.parse_args()
+    if args.write_jobs < 1:
+        parser.error("--write_jobs must be a positive integer.")
 
     reference_dir = Path(args.reference_dir)
     sample_metadata_path = Path(args.sample_metadata)
     sf_dir = Path(args.sf_dir)
     out_dir = Path(args.out_dir)
     per_species = args.per_species
+    score_tiers_path = Path(args.score_tiers) if args.score_tiers else None
+    write_jobs = args.write_jobs
 
     log_level = args.log_level
 
-    return (reference_dir, sample_metadata_path, sf_dir, out_dir, per_species, log_level)
+    return (
+        reference_dir,
+        sample_metadata_path,
+        sf_dir,
+        out_dir,
+        per_species,
+        score_tiers_path,
+        write_jobs,
+        log_level,
+    )
 
 
 def main():
-    (reference_dir, sample_metadata_path, sf_dir, out_dir, per_species, log_level) = parse_args()
+    (
+        reference_dir,
+        sample_metadata_path,
+        sf_dir,
+        out_dir,
+        per_species,
+        score_tiers_path,
+        write_jobs,
+        log_level,
+    ) = parse_args()
     logger = setup_logger(None, level=parse_args_as_log_level(log_level))
+    set_write_jobs(write_jobs)
     out_dir.mkdir(parents=True, exist_ok=True)
     ref = load_reference_data(reference_dir, sample_metadata_path, per_species)
 
@@ -134,6 +174,12 @@ def main():
         logger.debug("per_species mode: skipped to generate ISG_score.tsv")
     else:
         isg_score_df = calculate_isg_scores(all_sample_gene_count_df, ref.sample_metadata)
+        if score_tiers_path is not None:
+            if not score_tiers_path.exists():
+                raise FileNotFoundError(f"Score tiers file not found: {score_tiers_path}")
+            isg_score_df = add_score_tiers(
+                isg_score_df, pd.read_csv(score_tiers_path, sep="\t", dtype=str)
+            )
 
         # Save ISG scores
         write_to_tsv(
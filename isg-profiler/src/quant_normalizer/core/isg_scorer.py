@@ -63,3 +63,30 @@ def calculate_isg_scores(
     )
 
     return isg_score_df
+
+
+def add_score_tiers(isg_score_df: DataFrame, score_tiers: DataFrame) -> DataFrame:
+    """
+    Adds the 'tier' column: the quantification which produced each ISG score.
+
+    In the screening mode of isg_profiler.sh, samples are first quantified on a subsample
+    of their reads ('screening'), and the samples scored inside the uncertainty band are
+    quantified again with all reads ('full').
+
+    :param isg_score_df: DataFrame returned by calculate_isg_scores.
+    :type isg_score_df: DataFrame
+    :param score_tiers: DataFrame of the tier of each sample.
+        **Required columns:** 'sample_id', 'tier'.
+    :type score_tiers: DataFrame
+    :return: isg_score_df with a 'tier' column after 'ISG_score' (empty for samples
+        missing from score_tiers).
+    :rtype: DataFrame
+    """
+    tier_map = dict(zip(score_tiers["sample_id"].astype(str), score_tiers["tier"]))
+    isg_score_df = isg_score_df.copy()
+    isg_score_df.insert(
+        isg_score_df.columns.get_loc("ISG_score") + 1,
+        "tier",
+        isg_score_df["sample_id"].astype(str).map(tier_map),
+    )
+    return isg_score_df
@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
+
+"""Per-gene mean and SD of `normalized_count`, as in `Aves_Mam_mbio_ISGcntl_mnsd.txt`.
+
+`GeneStats` holds, per gene, the count, mean and sum of squared deviations (M2) of the
+values added so far: values are added in a single pass over the samples, and the states
+of disjoint sets of samples are merged exactly (Chan et al. parallel update of Welford's
+algorithm), so that partial statistics can be computed in parallel or on separate
+machines and merged afterwards.
+"""
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+logger = logging.getLogger(__name__)
+
+GENE_COLS = ["hum_symbol", "type"]
+STATE_COLS = ["n", "mean", "m2"]
+
+
+class GeneStats:
+    """Mergeable accumulator of the per-gene mean and variance of `normalized_count`."""
+
+    def __init__(self, group_cols: Optional[list[str]] = None):
+        """
+        :param group_cols: columns splitting the statistics into groups (e.g. `clade_host`),
+            in addition to the gene
+        """
+        self.group_cols = list(group_cols or [])
+        self.key_cols = self.group_cols + GENE_COLS
+        self.state = DataFrame(
+            {col: pd.Series(dtype=object) for col in self.key_cols}
+            | {"n": pd.Series(dtype=np.int64)}
+            | {col: pd.Series(dtype=np.float64) for col in STATE_COLS[1:]}
+        ).set_index(self.key_cols)
+
+    def add(self, df: DataFrame) -> "GeneStats":
+        """
+        Add the `normalized_count` values of `df` (NaN values are skipped).
+
+        :param df: `key_cols` and `normalized_count` columns, e.g. the output of
+            `normalize_gene_counts`
+        :type df: DataFrame
+        :return: self
+        """
+        values = df[self.key_cols + ["normalized_count"]].dropna(subset=["normalized_count"])
+        if values.empty:
+            return self
+        x = values["normalized_count"].astype(np.float64)
+        grouped = x.groupby([values[col] for col in self.key_cols], sort=False)
+        batch = DataFrame({"n": grouped.count(), "mean": grouped.mean()})
+        deviation = x - grouped.transform("mean")
+        batch["m2"] = (
+            (deviation * deviation)
+            .groupby([values[col] for col in self.key_cols], sort=False)
+            .sum()
+        )
+        self.state = self._combine(self.state, batch)
+        return self
+
+    def merge(self, other: "GeneStats") -> "GeneStats":
+        """
+        Merge the statistics of another set of samples.
+
+        :raises ValueError: if the accumulators are not split by the same groups
+        """
+        if other.group_cols != self.group_cols:
+            raise ValueError(
+                f"Cannot merge statistics grouped by {other.group_cols} into {self.group_cols}."
+            )
+        self.state = self._combine(self.state, other.state)
+        return self
+
+    @staticmethod
+    def _combine(a: DataFrame, b: DataFrame) -> DataFrame:
+        if a.empty:
+            return b.copy()
+        if b.empty:
+            return a
+        a, b = a.align(b, join="outer", fill_value=0)
+        n = a["n"] + b["n"]
+        delta = b["mean"] - a["mean"]
+        return DataFrame(
+            {
+                "n": n.astype(np.int64),
+                "mean": a["mean"] + delta * (b["n"] / n),
+                "m2": a["m2"] + b["m2"] + delta * delta * (a["n"] * b["n"] / n),
+            }
+        )
+
+    def write(self, path: Path) -> None:
+        """Write the accumulator state (TSV, full float precision), for `read`."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.state.reset_index().to_csv(path, sep="\t", index=False, float_format="%.17g")
+        logger.info(f"Partial statistics were exported to {path}")
+
+    @classmethod
+    def read(cls, path: Path) -> "GeneStats":
+        """
+        Read an accumulator state written by `write`.
+
+        :raises ValueError: if the file is not an accumulator state
+        """
+        state = pd.read_csv(path, sep="\t", dtype={"n": np.int64}, keep_default_na=False)
+        missing = [col for col in GENE_COLS + STATE_COLS if col not in state.columns]
+        if missing:
+            raise ValueError(f"{path} is not a partial statistics file (missing: {missing}).")
+        group_cols = [col for col in state.columns if col not in GENE_COLS + STATE_COLS]
+        stats = cls(group_cols=group_cols)
+        for col in stats.key_cols:
+            state[col] = state[col].astype(str)
+        stats.state = state.set_index(stats.key_cols)[STATE_COLS]
+        return stats
+
+    def groups(self) -> list[tuple]:
+        """Values of `group_cols` of each group ([()] if not grouped)."""
+        if not self.group_cols:
+            return [()]
+        groups = self.state.reset_index()[self.group_cols].drop_duplicates()
+        return sorted(groups.itertuples(index=False, name=None))
+
+    def to_reference(self, group: tuple = ()) -> DataFrame:
+        """
+        Mean and sample SD (n - 1 degrees of freedom) of each gene of a group, sorted by
+        gene, with the columns of `Aves_Mam_mbio_ISGcntl_mnsd.txt`.
+
+        The SD of genes with a single value is NaN.
+
+        :param group: values of `group_cols` (see `groups`)
+        """
+        state = self.state.reset_index()
+        for col, value in zip(self.group_cols, group):
+            state = state.loc[state[col] == value]
+        n = state["n"].to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.sqrt(np.where(n > 1, state["m2"].to_numpy() / (n - 1), np.nan))
+        reference = DataFrame(
+            {
+                "hum_symbol": state["hum_symbol"].to_numpy(),
+                "type": state["type"].to_numpy(),
+                "mean_norm_genes_log": state["mean"].to_numpy(),
+                "sd_norm_genes_log": sd,
+            }
+        )
+        duplicated = reference["hum_symbol"][reference["hum_symbol"].duplicated()]
+        if not duplicated.empty:
+            raise ValueError(f"Genes with several types: {sorted(duplicated.unique())[:5]}")
+        few = reference["hum_symbol"][n < 2]
+        if not few.empty:
+            logger.warning(
+                f"SD undefined for {len(few)} genes with less than 2 values: {list(few[:5])}"
+            )
+        return reference.sort_values("hum_symbol", ignore_index=True)
@@ -2,54 +2,101 @@
 # SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
 
 import logging
+import os
+import re
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 from pandas import DataFrame, read_csv
 
 logger = logging.getLogger(__name__)
 
+QUANT_FILE_NAMES = ["quant.sf", "quant.sf.gz", "quant.sf.bz2", "quant.sf.xz", "quant.sf.zst"]
+"""Names of the quant file in the Salmon output directory of a sample, in order of preference."""
 
-def summarize_sf_for_sample(
-    sample_id: str,
+_FLAT_QUANT_FILE = re.compile(r"^(?P<sample_id>.+)_quant\.sf(\.gz|\.bz2|\.xz|\.zst)?$")
+
+
+def find_quant_files(sf_dir: Path) -> dict[str, Path]:
+    """
+    Index the quant.sf files of `sf_dir` by sample ID, in a single directory scan.
+
+    Both layouts are accepted: the Salmon output directory of each sample,
+    `<sf_dir>/<sample_id>/` (holding one of `QUANT_FILE_NAMES`), and flat
+    `<sf_dir>/<sample_id>_quant.sf` files (optionally compressed, e.g. `.sf.gz`). Sample
+    directories are not opened here (`read_quant_file` looks for their quant file), unless
+    the sample also has a flat file: the flat file is used when the directory holds none of
+    `QUANT_FILE_NAMES` (e.g. a partial Salmon output).
+
+    :param sf_dir: directory of the Salmon outputs
+    :type sf_dir: Path
+    :return: sample directory or flat quant file of each sample
+    :rtype: dict[str, Path]
+    :raises FileNotFoundError: if `sf_dir` does not exist
+    """
+    sample_dirs = {}
+    flat_files = {}
+    with os.scandir(sf_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                sample_dirs[entry.name] = Path(entry.path)
+                continue
+            match = _FLAT_QUANT_FILE.match(entry.name)
+            if match:
+                sample_id = match["sample_id"]
+                # An uncompressed file is preferred over compressed ones
+                if sample_id not in flat_files or entry.name.endswith(".sf"):
+                    flat_files[sample_id] = Path(entry.path)
+    # The Salmon output directory is preferred over a flat file of the same sample, if it
+    # holds a quant file
+    quant_files = dict(flat_files)
+    for sample_id, path in sample_dirs.items():
+        if sample_id in flat_files and not any(
+            (path / name).is_file() for name in QUANT_FILE_NAMES
+        ):
+            continue
+        quant_files[sample_id] = path
+    return quant_files
+
+
+def read_quant_file(path: Path) -> Optional[DataFrame]:
+    """
+    Read a quant.sf file, or the quant file of a sample directory (see `find_quant_files`).
+
+    Compressed files are decompressed according to their suffix (`.zst` needs the
+    `zstandard` package).
+
+    :return: quant.sf table, or None if the sample directory holds no quant file
+    """
+    if not path.is_dir():
+        return read_csv(path, sep="\t")
+    for name in QUANT_FILE_NAMES:
+        try:
+            return read_csv(path / name, sep="\t")
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def normalize_gene_counts(
+    sf_data: DataFrame,
     clade_host: str,
     gene_info: DataFrame,
-    sf_dir: Path,
     aves_neg_genes: set,
     mars_neg_genes: set,
-    gene_mean_sd_list: DataFrame,
     per_species: bool = False,
 ) -> DataFrame:
     """
-    Process a single Salmon quant.sf file and return per-gene statistics per sample.
+    Per-gene raw and normalized counts of a Salmon quant.sf table (see
+    `summarize_sf_for_sample`), before standardization.
 
-    If per_species is False:
-        group by hum_symbol
-    If per_species is True:
-        group by (hum_symbol, tax_id)
+    :return: `hum_symbol` (and `tax_id` if per_species), `raw_count`, `type` and
+        `normalized_count` columns
     """
+    sf_data_temp = sf_data
 
-    sf_path = sf_dir / f"{sample_id}_quant.sf"
-
-    # If the sample does not exist, return an empty dataframe silently
-    if not sf_path.exists():
-        logger.warning(
-            f"{sf_path} was not found. check sample_metadata.example.tsv file and fastaq files."
-        )
-        base_cols = [
-            "sample_id",
-            "hum_symbol",
-            "raw_count",
-            "type",
-            "normalized_count",
-            "standardized_count",
-        ]
-        if per_species:
-            base_cols.insert(2, "tax_id")  # sample_id, hum_symbol, tax_id, ...
-        return DataFrame(columns=base_cols)
-
-    # Load Salmon quant file and filter NumReads > 0
-    sf_data_temp = read_csv(sf_path, sep="\t")
+    # Filter NumReads > 0
     # sf_data_temp = sf_data_temp.loc[sf_data_temp["NumReads"] > 0].copy()
 
     # Join with reference annotation (gene_info)
@@ -91,6 +138,57 @@ def summarize_sf_for_sample(
     else:
         grouped["normalized_count"] = np.nan
 
+    return grouped
+
+
+def summarize_sf_for_sample(
+    sample_id: str,
+    clade_host: str,
+    gene_info: DataFrame,
+    sf_dir: Path,
+    aves_neg_genes: set,
+    mars_neg_genes: set,
+    gene_mean_sd_list: DataFrame,
+    per_species: bool = False,
+    quant_files: Optional[dict[str, Path]] = None,
+) -> DataFrame:
+    """
+    Process a single Salmon quant.sf file and return per-gene statistics per sample.
+
+    If per_species is False:
+        group by hum_symbol
+    If per_species is True:
+        group by (hum_symbol, tax_id)
+
+    `quant_files` is the output of `find_quant_files(sf_dir)`, when already computed.
+    """
+    if quant_files is None:
+        quant_files = find_quant_files(sf_dir)
+    sf_path = quant_files.get(str(sample_id))
+    sf_data_temp = read_quant_file(sf_path) if sf_path is not None else None
+
+    # If the sample does not exist, return an empty dataframe silently
+    if sf_data_temp is None:
+        logger.warning(
+            f"No quant.sf file of {sample_id} was found in {sf_dir}. "
+            "check sample_metadata.example.tsv file and fastaq files."
+        )
+        base_cols = [
+            "sample_id",
+            "hum_symbol",
+            "raw_count",
+            "type",
+            "normalized_count",
+            "standardized_count",
+        ]
+        if per_species:
+            base_cols.insert(2, "tax_id")  # sample_id, hum_symbol, tax_id, ...
+        return DataFrame(columns=base_cols)
+
+    grouped = normalize_gene_counts(
+        sf_data_temp, clade_host, gene_info, aves_neg_genes, mars_neg_genes, per_species
+    )
+
     # Merge mean/sd reference table for standardization (by hum_symbol)
     grouped = grouped.merge(
         gene_mean_sd_list[["hum_symbol", "mean_norm_genes_log", "sd_norm_genes_log"]],
@@ -121,6 +219,7 @@ def process_samples(
     per_species: bool,
 ):
     """Process each sample"""
+    quant_files = find_quant_files(sf_dir)
     all_sample_gene_count_list = []
     for _, row in sample_metadata.iterrows():
         sample_id = row["sample_id"]
@@ -136,6 +235,7 @@ def process_samples(
             mars_neg_genes=mars_neg_genes,
             gene_mean_sd_list=gene_mean_sd_list,
             per_species=per_species,
+            quant_files=quant_files,
         )
 
         if sample_df.empty:
@@ -6,14 +6,12 @@ from pathlib import Path
 
 from pandas import DataFrame
 
+from quant_normalizer.io.csv_writer import write_delimited
+
 logger = logging.getLogger(__name__)
 
 
 def write_to_tsv(df: DataFrame, output_path: Path) -> None:
     output_path.parent.mkdir(parents=True, exist_ok=True)
     logger.info(f"TSV file was exported to {output_path}")
-    df.to_csv(
-        output_path,
-        sep="\t",
-        index=False,
-    )
+    write_delimited(df, output_path, sep="\t")
@@ -0,0 +1,24 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
+
+"""The writer of delimited tables is the same module in isg-profiler and isg-vip."""
+
+from pathlib import Path
+
+import pytest
+
+from quant_normalizer.io import csv_writer
+
+ISG_VIP_CSV_WRITER = (
+    Path(__file__).resolve().parents[2] / "isg-vip" / "src" / "isg_vip" / "io" / "csv_writer.py"
+)
+
+
+def _without_copyright(path: Path) -> list[str]:
+    lines = path.read_text().splitlines()
+    return [line for line in lines if not line.startswith("# SPDX-FileCopyrightText:")]
+
+
+@pytest.mark.skipif(not ISG_VIP_CSV_WRITER.exists(), reason="isg-vip sources not found")
+def test_csv_writer_copies_identical():
+    assert _without_copyright(Path(csv_writer.__file__)) == _without_copyright(ISG_VIP_CSV_WRITER)
@@ -0,0 +1,40 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
+
+"""Quant files of the samples of a Salmon output directory."""
+
+from quant_normalizer.core.sample_processor import find_quant_files
+
+
+def test_find_quant_files(tmp_path):
+    # Salmon output directories
+    (tmp_path / "SRR1").mkdir()
+    (tmp_path / "SRR1" / "quant.sf").touch()
+    (tmp_path / "SRR2").mkdir()
+    (tmp_path / "SRR2" / "quant.sf.gz").touch()
+    # Flat files; the uncompressed one is preferred
+    (tmp_path / "SRR3_quant.sf.gz").touch()
+    (tmp_path / "SRR3_quant.sf").touch()
+    (tmp_path / "SRR4_quant.sf.xz").touch()
+    # Both layouts: the directory is preferred
+    (tmp_path / "SRR5").mkdir()
+    (tmp_path / "SRR5" / "quant.sf").touch()
+    (tmp_path / "SRR5_quant.sf").touch()
+    # Partial Salmon output without quant file: the flat file is used
+    (tmp_path / "SRR6").mkdir()
+    (tmp_path / "SRR6" / "logs").mkdir()
+    (tmp_path / "SRR6_quant.sf").touch()
+    # Partial Salmon output only: reported as missing when read
+    (tmp_path / "SRR7").mkdir()
+    # Not a quant file
+    (tmp_path / "SRR8.tsv").touch()
+
+    assert find_quant_files(tmp_path) == {
+        "SRR1": tmp_path / "SRR1",
+        "SRR2": tmp_path / "SRR2",
+        "SRR3": tmp_path / "SRR3_quant.sf",
+        "SRR4": tmp_path / "SRR4_quant.sf.xz",
+        "SRR5": tmp_path / "SRR5",
+        "SRR6": tmp_path / "SRR6_quant.sf",
+        "SRR7": tmp_path / "SRR7",
+    }
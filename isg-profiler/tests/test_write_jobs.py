@@ -0,0 +1,122 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Luca Nishimura & Jumpei Ito
+
+"""`quant_normalizer --write_jobs`: the tables written by the parallel writer are the bytes
+written by pandas."""
+
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from quant_normalizer import cli
+from quant_normalizer.io import csv_writer
+from quant_normalizer.io.reference_loader import ReferenceFiles
+
+REFERENCE_DIR = Path(__file__).resolve().parents[1] / "reference"
+
+
+@pytest.fixture(scope="module")
+def cohort(tmp_path_factory) -> Path:
+    """Reference directory, sample metadata and `<sample_id>_quant.sf` files of a few samples."""
+    rng = np.random.default_rng(0)
+    root = tmp_path_factory.mktemp("cohort")
+    reference_dir = root / "reference"
+    reference_dir.mkdir()
+    for name in [
+        ReferenceFiles.AVES_REM,
+        ReferenceFiles.MARS_REM,
+        ReferenceFiles.AVES_MAM_MBIO_ISG_CNTL_MNSD,
+        ReferenceFiles.SP_ID_LIST,
+    ]:
+        shutil.copy(REFERENCE_DIR / name, reference_dir / name)
+
+    genes = pd.read_csv(REFERENCE_DIR / ReferenceFiles.AVES_MAM_MBIO_ISG_CNTL_MNSD, sep="\t")
+    species = pd.read_csv(REFERENCE_DIR / ReferenceFiles.SP_ID_LIST, sep="\t").head(3)
+    gene2refseq = pd.DataFrame(
+        {
+            "Isoform": [f"XM_{i:09d}.1" for i in range(len(genes) * len(species))],
+            "hum_symbol": np.tile(genes["hum_symbol"].to_numpy(), len(species)),
+            "type": np.tile(genes["type"].to_numpy(), len(species)),
+            "tax_id": np.repeat(species["tax_id"].to_numpy(), len(genes)),
+        }
+    )
+    gene2refseq.to_csv(reference_dir / ReferenceFiles.GENE2REFSEQ, sep="\t", index=False)
+
+    sample_ids = [f"SRR{30000000 + i}" for i in range(4)]
+    pd.DataFrame(
+        {
+            "sample_id": sample_ids,
+            "species_host": species["species"].to_numpy()[[0, 1, 2, 0]],
+            "order_host": ["Galliformes", "Primates", "Primates", "Galliformes"],
+            "clade_host": ["Aves", "Mammalia", "Marsupialia", "Aves"],
+        }
+    ).to_csv(root / "sample_metadata.tsv", sep="\t", index=False)
+
+    sf_dir = root / "sf"
+    sf_dir.mkdir()
+    for sample_id in sample_ids:
+        length = rng.integers(500, 6000, len(gene2refseq))
+        num_reads = rng.gamma(1.0, 50.0, len(gene2refseq))
+        rpk = num_reads / (length - 180.0)
+        pd.DataFrame(
+            {
+                "Name": gene2refseq["Isoform"],
+                "Length": length,
+                "EffectiveLength": length - 180.0,
+                "TPM": rpk / rpk.sum() * 1e6,
+                "NumReads": num_reads,
+            }
+        ).to_csv(sf_dir / f"{sample_id}_quant.sf", sep="\t", index=False)
+    return root
+
+
+def run_cli(monkeypatch, cohort: Path, out_dir: Path, *args: str):
+    argv = [
+        "quant_normalizer",
+        "--reference_dir",
+        str(cohort / "reference"),
+        "--sample_metadata",
+        str(cohort / "sample_metadata.tsv"),
+        "--sf_dir",
+        str(cohort / "sf"),
+        "--out_dir",
+        str(out_dir),
+        *args,
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+
+
+@pytest.mark.parametrize("per_species", [False, True])
+def test_write_jobs_output_identical(monkeypatch, tmp_path, cohort, per_species):
+    # Small tables go through the parallel writer, in many chunks
+    monkeypatch.setattr(csv_writer, "PARALLEL_MIN_ROWS", 1)
+    monkeypatch.setattr(csv_writer, "CHUNK_ROWS", 97)
+    monkeypatch.setattr(csv_writer, "_write_jobs", 1)
+    parallel_writes = []
+    write_parallel = csv_writer._write_parallel
+
+    def counting_write_parallel(df, output_path, sep, jobs):
+        parallel_writes.append((Path(output_path).name, jobs))
+        write_parallel(df, output_path, sep, jobs)
+
+    monkeypatch.setattr(csv_writer, "_write_parallel", counting_write_parallel)
+    mode = ["--per_species"] if per_species else []
+
+    run_cli(monkeypatch, cohort, tmp_path / "serial", *mode)
+    assert parallel_writes == []
+    run_cli(monkeypatch, cohort, tmp_path / "parallel", *mode, "--write_jobs", "3")
+
+    names = sorted(path.name for path in (tmp_path / "serial").iterdir())
+    assert sorted(name for name, _ in parallel_writes) == names
+    assert all(jobs == 3 for _, jobs in parallel_writes)
+    for name in names:
+        serial = (tmp_path / "serial" / name).read_bytes()
+        assert (tmp_path / "parallel" / name).read_bytes() == serial
+    per_gene = "per_gene_per_species_count.tsv" if per_species else "per_gene_count.tsv"
+    lines = (tmp_path / "serial" / per_gene).read_bytes().splitlines()
+    assert len(lines) > 3 * csv_writer.CHUNK_ROWS
@@ -0,0 +1,186 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Score tolerance and memory of the compact (`--compact`) mode.
+
+Predicts the same cohort with float64 features and with compact features, reports
+the largest score differences of each table, the labels which differ, the size of the
+feature matrix and the peak memory of the two stages of both runs (NumPy/pandas
+allocations, traced by tracemalloc): building the features from the per-gene counts,
+and scoring them. Fails (exit code 1) when a base model score differs by more than the
+tolerance.
+
+    python benchmarks/compact_mode.py --gene_count_file per_gene_count.tsv \\
+        --metadata sample_metadata.tsv --copies 20
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.data_loader import read_per_gene_count, read_sample_metadata
+from isg_vip.pipelines import COLUMNS_TO_PROCESS, EXCLUDE_COLUMNS
+from isg_vip.prediction.batch import predict_feature_tables
+from isg_vip.predictor import Predictor
+
+
+def replicate_cohort(
+    counts: pd.DataFrame, metadata: pd.DataFrame, copies: int, seed: int = 0
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    `copies` copies of the cohort with new sample IDs; raw counts of the copies are
+    scaled by a random factor per row, so that the copies are different samples.
+    """
+    rng = np.random.default_rng(seed)
+    all_counts = []
+    all_metadata = []
+    for copy in range(copies):
+        suffix = "" if copy == 0 else f"_copy{copy}"
+        copy_counts = counts.assign(sample_id=counts["sample_id"].astype(str) + suffix)
+        if copy:
+            noise = rng.lognormal(0.0, 0.1, len(counts))
+            copy_counts["raw_count"] = copy_counts["raw_count"] * noise
+        all_counts.append(copy_counts)
+        all_metadata.append(metadata.assign(sample_id=metadata["sample_id"].astype(str) + suffix))
+    return pd.concat(all_counts, ignore_index=True), pd.concat(all_metadata, ignore_index=True)
+
+
+def traced(func):
+    """Result, peak traced memory (bytes) and wall time of `func()`."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def run(predictor: Predictor, counts: pd.DataFrame, metadata: pd.DataFrame):
+    """Tables of one prediction, and the size, peak memory and time of each stage."""
+    (X, meta_info_), features_peak, features_time = traced(
+        lambda: predictor.features(counts, metadata)
+    )
+    tables, scoring_peak, scoring_time = traced(
+        lambda: predict_feature_tables(
+            predictor.artifacts,
+            COLUMNS_TO_PROCESS,
+            EXCLUDE_COLUMNS,
+            X,
+            meta_info_,
+            tree_engine=predictor.tree_engine,
+            meta_tree_engine=predictor.meta_tree_engine,
+            linear_scorer=predictor.linear_scorer,
+        )
+    )
+    stats = {
+        "feature matrix": X.memory_usage(deep=True).sum(),
+        "features peak": features_peak,
+        "scoring peak": scoring_peak,
+        "features time": features_time,
+        "scoring time": scoring_time,
+    }
+    return tables, stats
+
+
+def compare(name: str, expected: pd.DataFrame, actual: pd.DataFrame) -> tuple[float, int]:
+    """Largest absolute score difference and number of differing labels of a table."""
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        raise ValueError(f"{name}: tables have different shapes.")
+    max_diff = 0.0
+    n_labels = 0
+    for col in expected.columns:
+        a = expected[col].to_numpy()
+        b = actual[col].to_numpy()
+        if expected[col].dtype.kind == "f":
+            max_diff = max(max_diff, float(np.max(np.abs(a - b), initial=0.0)))
+        elif "Label" in col:
+            n_labels += int(np.sum(a != b))
+    return max_diff, n_labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gene_count_file", required=True, help="per_gene_count.tsv.")
+    parser.add_argument("--metadata", required=True, help="sample_metadata.tsv.")
+    parser.add_argument(
+        "--copies", type=int, default=1, help="Predict this many copies of the cohort."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-5,
+        help="Maximum absolute difference of the base model scores.",
+    )
+    parser.add_argument("--checksums", default=None, help="checksums.sha256 of the models.")
+    parser.add_argument("--tree_engine", choices=["native", "numpy"], default="native")
+    parser.add_argument("--fused_lr", action="store_true")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    counts, metadata = replicate_cohort(
+        read_per_gene_count(Path(args.gene_count_file)),
+        read_sample_metadata(Path(args.metadata)),
+        args.copies,
+    )
+    predictor = Predictor.load(
+        checksums_path=Path(args.checksums) if args.checksums else None,
+        tree_engine=args.tree_engine,
+        fused_lr=args.fused_lr,
+    )
+    compact_predictor = Predictor(
+        predictor.artifacts,
+        tree_engine=args.tree_engine,
+        fused_lr=args.fused_lr,
+        compact=True,
+    )
+
+    tables, stats = run(predictor, counts, metadata)
+    compact_tables, compact_stats = run(compact_predictor, counts, metadata)
+
+    print(f"{len(tables.predictions)} samples")
+    print(f"{'':<16}{'float64':>12}{'compact':>12}")
+    for key in stats:
+        unit, scale = ("s", 1) if key.endswith("time") else ("MB", 2**20)
+        saved = ""
+        if unit == "MB":
+            saved = f"  ({1 - compact_stats[key] / stats[key]:.0%} less)"
+        print(
+            f"{key:<16}{stats[key] / scale:9.1f} {unit:<2}"
+            f"{compact_stats[key] / scale:9.1f} {unit:<2}{saved}"
+        )
+
+    failed = False
+    pairs = [
+        *(
+            (f"Infection_Prediction_{n}", t)
+            for n, t in enumerate(zip(tables.base, compact_tables.base))
+        ),
+        *(
+            (f"Infection_Prediction_Stacking_{n}_external", t)
+            for n, t in enumerate(zip(tables.stacking, compact_tables.stacking))
+        ),
+        ("Infection_Prediction_Stacking_all", (tables.predictions, compact_tables.predictions)),
+    ]
+    for name, (expected, actual) in pairs:
+        max_diff, n_labels = compare(name, expected, actual)
+        status = ""
+        if name.startswith("Infection_Prediction_") and name[-1].isdigit():
+            if max_diff > args.tolerance:
+                status = f"  FAIL: over tolerance ({args.tolerance:g})"
+                failed = True
+        print(f"{name:<45} max |diff| {max_diff:9.2e}  labels differing {n_labels}{status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
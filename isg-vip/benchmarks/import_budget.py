@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Import-time budget of the isg-vip command line.
+
+Runs `python -X importtime -m isg_vip <args>` and fails (exit code 1) when the
+commands which do not predict anything (`--help`, `--version`, `serve --help`,
+`relabel --help`, `shard --help`) import a heavy module, or when their total import time exceeds the
+budget.
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget_ms 150 --repeat 10
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+COMMANDS = [
+    ["--help"],
+    ["--version"],
+    ["serve", "--help"],
+    ["relabel", "--help"],
+    ["shard", "--help"],
+]
+
+HEAVY_MODULES = ["numpy", "pandas", "sklearn", "scipy", "lightgbm", "joblib"]
+"""Must only be imported by the prediction code paths."""
+
+BUDGET_MS = 200.0
+"""Default maximum import time of each command."""
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure(args: list[str]) -> tuple[float, set[str]]:
+    """
+    Total import time (ms) and imported top-level packages of `python -m isg_vip <args>`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "isg_vip", *args],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"isg_vip {' '.join(args)} failed:\n{result.stderr}")
+
+    total_us = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, name = match.groups()
+        packages.add(name.split(".")[0])
+        # Nested imports are included in the cumulative time of their parent
+        if not indent:
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget_ms",
+        type=float,
+        default=BUDGET_MS,
+        help="Maximum import time of each command.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Runs per command; the fastest one is compared with the budget.",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for command in COMMANDS:
+        runs = [measure(command) for _ in range(args.repeat)]
+        import_ms = min(ms for ms, _ in runs)
+        heavy = sorted(set(HEAVY_MODULES) & runs[0][1])
+
+        status = "ok"
+        if heavy:
+            status = f"FAIL: imports {', '.join(heavy)}"
+            failed = True
+        elif import_ms > args.budget_ms:
+            status = f"FAIL: over budget ({args.budget_ms:.0f} ms)"
+            failed = True
+        print(f"isg_vip {' '.join(command):<14} {import_ms:8.1f} ms  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
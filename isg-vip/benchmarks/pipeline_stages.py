@@ -0,0 +1,414 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Time and peak memory of each stage of a prediction, on synthetic cohorts.
+
+Generates `per_gene_count.tsv` and `sample_metadata.tsv` cohorts of each size from
+`reference/gene_list.txt` and the host categories of the shipped models (species drawn
+from a skewed distribution, a fraction of them unseen by the models), predicts them with
+the models of `model_dir` as the command line does, and reports for every stage:
+
+    artifact_load         load the models (and build the `--tree_engine`/`--fused_lr` evaluators)
+    load_per_gene_count   read and normalize per_gene_count.tsv, read sample_metadata.tsv
+    feature_build         pivot the per-gene counts into the feature matrix
+    normalizer_transform  normalizer of every fold
+    base_models           LightGBM and LogisticRegression of every fold
+    meta_models           meta model input and meta model of every fold
+    export                result tables and CSV files
+
+Times are the fastest of `--repeat` runs; peak memory (NumPy/pandas allocations, traced
+by tracemalloc) is measured in a separate run, as tracing slows down the pipeline.
+
+The results are compared with a baseline (JSON, see `--baseline`): the script fails (exit
+code 1) when a stage is slower or uses more memory than its baseline by more than
+`--threshold`, ignoring differences below `--min_seconds` and `--min_mb`.
+`--update_baseline` writes the results as the new baseline instead. Baselines depend on
+the machine: record one on the machine used for the comparisons.
+
+    python benchmarks/pipeline_stages.py --sizes 10 1000 10000
+    python benchmarks/pipeline_stages.py --update_baseline
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from isg_vip import __version__
+from isg_vip.io.data_loader import load_per_gene_count, load_sample_metadata
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+from isg_vip.pipelines import COLUMNS_TO_PROCESS, EXCLUDE_COLUMNS, GENE_LIST_PATH, MODEL_DIR
+from isg_vip.prediction.batch import PredictionTables
+from isg_vip.prediction.batch_index import BASE_MODELS, BatchIndex
+from isg_vip.prediction.ensemble import score_meta_model, scored_mask
+from isg_vip.prediction.run_inference import normalize_each_fold
+from isg_vip.prediction.score_cache import base_model_scores_cached
+from isg_vip.predictor import Predictor
+from isg_vip.preprocessing.feature_builder import build_feature_matrix
+
+STAGES = [
+    "artifact_load",
+    "load_per_gene_count",
+    "feature_build",
+    "normalizer_transform",
+    "base_models",
+    "meta_models",
+    "export",
+]
+
+BASELINE_PATH = Path(__file__).with_name("pipeline_stages_baseline.json")
+
+BASELINE_FORMAT_VERSION = 1
+"""Increase when the stages, the cohorts or the file layout change."""
+
+
+def synthetic_cohort(
+    n_samples: int,
+    genes: list[str],
+    isg_genes: set[str],
+    species_order: dict[str, str],
+    unseen_fraction: float = 0.05,
+    seed: int = 0,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    `per_gene_count.tsv` and `sample_metadata.tsv` rows of `n_samples` synthetic samples.
+
+    Host species follow a Zipf-like distribution over `species_order` (a few species
+    make most of the samples), except `unseen_fraction` of the samples whose species (and
+    for half of them, order) is unknown to the models. Read depth and interferon response
+    vary by sample; about 3% of the gene rows are missing and 2% of the samples are below
+    the control count threshold, as in ISG-Profiler outputs.
+    """
+    rng = np.random.default_rng(seed)
+    sample_ids = np.array([f"SYN{i:07d}" for i in range(n_samples)], dtype=object)
+
+    # Hosts
+    species = np.array(list(species_order), dtype=object)
+    rng.shuffle(species)
+    weights = 1.0 / np.arange(1, len(species) + 1) ** 1.1
+    host_species = rng.choice(species, size=n_samples, p=weights / weights.sum())
+    host_order = np.array([species_order[s] for s in host_species], dtype=object)
+    unseen = np.flatnonzero(rng.random(n_samples) < unseen_fraction)
+    host_species[unseen] = [f"Unseen_species_{i % 50}" for i in unseen]
+    unseen_order = unseen[rng.random(len(unseen)) < 0.5]
+    host_order[unseen_order] = [f"Unseenformes_{i % 10}" for i in unseen_order]
+    metadata = pd.DataFrame(
+        {
+            "sample_id": sample_ids,
+            "species_host": host_species,
+            "order_host": host_order,
+            "clade_host": rng.choice(["Aves", "Mammalia"], size=n_samples),
+        }
+    )
+
+    # Counts: gene level x read depth, ISGs scaled by the interferon response of the sample
+    is_isg = np.array([gene in isg_genes for gene in genes])
+    gene_level = rng.lognormal(np.where(is_isg, 2.5, 5.5), 1.0)
+    depth = rng.lognormal(0.0, 0.5, n_samples)
+    depth[rng.random(n_samples) < 0.02] = 1e-3
+    response = rng.lognormal(0.0, 1.5, n_samples)
+    mean = depth[:, None] * gene_level[None, :] * np.where(is_isg, response[:, None], 1.0)
+    raw_count = rng.gamma(2.0, mean / 2.0).round(3)
+
+    normalized = np.log2(raw_count / raw_count[:, ~is_isg].sum(axis=1, keepdims=True) * 1e6 + 1)
+    standardized = (normalized - normalized.mean(axis=0)) / (normalized.std(axis=0) + 1e-9)
+
+    present = rng.random(raw_count.shape) >= 0.03
+    rows, cols = np.nonzero(present)
+    counts = pd.DataFrame(
+        {
+            "sample_id": sample_ids[rows],
+            "hum_symbol": np.array(genes, dtype=object)[cols],
+            "raw_count": raw_count[present],
+            "type": np.where(is_isg, "ISG", "cntl")[cols],
+            "normalized_count": normalized[present],
+            "standardized_count": standardized[present],
+        }
+    )
+    return counts, metadata
+
+
+def write_cohort(n_samples: int, cohort_dir: Path, artifacts: ISGModelArtifacts, **kwargs):
+    """Write a synthetic cohort (see `synthetic_cohort`) over the genes and hosts of the models."""
+    genes = pd.read_csv(GENE_LIST_PATH, header=None)[0].unique().tolist()
+    normalizer = artifacts.get_normalizer(0)
+    known_species = set(artifacts.get_encoder(ModelType.LGB, 0).categories_[0]) - {"unknown"}
+    group_info = normalizer.group_info.drop_duplicates("species")
+    group_info = group_info[group_info["species"].isin(known_species)]
+    species_order = dict(zip(group_info["species"], group_info["order"]))
+
+    counts, metadata = synthetic_cohort(
+        n_samples, genes, set(normalizer.isg_list), species_order, **kwargs
+    )
+    cohort_dir.mkdir(parents=True, exist_ok=True)
+    counts.to_csv(cohort_dir / "per_gene_count.tsv", sep="\t", index=False)
+    metadata.to_csv(cohort_dir / "sample_metadata.tsv", sep="\t", index=False)
+
+
+def run_stages(cohort_dir: Path, output_dir: Path, measure, **predictor_options) -> dict:
+    """
+    Predict a cohort stage by stage, as the command line does.
+
+    :param measure: called as `measure(func)`, returns `(func(), measurement)`
+    :param predictor_options: `tree_engine`, `fused_lr`, `compact` (see `Predictor`)
+    :return: measurement of each stage
+    """
+    results = {}
+
+    def stage(name, func):
+        value, results[name] = measure(func)
+        return value
+
+    predictor = stage(
+        "artifact_load",
+        lambda: Predictor(ISGModelArtifacts.load(MODEL_DIR), **predictor_options),
+    )
+    artifacts = predictor.artifacts
+
+    info, meta_info_ = stage(
+        "load_per_gene_count",
+        lambda: (
+            load_per_gene_count(cohort_dir / "per_gene_count.tsv", GENE_LIST_PATH),
+            load_sample_metadata(cohort_dir / "sample_metadata.tsv"),
+        ),
+    )
+    X = stage(
+        "feature_build",
+        lambda: build_feature_matrix(info, meta_info_, compact=predictor.compact),
+    )
+    X_tests = stage("normalizer_transform", lambda: normalize_each_fold(artifacts, X))
+    index = BatchIndex.from_features(X, meta_info_)
+
+    def base_models():
+        valid = np.stack([scored_mask(X_test, COLUMNS_TO_PROCESS) for X_test in X_tests])
+        base_scores = base_model_scores_cached(
+            artifacts,
+            COLUMNS_TO_PROCESS,
+            EXCLUDE_COLUMNS,
+            X,
+            X_tests,
+            valid,
+            None,
+            tree_engine=predictor.tree_engine,
+            linear_scorer=predictor.linear_scorer,
+        )
+        for m_type, _ in BASE_MODELS:
+            index.set_mask(m_type, valid)
+        return base_scores
+
+    base_scores = stage("base_models", base_models)
+
+    def meta_models():
+        X_test_metas = [
+            index.meta_features(base_scores[n], X_test, COLUMNS_TO_PROCESS, n)
+            for n, X_test in enumerate(X_tests)
+        ]
+        meta_results = score_meta_model(
+            artifacts,
+            COLUMNS_TO_PROCESS,
+            EXCLUDE_COLUMNS,
+            X_test_metas,
+            tree_engine=predictor.meta_tree_engine,
+        )
+        rows = [X_test_meta["ID"].to_numpy() for X_test_meta in X_test_metas]
+        meta_labels = np.stack(
+            [
+                index.scatter(ModelType.META, n, labels, rows[n])
+                for n, (labels, _) in enumerate(meta_results)
+            ]
+        )
+        meta_scores = np.stack(
+            [
+                index.scatter(ModelType.META, n, probs, rows[n])
+                for n, (_, probs) in enumerate(meta_results)
+            ]
+        )
+        return meta_labels, meta_scores
+
+    meta_labels, meta_scores = stage("meta_models", meta_models)
+
+    def export():
+        n_folds = len(base_scores)
+        tables = PredictionTables(
+            base=[index.base_table(base_scores[n], n) for n in range(n_folds)],
+            stacking=[
+                index.stacking_table(meta_labels[n], meta_scores[n], n) for n in range(n_folds)
+            ],
+            predictions=index.predictions(meta_labels, meta_scores),
+        )
+        tables.write(output_dir)
+
+    stage("export", export)
+    return results
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+def traced(func):
+    gc.collect()
+    tracemalloc.start()
+    value = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, peak / 2**20
+
+
+def benchmark(n_samples: int, work_dir: Path, repeat: int, seed: int, **options) -> dict:
+    """`{stage: {"seconds": ..., "peak_mb": ...}}` of a cohort of `n_samples` samples."""
+    cohort_dir = work_dir / f"cohort_{n_samples}"
+    write_cohort(n_samples, cohort_dir, ISGModelArtifacts.load(MODEL_DIR), seed=seed)
+
+    peaks = run_stages(cohort_dir, work_dir / "output", traced, **options)
+    runs = [run_stages(cohort_dir, work_dir / "output", timed, **options) for _ in range(repeat)]
+    return {
+        name: {"seconds": min(run[name] for run in runs), "peak_mb": peaks[name]} for name in STAGES
+    }
+
+
+def machine() -> dict:
+    import lightgbm
+    import sklearn
+
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "isg_vip": __version__,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+        "lightgbm": lightgbm.__version__,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, min_seconds: float, min_mb: float
+) -> list[str]:
+    """Regressions of `results` (see `benchmark`, by cohort size) against `baseline`."""
+    regressions = []
+    for size, stages in results.items():
+        for name, result in stages.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            for key, floor, unit in [("seconds", min_seconds, "s"), ("peak_mb", min_mb, "MB")]:
+                if result[key] > base[key] * (1 + threshold) and result[key] - base[key] > floor:
+                    regressions.append(
+                        f"{size} samples, {name}: {result[key]:.3f} {unit} "
+                        f"(baseline {base[key]:.3f} {unit}, +{result[key] / base[key] - 1:.0%})"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000, 100000],
+        help="Number of samples of each cohort.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per cohort; the fastest one is kept."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic cohorts.")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file (JSON).")
+    parser.add_argument(
+        "--update_baseline",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing them.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Maximum relative increase of the time or peak memory of a stage.",
+    )
+    parser.add_argument(
+        "--min_seconds",
+        type=float,
+        default=0.05,
+        help="Time increases below this are never regressions.",
+    )
+    parser.add_argument(
+        "--min_mb",
+        type=float,
+        default=1.0,
+        help="Peak memory increases below this are never regressions.",
+    )
+    parser.add_argument("--tree_engine", choices=["native", "numpy"], default="native")
+    parser.add_argument("--fused_lr", action="store_true")
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--json_out", default=None, help="Also write the results to this file.")
+    parser.add_argument(
+        "--work_dir", default=None, help="Directory of the cohorts (default: temporary)."
+    )
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    options = {"tree_engine": args.tree_engine, "fused_lr": args.fused_lr, "compact": args.compact}
+    # Baselines are kept per evaluator configuration
+    config = ",".join(f"{key}={value}" for key, value in options.items())
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="isg_vip_bench_", dir=args.work_dir) as work_dir:
+        for n_samples in args.sizes:
+            stages = benchmark(n_samples, Path(work_dir), args.repeat, args.seed, **options)
+            results[str(n_samples)] = stages
+            print(f"{n_samples} samples")
+            for name, result in stages.items():
+                print(f"  {name:<22}{result['seconds']:9.3f} s{result['peak_mb']:10.1f} MB peak")
+
+    report = {"format": BASELINE_FORMAT_VERSION, "machine": machine(), "results": results}
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline)
+    baselines = {}
+    if baseline_path.exists():
+        baselines = json.loads(baseline_path.read_text())
+        if baselines.get("format") != BASELINE_FORMAT_VERSION:
+            print(f"{baseline_path}: unsupported baseline format, ignored.")
+            baselines = {}
+
+    if args.update_baseline:
+        configs = baselines.get("configs", {})
+        configs[config] = {"machine": report["machine"], "results": results}
+        baselines = {"format": BASELINE_FORMAT_VERSION, "configs": configs}
+        baseline_path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {baseline_path} ({config}).")
+        return
+
+    baseline = baselines.get("configs", {}).get(config)
+    if baseline is None:
+        print(f"No baseline for {config} in {baseline_path}; run with --update_baseline.")
+        return
+    if baseline["machine"] != report["machine"]:
+        print("Warning: the baseline was recorded on another machine or with other versions.")
+
+    regressions = compare(
+        results, baseline["results"], args.threshold, args.min_seconds, args.min_mb
+    )
+    for regression in regressions:
+        print(f"FAIL: {regression}")
+    if not regressions:
+        print(f"No stage regressed by more than {args.threshold:.0%}.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,14 @@ try:
     __version__ = importlib.metadata.version("isg_vip")
 except importlib.metadata.PackageNotFoundError:
     __version__ = "unknown"
+
+__all__ = ["Predictor", "__version__"]
+
+
+def __getattr__(name: str):
+    # Imported on first use: the command line must not load pandas/scikit-learn for --help
+    if name == "Predictor":
+        from isg_vip.predictor import Predictor
+
+        return Predictor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -13,8 +13,28 @@ import sys
 def main():
     """Run the ISG-VIP prediction pipeline.
 
-    This invokes the main function from pipelines.py.
+    This invokes the main function from pipelines.py, from service.py for
+    `isg-vip serve`, from relabel.py for `isg-vip relabel`, or from shard.py for
+    `isg-vip shard`.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from .service import main as run_service
+
+        run_service(sys.argv[2:])
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "relabel":
+        from .relabel import main as run_relabel
+
+        run_relabel(sys.argv[2:])
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "shard":
+        from .shard import main as run_shard
+
+        run_shard(sys.argv[2:])
+        return
+
     try:
         from .pipelines import main as run_pipeline
     except ImportError as e:
@@ -1,6 +1,8 @@
 # SPDX-License-Identifier: GPL-3.0-only
 # SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
 
+from pathlib import Path
+
 
 class PerGeneCountTsvCols:
     """
@@ -65,3 +67,54 @@ class MetadataTsvCols:
 class GeneType:
     ISG = "ISG"
     CNTL = "cntl"
+
+
+class InputFormat:
+    """
+    Formats of the input tables, detected from the file suffix
+    """
+
+    TSV = "tsv"
+    """Also compressed TSV, e.g. `per_gene_count.tsv.gz`."""
+    PARQUET = "parquet"
+    FEATHER = "feather"
+
+    SUFFIXES = {".parquet": PARQUET, ".pq": PARQUET, ".feather": FEATHER, ".arrow": FEATHER}
+    COLUMNAR = [PARQUET, FEATHER]
+    """Formats which need pyarrow."""
+
+    @classmethod
+    def of(cls, path: Path) -> str:
+        return cls.SUFFIXES.get(Path(path).suffix.lower(), cls.TSV)
+
+
+class OutputFormat:
+    """
+    Formats of the result tables (`--output_format`), also used as the file suffix
+    """
+
+    CSV = "csv"
+    CSV_GZ = "csv.gz"
+    CSV_BZ2 = "csv.bz2"
+    CSV_XZ = "csv.xz"
+    PARQUET = "parquet"
+    FEATHER = "feather"
+
+    ALL = [CSV, CSV_GZ, CSV_BZ2, CSV_XZ, PARQUET, FEATHER]
+    COLUMNAR = [PARQUET, FEATHER]
+    """Formats which need pyarrow."""
+
+
+class VoteRule:
+    """
+    Rules combining the labels of the folds into the final label (`isg-vip relabel --vote`)
+    """
+
+    MAJORITY = "majority"
+    """More than half of the folds are positive (ties are negative), as in a prediction run."""
+    UNANIMOUS = "unanimous"
+    """Every fold is positive."""
+    MEAN = "mean"
+    """The mean score of the folds reaches a cutoff."""
+
+    ALL = [MAJORITY, UNANIMOUS, MEAN]
@@ -0,0 +1,96 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Writers of delimited tables: pandas, or pandas formatting row chunks in parallel.
+
+`DataFrame.to_csv` formats the values one by one in a single thread. The parallel writer
+forks worker processes which format chunks of rows with `DataFrame.to_csv` (the table is
+inherited, not copied to the workers) and writes the chunks in order: the file holds the
+bytes written by `DataFrame.to_csv` (same float repr, empty NaN fields, column order).
+Where processes cannot be forked, tables are written by pandas.
+
+The same module is shipped as `quant_normalizer.io.csv_writer` (isg-profiler) and
+`isg_vip.io.csv_writer` (isg-vip): the two packages are installed separately and do not
+depend on each other. Keep both copies identical (checked by the tests of isg-profiler).
+"""
+
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+logger = logging.getLogger(__name__)
+
+PARALLEL_MIN_ROWS = 200_000
+"""Smaller tables are written by pandas: starting the workers would take longer."""
+
+CHUNK_ROWS = 50_000
+"""Rows formatted by a worker at once."""
+
+_write_jobs = 1
+
+_frame: Optional["DataFrame"] = None
+"""Table being written, inherited by the forked workers."""
+
+
+def set_write_jobs(jobs: int) -> None:
+    """
+    Number of processes formatting the tables written by `write_delimited` (1: pandas only).
+
+    :raises ValueError: if `jobs` is less than 1
+    """
+    global _write_jobs
+    if jobs < 1:
+        raise ValueError(f"Number of write jobs must be at least 1: {jobs}")
+    _write_jobs = jobs
+
+
+def write_delimited(df: "DataFrame", output_path: Path, sep: str = ",") -> None:
+    """
+    Write `df` as `df.to_csv(output_path, sep=sep, index=False)` does, in parallel for
+    large tables (see `set_write_jobs`).
+    """
+    if _write_jobs > 1 and len(df) >= PARALLEL_MIN_ROWS:
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.debug("Processes cannot be forked: the table is written by pandas.")
+        else:
+            try:
+                _write_parallel(df, output_path, sep, _write_jobs)
+                return
+            except (OSError, BrokenProcessPool) as e:
+                logger.warning(f"Parallel writer failed ({e}): the table is written by pandas.")
+
+    df.to_csv(output_path, sep=sep, index=False)
+
+
+def _format_rows(start: int, stop: int, sep: str) -> bytes:
+    """Rows `start:stop` of the inherited table (with the header for the first chunk)."""
+    chunk = _frame.iloc[start:stop]
+    return chunk.to_csv(None, sep=sep, index=False, header=start == 0).encode("utf-8")
+
+
+def _write_parallel(df: "DataFrame", output_path: Path, sep: str, jobs: int) -> None:
+    global _frame
+    _frame = df
+    context = multiprocessing.get_context("fork")
+    try:
+        with (
+            ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor,
+            open(output_path, "wb") as f,
+        ):
+            # Chunks are written in order, with a bounded number of chunks in flight
+            pending = deque()
+            for start in range(0, len(df), CHUNK_ROWS):
+                pending.append(executor.submit(_format_rows, start, start + CHUNK_ROWS, sep))
+                if len(pending) >= 2 * jobs:
+                    f.write(pending.popleft().result())
+            while pending:
+                f.write(pending.popleft().result())
+    finally:
+        _frame = None
@@ -1,68 +1,273 @@
 # SPDX-License-Identifier: GPL-3.0-only
 # SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
 
+import pickle
+import tempfile
+import zlib
 from pathlib import Path
+from typing import Iterator, Optional
 
 import numpy as np
 import pandas as pd
 
 from isg_vip.io.constants import (
     GeneType,
+    InputFormat,
     LoadedPerGeneCountTsvCols,
+    MetadataTsvCols,
     PerGeneCountTsvCols,
 )
+from isg_vip.utils.tracing import span
+
+_PER_GENE_COUNT_COLUMNS = [
+    PerGeneCountTsvCols.SAMPLE_ID,
+    PerGeneCountTsvCols.HUM_SYMBOL,
+    PerGeneCountTsvCols.RAW_COUNT,
+    PerGeneCountTsvCols.TYPE,
+]
+
+_READ_ROWS = 1 << 18
+"""Rows of per_gene_count read at once in chunked mode."""
+
+
+def read_table(path: Path, columns: list[str]) -> pd.DataFrame:
+    """
+    Read `columns` of an input table: Parquet (`.parquet`, `.pq`), Feather (`.feather`,
+    `.arrow`) or TSV (any other suffix, optionally compressed, e.g. `.tsv.gz`).
+
+    Only the requested columns of a Parquet/Feather file are read, without text parsing.
+
+    :param path: table path
+    :type path: Path
+    :param columns: columns to read
+    :type columns: list[str]
+    :raises ImportError: if pyarrow is missing for a Parquet/Feather file
+    """
+    input_format = InputFormat.of(path)
+    if input_format == InputFormat.PARQUET:
+        _require_pyarrow(path)
+        return pd.read_parquet(path, columns=columns)
+    if input_format == InputFormat.FEATHER:
+        _require_pyarrow(path)
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, sep="\t", usecols=columns)
+
+
+def iter_table_rows(path: Path, columns: list[str], n_rows: int) -> Iterator[pd.DataFrame]:
+    """`read_table` by blocks of about `n_rows` rows."""
+    input_format = InputFormat.of(path)
+    if input_format == InputFormat.TSV:
+        yield from pd.read_csv(path, sep="\t", usecols=columns, chunksize=n_rows)
+        return
+
+    _require_pyarrow(path)
+    import pyarrow.dataset
+
+    dataset = pyarrow.dataset.dataset(path, format=input_format)
+    for batch in dataset.to_batches(columns=columns, batch_size=n_rows):
+        yield batch.to_pandas()
+
+
+def _require_pyarrow(path: Path):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            f"pyarrow is required to read {path}; install it with: pip install 'isg-vip[columnar]'"
+        ) from e
+
+
+def read_per_gene_count(info_file_path: Path) -> pd.DataFrame:
+    """Read the columns of per_gene_count.tsv used by ISG-VIP, without any processing."""
+    with span("read_per_gene_count", file_bytes=Path(info_file_path).stat().st_size) as s:
+        info = read_table(info_file_path, _PER_GENE_COUNT_COLUMNS)
+        s.data(info)
+        return info
+
+
+def in_shard(sample_ids: pd.Series, shard: Optional[tuple[int, int]]) -> np.ndarray:
+    """
+    Whether each sample belongs to `shard` (`(i, N)`: shard i of N), assigned by the CRC32
+    of its ID: stable across runs and machines, whatever the row order.
+    """
+    if shard is None:
+        return np.ones(len(sample_ids), dtype=bool)
+    index, count = shard
+    members = [
+        sample_id
+        for sample_id in pd.unique(sample_ids)
+        if zlib.crc32(str(sample_id).encode()) % count == index
+    ]
+    return sample_ids.isin(members).to_numpy()
 
 
 def load_per_gene_count(info_file_path: Path, gene_list_path: Path):
     """Load data and filter, then normalize"""
-    info = pd.read_csv(info_file_path, sep="\t")[
+    with span("load_per_gene_count") as s:
+        info = read_per_gene_count(info_file_path)
+        info = normalize_per_gene_count(info, gene_list_path)
+        s.data(info)
+        return info
+
+
+def iter_per_gene_count_chunks(
+    info_file_path: Path,
+    gene_list_path: Path,
+    chunk_size: int,
+    tmp_dir: Optional[Path] = None,
+    shard: Optional[tuple[int, int]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Load per_gene_count.tsv by chunks of `chunk_size` samples.
+
+    Each yielded chunk is what `load_per_gene_count` returns for its samples, so the
+    concatenation of the chunks equals the output of `load_per_gene_count` up to row order.
+    Samples are assigned to chunks in order of first appearance. Rows are first split into
+    one spill file per chunk under `tmp_dir`, so the samples do not need to be contiguous
+    in the file and only one chunk is held in memory.
+
+    :param info_file_path: per_gene_count.tsv path
+    :type info_file_path: Path
+    :param gene_list_path: all gene list
+    :type gene_list_path: Path
+    :param chunk_size: number of samples per chunk
+    :type chunk_size: int
+    :param tmp_dir: directory of the spill files (default: system temporary directory)
+    :type tmp_dir: Optional[Path]
+    :param shard: only load the samples of this shard (see `in_shard`)
+    :type shard: Optional[tuple[int, int]]
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive: {chunk_size}")
+
+    with tempfile.TemporaryDirectory(prefix="isg_vip_chunks_", dir=tmp_dir) as spill_dir:
+        spill_dir = Path(spill_dir)
+        sample_chunk = {}
+
+        for rows in iter_table_rows(info_file_path, _PER_GENE_COUNT_COLUMNS, _READ_ROWS):
+            if shard is not None:
+                rows = rows[in_shard(rows[PerGeneCountTsvCols.SAMPLE_ID], shard)]
+            sample_ids = rows[PerGeneCountTsvCols.SAMPLE_ID]
+            for sample_id in sample_ids.unique():
+                sample_chunk.setdefault(sample_id, len(sample_chunk) // chunk_size)
+            chunk_index = sample_ids.map(sample_chunk).to_numpy()
+            for c in np.unique(chunk_index):
+                with open(spill_dir / f"{c}.pkl", "ab") as f:
+                    pickle.dump(
+                        rows[chunk_index == c][_PER_GENE_COUNT_COLUMNS],
+                        f,
+                        protocol=pickle.HIGHEST_PROTOCOL,
+                    )
+
+        n_chunks = -(-len(sample_chunk) // chunk_size)
+        for c in range(n_chunks):
+            spill_path = spill_dir / f"{c}.pkl"
+            pieces = []
+            with open(spill_path, "rb") as f:
+                while True:
+                    try:
+                        pieces.append(pickle.load(f))
+                    except EOFError:
+                        break
+            spill_path.unlink()
+            yield normalize_per_gene_count(pd.concat(pieces), gene_list_path)
+
+
+def normalize_per_gene_count(info: pd.DataFrame, gene_list_path: Path):
+    """
+    Filter and normalize per-gene counts already in memory (see `load_per_gene_count`).
+
+    :param info: per_gene_count.tsv rows (`sample_id`, `hum_symbol`, `raw_count`, `type`)
+    :type info: pd.DataFrame
+    :param gene_list_path: all gene list
+    :type gene_list_path: Path
+    """
+    with span("normalize_per_gene_count") as s:
+        info = info[_PER_GENE_COUNT_COLUMNS]
+        info = info.rename(columns={PerGeneCountTsvCols.SAMPLE_ID: PerGeneCountTsvCols.ID})
+        info_filled = _zero_filling_missing_genes(gene_list_path, info)
+
+        # Calcurate following columns:
+        # all_sum: use raw_count. group by sample_id, then sum grouped values
+        # cntl_sum: use raw_count. group by sample_id and filtered by type == 'cntl' then sum values
+        info_filled = info_filled.assign(
+            **{
+                LoadedPerGeneCountTsvCols.ALL_SUM: info_filled.groupby(PerGeneCountTsvCols.ID)[
+                    PerGeneCountTsvCols.RAW_COUNT
+                ].transform("sum"),
+                LoadedPerGeneCountTsvCols.CNTL_SUM: info_filled.groupby(PerGeneCountTsvCols.ID)[
+                    PerGeneCountTsvCols.RAW_COUNT
+                ].transform(
+                    lambda x: x[
+                        info_filled.loc[x.index, PerGeneCountTsvCols.TYPE] == GeneType.CNTL
+                    ].sum()
+                ),
+            }
+        )
+        # WARNING: DO NOT CHANGE THRESHOLD as it was used during the model creation.
+        info_filled = info_filled[info_filled[LoadedPerGeneCountTsvCols.CNTL_SUM] > 10000]
+
+        # Normalization
+        info_filled = info_filled.assign(
+            **{
+                LoadedPerGeneCountTsvCols.NORM_CNTL: lambda x: x[PerGeneCountTsvCols.RAW_COUNT]
+                / x[LoadedPerGeneCountTsvCols.CNTL_SUM],
+                LoadedPerGeneCountTsvCols.NORM_CNTL_LOG: lambda x: np.log2(
+                    x[LoadedPerGeneCountTsvCols.NORM_CNTL] * (10e5) + 1
+                ),
+                LoadedPerGeneCountTsvCols.NORM_ALL: lambda x: x[PerGeneCountTsvCols.RAW_COUNT]
+                / x[LoadedPerGeneCountTsvCols.ALL_SUM],
+                LoadedPerGeneCountTsvCols.NORM_ALL_LOG: lambda x: np.log2(
+                    x[LoadedPerGeneCountTsvCols.NORM_ALL] * (10e5) + 1
+                ),
+            }
+        )
+
+        s.data(info_filled)
+        return info_filled
+
+
+def load_sample_metadata(metadata_file_path: Path) -> pd.DataFrame:
+    """
+    Load sample_metadata.tsv once and rename columns to the model feature names.
+
+    :param metadata_file_path: sample_metadata.tsv path
+    :type metadata_file_path: Path
+    :return: DataFrame with `ID`, `h_species` and `order` columns
+    :rtype: DataFrame
+    """
+    return rename_sample_metadata(read_sample_metadata(metadata_file_path))
+
+
+def read_sample_metadata(metadata_file_path: Path) -> pd.DataFrame:
+    """Read the columns of sample_metadata.tsv used by ISG-VIP, without renaming them."""
+    return read_table(
+        metadata_file_path,
         [
-            PerGeneCountTsvCols.SAMPLE_ID,
-            PerGeneCountTsvCols.HUM_SYMBOL,
-            PerGeneCountTsvCols.RAW_COUNT,
-            PerGeneCountTsvCols.TYPE,
-        ]
-    ]
-    info = info.rename(columns={PerGeneCountTsvCols.SAMPLE_ID: PerGeneCountTsvCols.ID})
-    info_filled = _zero_filling_missing_genes(gene_list_path, info)
-
-    # Calcurate following columns:
-    # all_sum: use raw_count. group by sample_id, then sum grouped values
-    # cntl_sum: use raw_count. group by sample_id and filtered by type == 'cntl' then sum values
-    info_filled = info_filled.assign(
-        **{
-            LoadedPerGeneCountTsvCols.ALL_SUM: info_filled.groupby(PerGeneCountTsvCols.ID)[
-                PerGeneCountTsvCols.RAW_COUNT
-            ].transform("sum"),
-            LoadedPerGeneCountTsvCols.CNTL_SUM: info_filled.groupby(PerGeneCountTsvCols.ID)[
-                PerGeneCountTsvCols.RAW_COUNT
-            ].transform(
-                lambda x: x[
-                    info_filled.loc[x.index, PerGeneCountTsvCols.TYPE] == GeneType.CNTL
-                ].sum()
-            ),
-        }
+            MetadataTsvCols.SAMPLE_ID,
+            MetadataTsvCols.SPECIES_HOST,
+            MetadataTsvCols.ORDER_HOST,
+        ],
     )
-    # WARNING: DO NOT CHANGE THRESHOLD as it was used during the model creation.
-    info_filled = info_filled[info_filled[LoadedPerGeneCountTsvCols.CNTL_SUM] > 10000]
-
-    # Normalization
-    info_filled = info_filled.assign(
-        **{
-            LoadedPerGeneCountTsvCols.NORM_CNTL: lambda x: x[PerGeneCountTsvCols.RAW_COUNT]
-            / x[LoadedPerGeneCountTsvCols.CNTL_SUM],
-            LoadedPerGeneCountTsvCols.NORM_CNTL_LOG: lambda x: np.log2(
-                x[LoadedPerGeneCountTsvCols.NORM_CNTL] * (10e5) + 1
-            ),
-            LoadedPerGeneCountTsvCols.NORM_ALL: lambda x: x[PerGeneCountTsvCols.RAW_COUNT]
-            / x[LoadedPerGeneCountTsvCols.ALL_SUM],
-            LoadedPerGeneCountTsvCols.NORM_ALL_LOG: lambda x: np.log2(
-                x[LoadedPerGeneCountTsvCols.NORM_ALL] * (10e5) + 1
-            ),
+
+
+def rename_sample_metadata(meta_info: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rename sample_metadata.tsv columns already in memory to the model feature names.
+
+    :param meta_info: sample_metadata.tsv rows (`sample_id`, `species_host`, `order_host`)
+    :type meta_info: DataFrame
+    :return: DataFrame with `ID`, `h_species` and `order` columns
+    :rtype: DataFrame
+    """
+    meta_info = meta_info.rename(
+        columns={
+            MetadataTsvCols.SAMPLE_ID: MetadataTsvCols.ID,
+            MetadataTsvCols.SPECIES_HOST: MetadataTsvCols.H_SPECIES,
+            MetadataTsvCols.ORDER_HOST: MetadataTsvCols.ORDER,
         }
     )
-
-    return info_filled
+    return meta_info[[MetadataTsvCols.ID, MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]]
 
 
 def _zero_filling_missing_genes(gene_list_path: Path, info: pd.DataFrame):
@@ -1,17 +1,34 @@
 # SPDX-License-Identifier: GPL-3.0-only
 # SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
 
+import hashlib
+import json
 import logging
-from dataclasses import dataclass
+import mmap
+import pickle
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Any, ClassVar, Dict, Tuple
+from typing import Any, ClassVar, Dict, Optional, Tuple
 
 import joblib
 import numpy as np
+from joblib.numpy_pickle import NumpyUnpickler
+
+from isg_vip.preprocessing.category_lookup import EncoderLookup
+from isg_vip.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+BUNDLE_FORMAT_VERSION = 2
+"""Increase when the layout of the compiled bundle changes."""
+
+_BUNDLE_MAGIC = b"ISGVIPB2"
+_BUNDLE_ALIGN = 64
+
 
 class ModelType(str, Enum):
     LGB = "lgb"
@@ -19,71 +36,353 @@ class ModelType(str, Enum):
     META = "meta"
 
 
+MAIN_MODULE_ALIASES = {"CustomNormalizer": "isg_vip.prediction.ensemble"}
+"""Modules of the classes which the model pickles refer to as `__main__.<name>`."""
+
+
+class _ArtifactUnpickler(NumpyUnpickler):
+    """joblib unpickler resolving the classes pickled from the training script."""
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == "__main__" and name in MAIN_MODULE_ALIASES:
+            module = MAIN_MODULE_ALIASES[name]
+        return super().find_class(module, name)
+
+
+def load_pickle(path: Path) -> Any:
+    """`joblib.load` for the model files, without patching `__main__`."""
+    with span("unpickle", file=path.name, file_bytes=path.stat().st_size), open(path, "rb") as f:
+        if f.read(1) != pickle.PROTO:
+            # Compressed or legacy joblib file
+            return joblib.load(path)
+        f.seek(0)
+        return _ArtifactUnpickler(str(path), f).load()
+
+
+class _LazyArtifact:
+    """Pickled artifact which is loaded on first access."""
+
+    _UNSET: ClassVar[object] = object()
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._value = self._UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not self._UNSET
+
+    def get(self) -> Any:
+        if self._value is self._UNSET:
+            with self._lock:
+                if self._value is self._UNSET:
+                    logger.debug(f"Load {self.path}")
+                    self._value = load_pickle(self.path)
+        return self._value
+
+
+def _resolve(artifact: Any) -> Any:
+    if isinstance(artifact, _LazyArtifact):
+        return artifact.get()
+    return artifact
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_record(path: Path) -> Dict[str, Any]:
+    """SHA-256, size and modification time of a model file, as recorded in a bundle."""
+    stat = path.stat()
+    return {"sha256": _sha256(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_checksums(checksums_path: Path) -> Dict[str, str]:
+    """
+    Read `checksums.sha256` (sha256sum format).
+
+    :param checksums_path: checksum file path
+    :type checksums_path: Path
+    :return: file name (without directory) -> sha256 hex digest
+    :rtype: Dict[str, str]
+    """
+    checksums = {}
+    with open(checksums_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            digest, name = line.split(maxsplit=1)
+            checksums[Path(name.lstrip("*")).name] = digest
+    return checksums
+
+
+def model_checksum(model_dir: Path, checksums_path: Optional[Path] = None) -> str:
+    """
+    SHA-256 identifying a version of the models: of the entries of `checksums_path` when
+    given, else of the model files in `model_dir`.
+    """
+    if checksums_path is not None:
+        checksums = read_checksums(checksums_path)
+    else:
+        checksums = {
+            path.name: _sha256(path)
+            for path in model_dir.iterdir()
+            if path.suffix in (".pkl", ".npy")
+        }
+    digest = hashlib.sha256()
+    for name, file_digest in sorted(checksums.items()):
+        digest.update(f"{file_digest}  {name}\n".encode())
+    return digest.hexdigest()
+
+
 @dataclass(frozen=True)
 class ISGModelArtifacts:
     """
     An immutable container holding loaded ISG model artifacts.
+
+    Artifacts loaded with `lazy=True` are kept as placeholders and unpickled the first time
+    they are requested through the `get_*` methods.
+    Encoder lookups (`get_encoder_lookup`) are compiled once per encoder, when all artifacts
+    are loaded or else on first request.
     """
 
     encoders: Dict[ModelType, Tuple[Any, ...]]
     final_models: Dict[ModelType, Tuple[Any, ...]]
     normalizers: Tuple[Any, ...]
     thresholds: Dict[ModelType, Any]
+    _encoder_lookups: Dict[Tuple[ModelType, int], EncoderLookup] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
     _N_FOLDS: ClassVar[int] = 5
 
     @classmethod
-    def from_directory(cls, model_dir: Path) -> "ISGModelArtifacts":
-        temp_encoders = {t: [] for t in ModelType}
-        temp_models = {t: [] for t in ModelType}
-        temp_normalizers = []
-        temp_thresholds = {}
+    def _collect_paths(cls, model_dir: Path):
+        encoder_paths = {t: [] for t in ModelType}
+        model_paths = {t: [] for t in ModelType}
+        normalizer_paths = []
+        threshold_paths = {}
 
         missing_files = []
 
+        def _check(path: Path, dest: list):
+            if not path.exists():
+                missing_files.append(str(path))
+            else:
+                dest.append(path)
+
         for fold in range(cls._N_FOLDS):
             # Normalizer
-            norm_path = model_dir / f"normalizer_{fold}.pkl"
-            if not norm_path.exists():
-                missing_files.append(str(norm_path))
-            else:
-                temp_normalizers.append(joblib.load(norm_path))
+            _check(model_dir / f"normalizer_{fold}.pkl", normalizer_paths)
 
             # Encoder & Final Model
             for m_type in ModelType:
-                enc_path = model_dir / f"encoder_{m_type.value}_{fold}.pkl"
-                mod_path = model_dir / f"final_model_{m_type.value}_{fold}.pkl"
-
-                if not enc_path.exists():
-                    missing_files.append(str(enc_path))
-                else:
-                    temp_encoders[m_type].append(joblib.load(enc_path))
-
-                if not mod_path.exists():
-                    missing_files.append(str(mod_path))
-                else:
-                    temp_models[m_type].append(joblib.load(mod_path))
+                _check(model_dir / f"encoder_{m_type.value}_{fold}.pkl", encoder_paths[m_type])
+                _check(model_dir / f"final_model_{m_type.value}_{fold}.pkl", model_paths[m_type])
 
-        # read thresholds
+        # thresholds
         for m_type in ModelType:
             th_path = model_dir / f"thresholds_{m_type.value}.npy"
             if not th_path.exists():
                 missing_files.append(str(th_path))
             else:
-                temp_thresholds[m_type] = np.load(th_path)
+                threshold_paths[m_type] = th_path
 
         if missing_files:
             raise FileNotFoundError(
                 f"Missing required model files ({len(missing_files)}):\n" + "\n".join(missing_files)
             )
 
+        return encoder_paths, model_paths, normalizer_paths, threshold_paths
+
+    @classmethod
+    def _source_paths(cls, model_dir: Path) -> list[Path]:
+        """Every model file of `model_dir`, sorted."""
+        encoder_paths, model_paths, normalizer_paths, threshold_paths = cls._collect_paths(
+            model_dir
+        )
+        source_paths = list(normalizer_paths) + list(threshold_paths.values())
+        for m_type in ModelType:
+            source_paths.extend(encoder_paths[m_type])
+            source_paths.extend(model_paths[m_type])
+        return sorted(source_paths)
+
+    @classmethod
+    def from_directory(
+        cls, model_dir: Path, lazy: bool = False, n_jobs: int = 1
+    ) -> "ISGModelArtifacts":
+        """
+        Load artifacts from `model_dir`.
+
+        :param model_dir: directory containing encoders, models, normalizers and thresholds
+        :type model_dir: Path
+        :param lazy: if True, each pickle is loaded the first time its fold/model is requested
+        :type lazy: bool
+        :param n_jobs: number of threads used to load all pickles (ignored when `lazy`)
+        :type n_jobs: int
+        """
+        encoder_paths, model_paths, normalizer_paths, threshold_paths = cls._collect_paths(
+            model_dir
+        )
+
+        lazy_encoders = {k: tuple(_LazyArtifact(p) for p in v) for k, v in encoder_paths.items()}
+        lazy_models = {k: tuple(_LazyArtifact(p) for p in v) for k, v in model_paths.items()}
+        lazy_normalizers = tuple(_LazyArtifact(p) for p in normalizer_paths)
+        thresholds = {k: np.load(p) for k, p in threshold_paths.items()}
+
+        artifacts = cls(
+            encoders=lazy_encoders,
+            final_models=lazy_models,
+            normalizers=lazy_normalizers,
+            thresholds=thresholds,
+        )
+        if lazy:
+            logger.info("Models will be loaded on demand.")
+            return artifacts
+
+        artifacts = artifacts.materialize(n_jobs=n_jobs)
         logger.info("Success to load models.")
-        return cls(
-            encoders={k: tuple(v) for k, v in temp_encoders.items()},
-            final_models={k: tuple(v) for k, v in temp_models.items()},
-            normalizers=tuple(temp_normalizers),
-            thresholds=temp_thresholds,
+        return artifacts
+
+    def _placeholders(self) -> list:
+        placeholders = list(self.normalizers)
+        for m_type in ModelType:
+            placeholders.extend(self.encoders[m_type])
+            placeholders.extend(self.final_models[m_type])
+        return [a for a in placeholders if isinstance(a, _LazyArtifact)]
+
+    def materialize(self, n_jobs: int = 1) -> "ISGModelArtifacts":
+        """
+        Return artifacts with every pickle loaded, using `n_jobs` threads.
+        """
+        pending = [a for a in self._placeholders() if not a.loaded]
+        if n_jobs > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                list(executor.map(_LazyArtifact.get, pending))
+        else:
+            for artifact in pending:
+                artifact.get()
+
+        artifacts = ISGModelArtifacts(
+            encoders={k: tuple(map(_resolve, v)) for k, v in self.encoders.items()},
+            final_models={k: tuple(map(_resolve, v)) for k, v in self.final_models.items()},
+            normalizers=tuple(map(_resolve, self.normalizers)),
+            thresholds=self.thresholds,
         )
+        artifacts._compile_encoder_lookups()
+        return artifacts
+
+    @classmethod
+    def compile_bundle(
+        cls,
+        model_dir: Path,
+        bundle_path: Path,
+        checksums_path: Optional[Path] = None,
+        n_jobs: int = 1,
+    ) -> "ISGModelArtifacts":
+        """
+        Load `model_dir` and write every artifact into the single file `bundle_path`.
+
+        When `checksums_path` is given, each source file is verified against it first.
+        The header of the bundle records the SHA-256, size and modification time of every
+        source file. The artifacts are a single pickle (protocol 5) whose contiguous numpy
+        buffers are stored out-of-band, so that they are memory-mapped instead of copied
+        when loaded.
+        """
+        sources = {p.name: _source_record(p) for p in cls._source_paths(model_dir)}
+
+        if checksums_path is not None:
+            source_sha256 = {name: record["sha256"] for name, record in sources.items()}
+            _verify_checksums(source_sha256, read_checksums(checksums_path), checksums_path)
+
+        artifacts = cls.from_directory(model_dir, n_jobs=n_jobs)
+        _write_bundle(
+            bundle_path,
+            {"format_version": BUNDLE_FORMAT_VERSION, "sources": sources},
+            {
+                "encoders": artifacts.encoders,
+                "final_models": artifacts.final_models,
+                "normalizers": artifacts.normalizers,
+                "thresholds": artifacts.thresholds,
+            },
+        )
+        logger.info(f"Model bundle was exported to {bundle_path}")
+        return artifacts
+
+    @classmethod
+    def from_bundle(
+        cls,
+        bundle_path: Path,
+        checksums_path: Optional[Path] = None,
+        model_dir: Optional[Path] = None,
+    ) -> "ISGModelArtifacts":
+        """
+        Load artifacts from a file written by `compile_bundle`.
+
+        The source files recorded in the bundle header are checked before the artifacts are
+        read: against `checksums_path` and against the model files of `model_dir`, when given
+        (files whose size and modification time are unchanged are not hashed again).
+
+        :raises ValueError: if the bundle is truncated, corrupt or of an outdated format, or
+            was not built from the model files listed in `checksums_path` or found in
+            `model_dir`
+        """
+        view = _map_bundle(bundle_path)
+        header, payload_start = _read_bundle_header(view, bundle_path)
+        if header.get("format_version") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported model bundle format: {bundle_path}")
+        sources = header["sources"]
+        if checksums_path is not None:
+            source_sha256 = {name: record["sha256"] for name, record in sources.items()}
+            _verify_checksums(source_sha256, read_checksums(checksums_path), bundle_path)
+        if model_dir is not None:
+            _verify_sources(sources, cls._source_paths(model_dir), bundle_path)
+
+        with span("read_bundle", file_bytes=len(view)):
+            bundle = _read_bundle_payload(view, payload_start, bundle_path)
+
+        logger.info(f"Success to load model bundle {bundle_path}.")
+        artifacts = cls(
+            encoders=bundle["encoders"],
+            final_models=bundle["final_models"],
+            normalizers=bundle["normalizers"],
+            thresholds=bundle["thresholds"],
+        )
+        artifacts._compile_encoder_lookups()
+        return artifacts
+
+    @classmethod
+    def load(
+        cls,
+        model_dir: Path,
+        bundle_path: Optional[Path] = None,
+        checksums_path: Optional[Path] = None,
+        lazy: bool = False,
+        n_jobs: int = 1,
+    ) -> "ISGModelArtifacts":
+        """
+        Load artifacts, using (and creating if needed) the compiled bundle when given.
+
+        A bundle that is unreadable, or does not match the model files of `model_dir` or
+        `checksums_path`, is rebuilt from `model_dir`.
+        """
+        with span("load_artifacts", bundle=bundle_path is not None, lazy=lazy):
+            if bundle_path is None:
+                return cls.from_directory(model_dir, lazy=lazy, n_jobs=n_jobs)
+
+            if bundle_path.exists():
+                try:
+                    return cls.from_bundle(bundle_path, checksums_path, model_dir)
+                except ValueError as e:
+                    logger.warning(f"{e}; rebuilding model bundle.")
+
+            return cls.compile_bundle(model_dir, bundle_path, checksums_path, n_jobs=n_jobs)
 
     def _validate_fold(self, fold: int):
         if not (0 <= fold < self._N_FOLDS):
@@ -91,15 +390,143 @@ class ISGModelArtifacts:
 
     def get_encoder(self, model_type: ModelType, fold: int) -> Any:
         self._validate_fold(fold)
-        return self.encoders[model_type][fold]
+        return _resolve(self.encoders[model_type][fold])
+
+    def get_encoder_lookup(self, model_type: ModelType, fold: int) -> EncoderLookup:
+        """Category -> one-hot column lookup of `get_encoder(model_type, fold)`."""
+        self._validate_fold(fold)
+        key = (model_type, fold)
+        lookup = self._encoder_lookups.get(key)
+        if lookup is None:
+            lookup = EncoderLookup(self.get_encoder(model_type, fold))
+            self._encoder_lookups[key] = lookup
+        return lookup
+
+    def _compile_encoder_lookups(self):
+        for m_type in ModelType:
+            for fold in range(self._N_FOLDS):
+                self.get_encoder_lookup(m_type, fold)
 
     def get_model(self, model_type: ModelType, fold: int) -> Any:
         self._validate_fold(fold)
-        return self.final_models[model_type][fold]
+        return _resolve(self.final_models[model_type][fold])
 
     def get_normalizer(self, fold: int) -> Any:
         self._validate_fold(fold)
-        return self.normalizers[fold]
+        return _resolve(self.normalizers[fold])
 
     def get_threshold(self, model_type: ModelType) -> Any:
         return self.thresholds[model_type]
+
+
+def _verify_checksums(actual: Dict[str, str], expected: Dict[str, str], source: Path):
+    mismatched = [name for name, digest in sorted(actual.items()) if expected.get(name) != digest]
+    if mismatched:
+        raise ValueError(
+            f"Checksum mismatch between {source} and checksums ({len(mismatched)}):\n"
+            + "\n".join(mismatched)
+        )
+
+
+def _verify_sources(sources: Dict[str, dict], source_paths: list[Path], bundle_path: Path):
+    """
+    :param sources: source files recorded in the bundle header (see `_source_record`)
+    :param source_paths: current model files
+    :raises ValueError: if a model file was added, removed or modified since the bundle was
+        built
+    """
+    changed = sorted({p.name for p in source_paths} ^ set(sources))
+    for path in source_paths:
+        record = sources.get(path.name)
+        if record is None:
+            continue
+        stat = path.stat()
+        if (stat.st_size, stat.st_mtime_ns) == (record["size"], record["mtime_ns"]):
+            continue
+        if stat.st_size != record["size"] or _sha256(path) != record["sha256"]:
+            changed.append(path.name)
+    if changed:
+        raise ValueError(
+            f"Model files changed since {bundle_path} was built ({len(changed)}):\n"
+            + "\n".join(sorted(changed))
+        )
+
+
+def _write_bundle(bundle_path: Path, header: dict, payload: dict):
+    """
+    Bundle layout:
+    magic | header length | header (JSON) | pickle length | number of buffers |
+    (offset, length) per buffer | pickle | buffers
+    """
+    header_data = json.dumps(header, sort_keys=True).encode("utf-8")
+    buffers = []
+    data = pickle.dumps(payload, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [b.raw() for b in buffers]
+
+    offset = len(_BUNDLE_MAGIC) + 8 + len(header_data) + 16 + 16 * len(raw_buffers) + len(data)
+    table = []
+    for raw in raw_buffers:
+        offset = -(-offset // _BUNDLE_ALIGN) * _BUNDLE_ALIGN
+        table.append((offset, raw.nbytes))
+        offset += raw.nbytes
+
+    bundle_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = bundle_path.with_name(bundle_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_BUNDLE_MAGIC)
+        f.write(struct.pack("<Q", len(header_data)))
+        f.write(header_data)
+        f.write(struct.pack("<QQ", len(data), len(raw_buffers)))
+        for buf_offset, length in table:
+            f.write(struct.pack("<QQ", buf_offset, length))
+        f.write(data)
+        for (buf_offset, _), raw in zip(table, raw_buffers):
+            f.write(b"\0" * (buf_offset - f.tell()))
+            f.write(raw)
+    tmp_path.replace(bundle_path)
+
+
+def _map_bundle(bundle_path: Path) -> memoryview:
+    """:raises ValueError: if the bundle is empty"""
+    with open(bundle_path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            raise ValueError(f"Empty model bundle: {bundle_path}")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _read_bundle_header(view: memoryview, bundle_path: Path) -> tuple[dict, int]:
+    """
+    :return: the header, and the position of the pickle length
+    :raises ValueError: if the file is not a model bundle or is truncated
+    """
+    magic_size = len(_BUNDLE_MAGIC)
+    if bytes(view[:magic_size]) != _BUNDLE_MAGIC:
+        raise ValueError(f"Not a model bundle: {bundle_path}")
+    try:
+        (header_size,) = struct.unpack_from("<Q", view, magic_size)
+        header_start = magic_size + 8
+        if header_start + header_size > len(view):
+            raise ValueError("header past the end of the file")
+        header = json.loads(bytes(view[header_start : header_start + header_size]))
+        if not isinstance(header, dict):
+            raise ValueError("header is not a JSON object")
+    except (struct.error, ValueError) as e:
+        raise ValueError(f"Truncated or corrupt model bundle ({e}): {bundle_path}") from e
+    return header, header_start + header_size
+
+
+def _read_bundle_payload(view: memoryview, start: int, bundle_path: Path) -> dict:
+    """:raises ValueError: if the bundle is truncated or corrupt"""
+    try:
+        data_size, n_buffers = struct.unpack_from("<QQ", view, start)
+        table = [struct.unpack_from("<QQ", view, start + 16 + 16 * i) for i in range(n_buffers)]
+        data_start = start + 16 + 16 * n_buffers
+        ends = [data_start + data_size] + [offset + length for offset, length in table]
+        if max(ends) > len(view):
+            raise ValueError("data past the end of the file")
+        return pickle.loads(
+            view[data_start : data_start + data_size],
+            buffers=[view[offset : offset + length] for offset, length in table],
+        )
+    except (struct.error, pickle.UnpicklingError, EOFError, ValueError) as e:
+        raise ValueError(f"Truncated or corrupt model bundle ({e}): {bundle_path}") from e
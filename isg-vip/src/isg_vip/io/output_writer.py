@@ -4,46 +4,130 @@
 import logging
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
+from isg_vip.io.constants import OutputFormat
+from isg_vip.io.csv_writer import write_delimited
+from isg_vip.utils.tracing import span
+
 logger = logging.getLogger(__name__)
 
 
 def write_to_csv(df: DataFrame, output_path: Path) -> None:
     output_path.parent.mkdir(parents=True, exist_ok=True)
     logger.info(f"CSV file was exported to {output_path}")
-    df.to_csv(
-        output_path,
-        index=False,
-    )
+    write_delimited(df, output_path)
 
 
-def export_final_prediction(
-    dir_name: Path,
-    merged_df: DataFrame,
-    all_dfs: list,
-):
-    for df in all_dfs:
-        merged_df = pd.merge(merged_df, df, on="ID", how="inner")
+def write_table(
+    df: DataFrame, dir_name: Path, base_name: str, output_format: str = OutputFormat.CSV
+) -> Path:
+    """
+    Write `df` to `dir_name / f"{base_name}.{output_format}"`.
 
-    label_cols = [f"Prediction_score_fold{n}" for n in range(5)]
-    merged_df["Final_Prediction_score(mean)"] = merged_df[label_cols].mean(axis=1)
-    label_cols = [f"Prediction_Label_fold{n}" for n in range(5)]
-    merged_df["Final_Prediction_Label"] = merged_df[label_cols].mode(axis=1)[0]
+    Compressed CSV files decompress to the bytes of the plain CSV file (gzip headers hold
+    no timestamp, so outputs are reproducible). Parquet and Feather files need pyarrow.
 
-    # Save final results
-    merged_df = merged_df.sort_values(by="ID")
-    base_name = "Infection_Prediction_Stacking_all"
-    write_to_csv(merged_df, dir_name / f"{base_name}.csv")
+    :param output_format: one of `OutputFormat.ALL`
+    :return: written file
+    """
+    if output_format not in OutputFormat.ALL:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+    output_path = dir_name / f"{base_name}.{output_format}"
+    with span("write_table", file=output_path.name) as s:
+        s.data(df)
+        _write_table(df, output_path, output_format)
+        s.set(file_bytes=output_path.stat().st_size)
+    return output_path
+
+
+def _write_table(df: DataFrame, output_path: Path, output_format: str):
+    if output_format == OutputFormat.CSV:
+        write_to_csv(df, output_path)
+        return
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_format == OutputFormat.PARQUET:
+        logger.info(f"Parquet file was exported to {output_path}")
+        df.to_parquet(output_path, index=False)
+    elif output_format == OutputFormat.FEATHER:
+        logger.info(f"Feather file was exported to {output_path}")
+        # Feather does not store the index
+        df.reset_index(drop=True).to_feather(output_path)
+    else:
+        method = {
+            OutputFormat.CSV_GZ: {"method": "gzip", "mtime": 0},
+            OutputFormat.CSV_BZ2: {"method": "bz2"},
+            OutputFormat.CSV_XZ: {"method": "xz"},
+        }[output_format]
+        logger.info(f"CSV file was exported to {output_path}")
+        df.to_csv(output_path, index=False, compression=method)
+
+
+def fold_vote_frame(merged_df: DataFrame, scores: np.ndarray, positive: np.ndarray) -> DataFrame:
+    """
+    Add the meta model results of every fold, the final mean score and the majority vote
+    label to the sample metadata (columns of `Infection_Prediction_Stacking_all.csv`).
+
+    :param merged_df: sample metadata, one row per sample (RangeIndex)
+    :param scores: samples x folds meta model scores, in the rows of `merged_df`
+    :param positive: samples x folds positive labels
+    """
+    mean_score, final_positive = vote_fold_predictions(scores, positive)
+
+    columns = {}
+    for n in range(scores.shape[1]):
+        columns[f"Prediction_score_fold{n}"] = scores[:, n]
+        columns[f"Prediction_Label_fold{n}"] = _prediction_labels(positive[:, n])
+    columns["Final_Prediction_score(mean)"] = mean_score
+    columns["Final_Prediction_Label"] = _prediction_labels(final_positive)
 
+    return pd.concat([merged_df, DataFrame(columns)], axis=1)
+
+
+def vote_fold_predictions(
+    scores: np.ndarray, positive: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Mean score and majority vote of the folds.
+
+    On a tie the label is negative, as the first of the sorted most frequent labels
+    ("Negative" < "Positive").
+
+    :param scores: samples x folds meta model scores
+    :param positive: samples x folds positive labels
+    :return: mean score and final positive label of each sample
+    """
+    n_positive = np.count_nonzero(positive, axis=1)
+    return scores.mean(axis=1), 2 * n_positive > positive.shape[1]
+
+
+def _prediction_labels(positive: np.ndarray) -> np.ndarray:
+    return np.where(positive, "Positive", "Negative").astype(object)
+
+
+def final_prediction_frame(merged_df: DataFrame) -> DataFrame:
+    """
+    `Infection_Prediction_Stacking_final.csv` from `Infection_Prediction_Stacking_all.csv`.
+    """
     final_df = merged_df[["ID", "Final_Prediction_score(mean)", "Final_Prediction_Label"]]
-    final_df = final_df.rename(
+    return final_df.rename(
         columns={
             "Final_Prediction_score(mean)": "Prediction_score(mean)",
             "Final_Prediction_Label": "Prediction_Label",
         }
     )
 
+
+def write_stacking_predictions(
+    dir_name: Path, merged_df: DataFrame, output_format: str = OutputFormat.CSV
+):
+    """Save `Infection_Prediction_Stacking_all.csv` and the final predictions."""
+    base_name = "Infection_Prediction_Stacking_all"
+    write_table(merged_df, dir_name, base_name, output_format)
+
     base_name_final = "Infection_Prediction_Stacking_final"
-    write_to_csv(final_df, dir_name / f"{base_name_final}.csv")
+    write_table(final_prediction_frame(merged_df), dir_name, base_name_final, output_format)
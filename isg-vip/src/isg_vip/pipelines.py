@@ -4,49 +4,121 @@
 import argparse
 import logging
 import os
-import sys
 import warnings
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-import pandas as pd
-from pandas.errors import PerformanceWarning
-from sklearn.exceptions import (
-    # NOTE: This class contains, but cause IDE error
-    InconsistentVersionWarning,  # type: ignore
-)
-
-from isg_vip.io.constants import (
-    LoadedPerGeneCountTsvCols,
-    MetadataTsvCols,
-    PerGeneCountTsvCols,
-)
-
-# HACK: Add to __main__ namespace to import .pkl model
-from isg_vip.prediction.ensemble import (
-    CustomNormalizer,
-)
-
-setattr(sys.modules["__main__"], "CustomNormalizer", CustomNormalizer)
-from isg_vip import __version__  # noqa: E402
-from isg_vip.io.data_loader import load_per_gene_count  # noqa: E402
-from isg_vip.io.model_loader import ISGModelArtifacts  # noqa: E402
-from isg_vip.io.output_writer import export_final_prediction  # noqa: E402
-from isg_vip.prediction.ensemble import (  # noqa: E402
-    execute_prediction,
-)
-from isg_vip.prediction.run_inference import predict_each_fold  # noqa: E402
-from isg_vip.utils.logger import setup_logger  # noqa: E402
+# NOTE: pandas, scikit-learn and LightGBM are imported by the functions which need them,
+# so that `--help` and `--version` return without loading them.
+from isg_vip import __version__
+from isg_vip.io.constants import InputFormat, MetadataTsvCols, OutputFormat
+from isg_vip.utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    from isg_vip.io.model_loader import ISGModelArtifacts
+    from isg_vip.prediction.score_cache import ScoreCache
 
 PACKAGE_ROOT = Path(__file__).resolve().parent
-print(PACKAGE_ROOT)
 MODEL_DIR = PACKAGE_ROOT / "model_dir"
 GENE_LIST_PATH = PACKAGE_ROOT / "reference" / "gene_list.txt"
+# NOTE: only available in a source checkout (not installed as package data)
+CHECKSUMS_PATH = PACKAGE_ROOT.parent.parent / "checksums.sha256"
+
+COLUMNS_TO_PROCESS = [MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]  # Target columns
+EXCLUDE_COLUMNS = [
+    MetadataTsvCols.ID,
+    MetadataTsvCols.H_SPECIES,
+    MetadataTsvCols.ORDER,
+]  # Columns to exclude
 
 CWD = Path.cwd()
 INPUT_DIR = CWD / "input"
 OUTPUT_DIR = CWD / "output"
 
 
+def add_model_arguments(parser: argparse.ArgumentParser, base_models: bool = True):
+    """
+    Options on how models are loaded and evaluated (shared with `isg-vip serve` and
+    `isg-vip shard meta`).
+
+    :param base_models: also the options on the base models and their input
+    """
+    parser.add_argument(
+        "--model_bundle",
+        required=False,
+        default=None,
+        help="Compiled model bundle file. Created from the model directory if it does not exist "
+        "or does not match the checksums, then reused on later runs.",
+    )
+
+    parser.add_argument(
+        "--checksums",
+        required=False,
+        default=CHECKSUMS_PATH if CHECKSUMS_PATH.exists() else None,
+        help="checksums.sha256 used to validate the model bundle.",
+    )
+
+    parser.add_argument(
+        "--load_jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of threads used to load model files.",
+    )
+
+    parser.add_argument(
+        "--tree_engine",
+        required=False,
+        choices=["native", "numpy"],
+        default="native",
+        help="Evaluator for the LightGBM and meta tree models. "
+        "'numpy' scores all folds at once with a pure-NumPy engine (no OpenMP).",
+    )
+
+    if not base_models:
+        return
+
+    parser.add_argument(
+        "--fused_lr",
+        action="store_true",
+        help="Score the LogisticRegression models of all folds as one matrix product.",
+    )
+
+    parser.add_argument(
+        "--score_cache",
+        required=False,
+        default=None,
+        help="Cache file of the base model scores of each sample. Samples already in the "
+        "cache are not scored again.",
+    )
+
+    parser.add_argument(
+        "--score_cache_size",
+        required=False,
+        type=int,
+        default=256,
+        help="Maximum size of the score cache in MB; least recently used samples are evicted.",
+    )
+
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Hold the features in float32 with categorical host columns: half the size, "
+        "base model scores within 1e-5 of the default float64 run.",
+    )
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse `i/N` (shard i of N, 0 <= i < N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"expected 0 <= i < N, got {value!r}")
+    return index, count
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         prog="isg_vip",
@@ -79,21 +151,135 @@ def parse_args():
         help="Output directory.",
     )
 
+    parser.add_argument(
+        "--output_format",
+        required=False,
+        choices=OutputFormat.ALL,
+        default=OutputFormat.CSV,
+        help="Format of the result tables: CSV (optionally compressed), Parquet or Feather. "
+        "Parquet and Feather need pyarrow.",
+    )
+
+    add_model_arguments(parser)
+
+    parser.add_argument(
+        "--chunk_size",
+        required=False,
+        type=int,
+        default=None,
+        help="Process the samples by chunks of this size to bound memory usage. "
+        "The Infection_Prediction_Stacking files are identical to an in-memory run; "
+        "LogisticRegression scores in Infection_Prediction_{n} may differ in the last digit "
+        "(every file is identical with --fused_lr).",
+    )
+
+    parser.add_argument(
+        "--scores_out",
+        required=False,
+        default=None,
+        help="Also write the raw per-fold base and meta model scores to this file (.npz), "
+        "for `isg-vip relabel`.",
+    )
+
+    parser.add_argument(
+        "--shard",
+        required=False,
+        type=parse_shard,
+        default=None,
+        metavar="i/N",
+        help="Score the base models on shard i of N (0-based) of the samples, assigned by "
+        "sample ID, and write them to --partial_out instead of the tables: first step of "
+        "a run split over machines (see `isg-vip shard`).",
+    )
+
+    parser.add_argument(
+        "--partial_out",
+        required=False,
+        default=None,
+        help="Partial file of the shard (.npz), with --shard.",
+    )
+
+    parser.add_argument(
+        "--write_jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes formatting large CSV tables. "
+        "Outputs are identical to a single-process run.",
+    )
+
+    parser.add_argument(
+        "--trace_out",
+        required=False,
+        default=None,
+        help="Write a timeline of the prediction stages (Chrome trace JSON, for "
+        "chrome://tracing or Perfetto) with the rows, bytes and peak memory of each stage. "
+        "Memory tracing slows down the run.",
+    )
+
+    parser.add_argument(
+        "--profile",
+        required=False,
+        default=None,
+        help="Write cProfile statistics of the whole run to this file (read with pstats).",
+    )
+
     args = parser.parse_args()
-    gene_count_file = Path(args.gene_count_file).resolve()
-    metadata_file = Path(args.metadata).resolve()
-    output_dir = Path(args.output)
+    args.gene_count_file = Path(args.gene_count_file).resolve()
+    args.metadata = Path(args.metadata).resolve()
+    args.output = Path(args.output)
+    for name in [
+        "model_bundle",
+        "checksums",
+        "score_cache",
+        "scores_out",
+        "partial_out",
+        "trace_out",
+        "profile",
+    ]:
+        if getattr(args, name) is not None:
+            setattr(args, name, Path(getattr(args, name)))
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk_size must be a positive integer.")
+    if args.score_cache_size < 1:
+        parser.error("--score_cache_size must be a positive integer.")
+    if args.write_jobs < 1:
+        parser.error("--write_jobs must be a positive integer.")
+    if (args.shard is None) != (args.partial_out is None):
+        parser.error("--shard and --partial_out are used together.")
+    if args.shard is not None and args.scores_out is not None:
+        parser.error("--scores_out: scores of a sharded run are written by `isg-vip shard merge`.")
+    needs_pyarrow = [
+        name
+        for name, uses_pyarrow in [
+            ("--gene_count_file", InputFormat.of(args.gene_count_file) in InputFormat.COLUMNAR),
+            ("--metadata", InputFormat.of(args.metadata) in InputFormat.COLUMNAR),
+            ("--output_format", args.output_format in OutputFormat.COLUMNAR),
+        ]
+        if uses_pyarrow
+    ]
+    if needs_pyarrow:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            parser.error(
+                f"{', '.join(needs_pyarrow)}: Parquet and Feather need pyarrow "
+                f"(pip install 'isg-vip[columnar]'): {e}"
+            )
     # Output directory
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    if args.shard is None and not os.path.exists(args.output):
+        os.makedirs(args.output)
 
-    return (gene_count_file, metadata_file, output_dir)
+    return args
 
 
-def main():
-    (gene_count_file, metadata_file, output_dir) = parse_args()
+def suppress_warnings():
+    from pandas.errors import PerformanceWarning
+    from sklearn.exceptions import (
+        # NOTE: This class contains, but cause IDE error
+        InconsistentVersionWarning,  # type: ignore
+    )
 
-    logger = setup_logger(None, level=logging.INFO)
     # NOTE: ignore, this code do not concern about performance
     warnings.simplefilter("ignore", category=PerformanceWarning)
     # NOTE: this cause future warnings:
@@ -104,87 +290,217 @@ def main():
     # TODO: When updating model, remove this supress.
     warnings.simplefilter("ignore", category=InconsistentVersionWarning)
 
-    # Files load
+
+def load_artifacts(
+    model_bundle: Optional[Path], checksums: Optional[Path], load_jobs: int, logger: logging.Logger
+) -> "ISGModelArtifacts":
+    """Load models from `MODEL_DIR` (or the bundle), exit on missing or invalid files."""
+    from isg_vip.io.model_loader import ISGModelArtifacts
+
     try:
-        artifacts = ISGModelArtifacts.from_directory(MODEL_DIR)
-    except FileNotFoundError as e:
+        return ISGModelArtifacts.load(
+            MODEL_DIR,
+            bundle_path=model_bundle,
+            checksums_path=checksums,
+            n_jobs=load_jobs,
+        )
+    except (FileNotFoundError, ValueError) as e:
         logger.critical(e)
         exit(1)
 
-    # Load data and filter
-    info = load_per_gene_count(gene_count_file, GENE_LIST_PATH)
 
-    # Create pivot table
-    info_ = info.groupby(PerGeneCountTsvCols.ID)[[LoadedPerGeneCountTsvCols.ALL_SUM]].mean()
-    gene_list = sorted(info[PerGeneCountTsvCols.HUM_SYMBOL].unique())
-    info_ = pd.concat([info_, pd.DataFrame({g: 0 for g in gene_list}, index=info_.index)], axis=1)
-    pivot_data = info.pivot_table(
-        index=MetadataTsvCols.ID,
-        columns=PerGeneCountTsvCols.HUM_SYMBOL,
-        values=LoadedPerGeneCountTsvCols.NORM_CNTL_LOG,
-        aggfunc="sum",
-    )
-    info_.update(pivot_data)
+def open_score_cache(
+    score_cache: Optional[Path], score_cache_size: int, checksums: Optional[Path]
+) -> Optional["ScoreCache"]:
+    """Score cache selected by `--score_cache` and `--score_cache_size` (None: disabled)."""
+    if score_cache is None:
+        return None
 
-    # Merge with metadata
-    meta_info = pd.read_csv(metadata_file, sep="\t")[
-        [MetadataTsvCols.SAMPLE_ID, MetadataTsvCols.SPECIES_HOST]
-    ]
-    meta_info = meta_info.rename(
-        columns={
-            MetadataTsvCols.SAMPLE_ID: MetadataTsvCols.ID,
-            MetadataTsvCols.SPECIES_HOST: MetadataTsvCols.H_SPECIES,
-        }
-    )
+    from isg_vip.io.model_loader import model_checksum
+    from isg_vip.prediction.score_cache import ScoreCache
 
-    df2 = pd.merge(info_, meta_info, on=PerGeneCountTsvCols.ID)
+    return ScoreCache(score_cache, model_checksum(MODEL_DIR, checksums), score_cache_size << 20)
 
-    # Species filter
-    mbio_all = df2.copy()
 
-    # Additional metadata
-    group_info = pd.read_csv(metadata_file, sep="\t")
-    meta_info_ = (
-        group_info[
-            [MetadataTsvCols.SAMPLE_ID, MetadataTsvCols.SPECIES_HOST, MetadataTsvCols.ORDER_HOST]
-        ]
-        .copy()
-        .rename(
-            columns={
-                MetadataTsvCols.SAMPLE_ID: MetadataTsvCols.ID,
-                MetadataTsvCols.SPECIES_HOST: MetadataTsvCols.H_SPECIES,
-                MetadataTsvCols.ORDER_HOST: MetadataTsvCols.ORDER,
-            }
+def main():
+    args = parse_args()
+
+    from isg_vip.io.csv_writer import set_write_jobs
+    from isg_vip.utils.tracing import profiled, trace_to
+
+    set_write_jobs(args.write_jobs)
+
+    with profiled(args.profile), trace_to(args.trace_out):
+        if args.shard is not None:
+            score_shard_files(
+                args.gene_count_file,
+                args.metadata,
+                args.shard,
+                args.partial_out,
+                args.model_bundle,
+                args.checksums,
+                args.load_jobs,
+                args.tree_engine,
+                args.fused_lr,
+                args.chunk_size,
+                args.score_cache,
+                args.score_cache_size,
+                args.compact,
+            )
+            return
+
+        predict_files(
+            args.gene_count_file,
+            args.metadata,
+            args.output,
+            args.model_bundle,
+            args.checksums,
+            args.load_jobs,
+            args.tree_engine,
+            args.fused_lr,
+            args.chunk_size,
+            args.score_cache,
+            args.score_cache_size,
+            args.output_format,
+            args.compact,
+            args.scores_out,
         )
+
+
+def predict_files(
+    gene_count_file: Path,
+    metadata_file: Path,
+    output_dir: Path,
+    model_bundle: Optional[Path],
+    checksums: Optional[Path],
+    load_jobs: int,
+    tree_engine: str,
+    fused_lr: bool,
+    chunk_size: Optional[int],
+    score_cache: Optional[Path],
+    score_cache_size: int,
+    output_format: str,
+    compact: bool,
+    scores_out: Optional[Path] = None,
+):
+    """
+    Predict the samples of `gene_count_file` and write every table to `output_dir`, and
+    the raw scores to `scores_out`.
+    """
+    from isg_vip.io.data_loader import (
+        load_sample_metadata,
+        read_per_gene_count,
+        read_sample_metadata,
     )
+    from isg_vip.io.output_writer import write_stacking_predictions
+    from isg_vip.prediction.streaming import predict_in_chunks
+    from isg_vip.predictor import Predictor
 
-    # Features: Use all columns of imported records.
-    X = mbio_all.copy()
+    logger = setup_logger(None, level=logging.INFO)
+    suppress_warnings()
 
-    columns_to_process = [MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]  # Target columns
-    exclude_columns = [
-        MetadataTsvCols.ID,
-        MetadataTsvCols.H_SPECIES,
-        MetadataTsvCols.ORDER,
-    ]  # Columns to exclude
-    predict_each_fold(
+    # Files load
+    artifacts = load_artifacts(model_bundle, checksums, load_jobs, logger)
+    predictor = Predictor(
         artifacts,
-        output_dir,
-        columns_to_process,
-        exclude_columns,
-        meta_info_=meta_info_,
-        copiedX=X,
+        tree_engine=tree_engine,
+        fused_lr=fused_lr,
+        score_cache=open_score_cache(score_cache, score_cache_size, checksums),
+        compact=compact,
     )
 
-    all_dfs = execute_prediction(
+    if chunk_size is not None:
+        meta_info_ = load_sample_metadata(metadata_file)
+        try:
+            predictions = predict_in_chunks(
+                artifacts,
+                output_dir,
+                COLUMNS_TO_PROCESS,
+                EXCLUDE_COLUMNS,
+                meta_info_,
+                gene_count_file,
+                GENE_LIST_PATH,
+                chunk_size,
+                tree_engine=predictor.tree_engine,
+                meta_tree_engine=predictor.meta_tree_engine,
+                linear_scorer=predictor.linear_scorer,
+                score_cache=predictor.score_cache,
+                output_format=output_format,
+                compact=predictor.compact,
+                scores_out=scores_out,
+            )
+        except ValueError as e:
+            logger.critical(e)
+            exit(1)
+        write_stacking_predictions(output_dir, predictions, output_format)
+        return
+
+    try:
+        tables = predictor.predict_tables(
+            read_per_gene_count(gene_count_file), read_sample_metadata(metadata_file)
+        )
+    except ValueError as e:
+        logger.critical(e)
+        exit(1)
+    tables.write(output_dir, output_format)
+    if scores_out is not None:
+        tables.scores.save(scores_out)
+
+
+def score_shard_files(
+    gene_count_file: Path,
+    metadata_file: Path,
+    shard: tuple[int, int],
+    partial_out: Path,
+    model_bundle: Optional[Path],
+    checksums: Optional[Path],
+    load_jobs: int,
+    tree_engine: str,
+    fused_lr: bool,
+    chunk_size: Optional[int],
+    score_cache: Optional[Path],
+    score_cache_size: int,
+    compact: bool,
+):
+    """
+    Score the base models on the samples of `shard` of `gene_count_file` and write them
+    to `partial_out` (first step of a sharded run, see `isg_vip.prediction.sharding`).
+    """
+    from isg_vip.io.data_loader import load_sample_metadata
+    from isg_vip.prediction.sharding import score_shard_base
+    from isg_vip.predictor import Predictor
+
+    logger = setup_logger(None, level=logging.INFO)
+    suppress_warnings()
+
+    artifacts = load_artifacts(model_bundle, checksums, load_jobs, logger)
+    predictor = Predictor(
         artifacts,
-        output_dir,
-        columns_to_process,
-        exclude_columns,
-        X.copy(),
-        meta_info_,
+        tree_engine=tree_engine,
+        fused_lr=fused_lr,
+        score_cache=open_score_cache(score_cache, score_cache_size, checksums),
+        compact=compact,
     )
-    export_final_prediction(output_dir, meta_info_.copy(), all_dfs)
+    try:
+        partial = score_shard_base(
+            artifacts,
+            COLUMNS_TO_PROCESS,
+            EXCLUDE_COLUMNS,
+            load_sample_metadata(metadata_file),
+            gene_count_file,
+            GENE_LIST_PATH,
+            shard,
+            chunk_size,
+            tree_engine=predictor.tree_engine,
+            linear_scorer=predictor.linear_scorer,
+            score_cache=predictor.score_cache,
+            compact=predictor.compact,
+        )
+    except ValueError as e:
+        logger.critical(e)
+        exit(1)
+    partial.save(partial_out)
+    logger.info(f"Shard {shard[0]}/{shard[1]}: {len(partial.metadata)} samples scored.")
 
 
 if __name__ == "__main__":
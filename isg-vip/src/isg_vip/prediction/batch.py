@@ -0,0 +1,224 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""In-memory prediction of several independent batches at once.
+
+The base and meta models are evaluated once over the rows of all batches, while the meta
+model input is z-scored within each batch, so every batch gets the same table as
+`Infection_Prediction_Stacking_all.csv` of a run on that batch alone. Results are aligned
+to the samples of each batch by row position (see `BatchIndex`).
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.constants import MetadataTsvCols, OutputFormat
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+from isg_vip.io.output_writer import (
+    final_prediction_frame,
+    write_stacking_predictions,
+    write_table,
+)
+from isg_vip.prediction.batch_index import BASE_MODELS, BatchIndex
+from isg_vip.prediction.ensemble import score_meta_model, scored_mask
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.run_inference import normalize_each_fold
+from isg_vip.prediction.score_cache import ScoreCache, base_model_scores_cached
+from isg_vip.prediction.score_store import ScoreStore
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+
+
+@dataclass
+class PredictionTables:
+    """Every table of a batch run, as written by the command line."""
+
+    base: list[pd.DataFrame]
+    """`Infection_Prediction_{n}.csv` (LightGBM and LogisticRegression results)."""
+    stacking: list[pd.DataFrame]
+    """`Infection_Prediction_Stacking_{n}_external.csv` (meta model results)."""
+    predictions: pd.DataFrame
+    """`Infection_Prediction_Stacking_all.csv` (per-fold and final results)."""
+    scores: Optional[ScoreStore] = None
+    """Raw per-fold scores, for `isg-vip relabel` (not written by `write`)."""
+
+    @property
+    def final(self) -> pd.DataFrame:
+        """`Infection_Prediction_Stacking_final.csv`."""
+        return final_prediction_frame(self.predictions)
+
+    def write(self, dir_name: Path, output_format: str = OutputFormat.CSV):
+        """
+        :param output_format: file format and suffix of the tables (see `write_table`)
+        """
+        for n, df in enumerate(self.base):
+            write_table(df, dir_name, f"Infection_Prediction_{n}", output_format)
+        for n, df in enumerate(self.stacking):
+            write_table(df, dir_name, f"Infection_Prediction_Stacking_{n}_external", output_format)
+        write_stacking_predictions(dir_name, self.predictions, output_format)
+
+
+@dataclass
+class _ScoredBatch:
+    index: BatchIndex
+    base_scores: np.ndarray
+    """Folds x rows x `BASE_SCORE_COLUMNS`."""
+    meta_labels: np.ndarray
+    """Folds x rows."""
+    meta_scores: np.ndarray
+    """Folds x rows."""
+
+    def tables(self, thresholds: Optional[dict[ModelType, np.ndarray]] = None) -> PredictionTables:
+        """:param thresholds: thresholds of the models, to keep the raw scores"""
+        n_folds = len(self.base_scores)
+        scores = None
+        if thresholds is not None:
+            scores = self.index.score_store(self.base_scores, self.meta_scores, thresholds)
+        return PredictionTables(
+            base=[self.index.base_table(self.base_scores[n], n) for n in range(n_folds)],
+            stacking=[
+                self.index.stacking_table(self.meta_labels[n], self.meta_scores[n], n)
+                for n in range(n_folds)
+            ],
+            predictions=self.index.predictions(self.meta_labels, self.meta_scores),
+            scores=scores,
+        )
+
+
+def _score_batches(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    batches: Sequence[tuple[pd.DataFrame, pd.DataFrame]],
+    tree_engine: Optional[TreeEnsembleEngine],
+    meta_tree_engine: Optional[TreeEnsembleEngine],
+    linear_scorer: Optional[FusedLinearScorer],
+    score_cache: Optional[ScoreCache],
+) -> list[_ScoredBatch]:
+    """Base and meta model results of every batch, at the row positions of its index."""
+    # Sample IDs are only unique within a batch: each batch has its own index, over its
+    # slice of the concatenated feature matrices
+    indexes = [BatchIndex.from_features(X, meta_info_) for X, meta_info_ in batches]
+    X_all = pd.concat([X for X, _ in batches], ignore_index=True)
+    if X_all.empty:
+        raise ValueError("Empty feature matrix.")
+    bounds = np.cumsum([0] + [len(index) for index in indexes])
+    slices = [slice(bounds[b], bounds[b + 1]) for b in range(len(indexes))]
+
+    X_tests = normalize_each_fold(artifacts, X_all)
+    valid = np.stack([scored_mask(X_test, columns_to_process) for X_test in X_tests])
+    base_scores = base_model_scores_cached(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        X_all,
+        X_tests,
+        valid,
+        score_cache,
+        tree_engine=tree_engine,
+        linear_scorer=linear_scorer,
+    )
+    for index, s in zip(indexes, slices):
+        for m_type, _ in BASE_MODELS:
+            index.set_mask(m_type, valid[:, s])
+
+    # Meta features, z-scored within each batch
+    X_test_metas = []
+    meta_bounds = []
+    for n, X_test in enumerate(X_tests):
+        frames = [
+            index.meta_features(base_scores[n, s], X_test.iloc[s], columns_to_process, n)
+            for index, s in zip(indexes, slices)
+        ]
+        X_test_metas.append(pd.concat(frames, ignore_index=True))
+        meta_bounds.append(np.cumsum([0] + [len(frame) for frame in frames]))
+
+    meta_results = score_meta_model(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        X_test_metas,
+        tree_engine=meta_tree_engine,
+    )
+
+    scored = []
+    for b, (index, s) in enumerate(zip(indexes, slices)):
+        meta_labels = []
+        meta_scores = []
+        for n, (labels, probs) in enumerate(meta_results):
+            start, stop = meta_bounds[n][b], meta_bounds[n][b + 1]
+            rows = X_test_metas[n][MetadataTsvCols.ID].to_numpy()[start:stop]
+            meta_labels.append(index.scatter(ModelType.META, n, labels[start:stop], rows))
+            meta_scores.append(index.scatter(ModelType.META, n, probs[start:stop], rows))
+        scored.append(
+            _ScoredBatch(index, base_scores[:, s], np.stack(meta_labels), np.stack(meta_scores))
+        )
+    return scored
+
+
+def predict_feature_batches(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    batches: Sequence[tuple[pd.DataFrame, pd.DataFrame]],
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    meta_tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+    score_cache: Optional[ScoreCache] = None,
+) -> list[pd.DataFrame]:
+    """
+    Predict every batch without writing any file.
+
+    :param batches: `(X, meta_info_)` pairs, where `X` is the output of
+        `build_feature_matrix` and `meta_info_` the output of `load_sample_metadata`
+    :param score_cache: base model scores of previously seen samples
+    :return: per batch, the content of `Infection_Prediction_Stacking_all.csv`
+    :raises ValueError: if a sample ID is duplicated within a batch
+    """
+    scored = _score_batches(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        batches,
+        tree_engine,
+        meta_tree_engine,
+        linear_scorer,
+        score_cache,
+    )
+    return [batch.index.predictions(batch.meta_labels, batch.meta_scores) for batch in scored]
+
+
+def predict_feature_tables(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    X: pd.DataFrame,
+    meta_info_: pd.DataFrame,
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    meta_tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+    score_cache: Optional[ScoreCache] = None,
+) -> PredictionTables:
+    """
+    Predict one batch without writing any file, keeping the intermediate tables.
+
+    :param X: output of `build_feature_matrix`
+    :param meta_info_: output of `load_sample_metadata`
+    :param score_cache: base model scores of previously seen samples
+    :return: tables, with the raw scores (`PredictionTables.scores`)
+    :raises ValueError: if a sample ID is duplicated
+    """
+    (scored,) = _score_batches(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        [(X, meta_info_)],
+        tree_engine,
+        meta_tree_engine,
+        linear_scorer,
+        score_cache,
+    )
+    return scored.tables(ScoreStore.model_thresholds(artifacts))
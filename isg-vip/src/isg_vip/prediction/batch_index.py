@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Row alignment of the samples of a batch.
+
+Each sample of a feature matrix gets a row position once. Model results are arrays over
+these rows, with a validity mask per model type and fold (the rows the models scored),
+and the output tables are gathered from them by position: no stage joins on `ID`, and
+results of models scoring different rows cannot be shifted against each other.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.constants import MetadataTsvCols
+from isg_vip.io.model_loader import ModelType
+from isg_vip.io.output_writer import fold_vote_frame
+from isg_vip.prediction.ensemble import z_score_base_scores
+from isg_vip.prediction.score_store import ScoreStore
+from isg_vip.utils.tracing import span
+
+BASE_MODELS = [(ModelType.LGB, "LightGBM"), (ModelType.LR, "LogisticRegression")]
+"""Base model types, in the order of their rows in `Infection_Prediction_{n}.csv`."""
+
+
+def _prediction_labels(labels: np.ndarray) -> np.ndarray:
+    return np.where(labels == 1, "Positive", "Negative").astype(object)
+
+
+class BatchIndex:
+    """
+    Row position of every sample of a feature matrix, and its row in the metadata.
+
+    Samples of the feature matrix missing from the metadata are scored but left out of
+    the tables, as by an inner join on `ID`.
+    """
+
+    def __init__(self, ids, meta_info_: pd.DataFrame):
+        """
+        :param ids: `ID` of each row of the feature matrix
+        :param meta_info_: output of `load_sample_metadata`
+        :raises ValueError: if a sample ID is duplicated in `ids` or in `meta_info_`
+        """
+        self.ids = np.asarray(ids)
+        self.meta_info_ = meta_info_
+        meta_ids = pd.Index(meta_info_[MetadataTsvCols.ID])
+        for name, index in [("metadata", meta_ids), ("feature matrix", pd.Index(self.ids))]:
+            if index.has_duplicates:
+                duplicated = list(index[index.duplicated()].unique()[:5])
+                raise ValueError(f"Duplicated sample IDs in the {name}: {duplicated}")
+
+        # Metadata row of each row (-1 if missing)
+        self.meta_rows = meta_ids.get_indexer(self.ids)
+        self.sorted_rows = np.argsort(self.ids, kind="stable")
+        in_meta = np.flatnonzero(self.meta_rows >= 0)
+        self.meta_order = in_meta[np.argsort(self.meta_rows[in_meta], kind="stable")]
+        """Rows found in the metadata, in metadata order."""
+        self.masks: dict[ModelType, np.ndarray] = {}
+        """Rows scored by the models of each type (folds x rows)."""
+
+    @classmethod
+    def from_features(cls, X: pd.DataFrame, meta_info_: pd.DataFrame) -> "BatchIndex":
+        """:param X: output of `build_feature_matrix`"""
+        return cls(X[MetadataTsvCols.ID].to_numpy(), meta_info_)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def set_mask(self, m_type: ModelType, mask: np.ndarray):
+        """Rows scored by the models of `m_type` (folds x rows)."""
+        mask = np.asarray(mask, dtype=bool)
+        if mask.ndim != 2 or mask.shape[1] != len(self):
+            raise ValueError(
+                f"Mask of {m_type.value} models: shape {mask.shape}, {len(self)} rows."
+            )
+        self.masks[m_type] = mask
+
+    def scatter(
+        self,
+        m_type: ModelType,
+        fold: int,
+        values: np.ndarray,
+        rows: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Results of the model of a fold at the position of their rows (NaN elsewhere).
+
+        :param values: one result (or row of results) per scored row
+        :param rows: position of the row of each result; by default the rows of the mask
+            of the model, in position order
+        :raises ValueError: if the results do not match the rows of the mask
+        """
+        mask = self.masks[m_type][fold]
+        values = np.asarray(values, dtype=np.float64)
+        if rows is None:
+            rows = np.flatnonzero(mask)
+        if len(values) != len(rows) or len(rows) != np.count_nonzero(mask) or not mask[rows].all():
+            raise ValueError(
+                f"{m_type.value} model of fold {fold}: {len(values)} results for "
+                f"{np.count_nonzero(mask)} scored rows."
+            )
+        out = np.full((len(self), *values.shape[1:]), np.nan)
+        out[rows] = values
+        return out
+
+    def _metadata(self, rows: np.ndarray) -> pd.DataFrame:
+        return self.meta_info_.iloc[self.meta_rows[rows]].reset_index(drop=True)
+
+    def _sorted_in_meta(self, mask: np.ndarray) -> np.ndarray:
+        """Rows of `mask` found in the metadata, sorted by ID."""
+        rows = self.sorted_rows
+        return rows[mask[rows] & (self.meta_rows[rows] >= 0)]
+
+    def base_table(self, scores: np.ndarray, fold: int) -> pd.DataFrame:
+        """
+        `Infection_Prediction_{fold}.csv`: the LightGBM then the LogisticRegression row of
+        each sample, in metadata order.
+
+        :param scores: rows x `BASE_SCORE_COLUMNS` of the fold
+        """
+        rows = self.meta_order
+        scored = np.column_stack([self.masks[m_type][fold][rows] for m_type, _ in BASE_MODELS])
+        row = np.repeat(rows, len(BASE_MODELS))[scored.ravel()]
+        model = np.tile(np.arange(len(BASE_MODELS)), len(rows))[scored.ravel()]
+
+        df = self._metadata(row)
+        df["Model"] = np.array([name for _, name in BASE_MODELS], dtype=object)[model]
+        df["Prediction_score"] = scores[row, 2 * model]
+        df["Prediction_Label"] = _prediction_labels(scores[row, 2 * model + 1])
+        return df
+
+    def base_score_frame(self, scores: np.ndarray, fold: int) -> tuple[np.ndarray, pd.DataFrame]:
+        """
+        Rows scored by a base model of a fold, sorted by ID, and their base model scores
+        (0 where a model did not score the row), before z-scoring.
+
+        :param scores: rows x `BASE_SCORE_COLUMNS` of the fold
+        """
+        scored = np.logical_or.reduce([self.masks[m_type][fold] for m_type, _ in BASE_MODELS])
+        rows = self.sorted_rows[scored[self.sorted_rows]]
+
+        base_scores = scores[rows][:, [0, 2]]
+        X_test_meta = pd.DataFrame(
+            np.where(np.isnan(base_scores), 0.0, base_scores),
+            columns=[name for _, name in BASE_MODELS],
+        )
+        return rows, X_test_meta
+
+    def meta_features(
+        self,
+        scores: np.ndarray,
+        hosts: pd.DataFrame,
+        columns_to_process: list[str],
+        fold: int,
+        stats: Optional[dict[str, tuple[float, float]]] = None,
+    ) -> pd.DataFrame:
+        """
+        Meta model input of a fold, and its rows in the mask of the meta models.
+
+        Rows scored by a base model are sorted by ID; the base model scores (0 where a
+        model did not score the row) are z-scored over these rows. Rows whose z-scores are
+        undefined are left out. `ID` holds the row positions.
+
+        :param scores: rows x `BASE_SCORE_COLUMNS` of the fold
+        :param hosts: `columns_to_process` of the normalized input of the fold, same rows
+        :param stats: mean and standard deviation of the base model scores to z-score
+            with, instead of those of these rows (see `base_score_stats`)
+        """
+        with span("meta_features", fold=fold) as s:
+            rows, X_test_meta = self.base_score_frame(scores, fold)
+            X_test_meta = z_score_base_scores(X_test_meta, stats)
+            X_test_meta.insert(0, MetadataTsvCols.ID, rows)
+            for col in columns_to_process:
+                X_test_meta[col] = hosts[col].iloc[rows].reset_index(drop=True)
+
+            valid = X_test_meta[[name for _, name in BASE_MODELS]].notna().all(axis=1).to_numpy()
+            if ModelType.META not in self.masks:
+                self.masks[ModelType.META] = np.zeros_like(self.masks[ModelType.LGB])
+            self.masks[ModelType.META][fold] = False
+            self.masks[ModelType.META][fold, rows[valid]] = True
+            if not valid.all():
+                X_test_meta = X_test_meta[valid].reset_index(drop=True)
+            s.data(X_test_meta)
+            return X_test_meta
+
+    def stacking_table(self, labels: np.ndarray, scores: np.ndarray, fold: int) -> pd.DataFrame:
+        """
+        `Infection_Prediction_Stacking_{fold}_external.csv`, sorted by ID.
+
+        :param labels: meta model labels of the fold (0/1, one per row)
+        :param scores: meta model scores of the fold
+        """
+        rows = self._sorted_in_meta(self.masks[ModelType.META][fold])
+        df = self._metadata(rows)
+        df["Model"] = "Stacking"
+        df["Prediction_score"] = scores[rows]
+        df["Prediction_Label"] = _prediction_labels(labels[rows])
+        return df
+
+    def predictions(self, labels: np.ndarray, scores: np.ndarray) -> pd.DataFrame:
+        """
+        `Infection_Prediction_Stacking_all.csv`: samples scored by the meta models of every
+        fold, sorted by ID.
+
+        :param labels: folds x rows meta model labels (0/1)
+        :param scores: folds x rows meta model scores
+        """
+        rows = self._sorted_in_meta(self.masks[ModelType.META].all(axis=0))
+        return fold_vote_frame(self._metadata(rows), scores[:, rows].T, labels[:, rows].T == 1)
+
+    def score_store(
+        self,
+        base_scores: np.ndarray,
+        meta_scores: np.ndarray,
+        thresholds: dict[ModelType, np.ndarray],
+    ) -> ScoreStore:
+        """
+        Raw scores of the samples found in the metadata, sorted by ID.
+
+        :param base_scores: folds x rows x `BASE_SCORE_COLUMNS`
+        :param meta_scores: folds x rows meta model scores
+        :param thresholds: output of `ScoreStore.model_thresholds`
+        """
+        rows = self._sorted_in_meta(np.ones(len(self), dtype=bool))
+        return ScoreStore(
+            metadata=self._metadata(rows),
+            base_models=[name for _, name in BASE_MODELS],
+            base_scores=base_scores[:, rows][:, :, [0, 2]],
+            meta_scores=meta_scores[:, rows],
+            thresholds=thresholds,
+        )
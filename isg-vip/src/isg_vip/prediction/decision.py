@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Labels derived from stored meta model scores (see `ScoreStore`).
+
+A fold labels a sample positive when its meta model score reaches the threshold of the
+fold. The final label combines the folds with a vote rule (see `VoteRule`). Only the
+samples scored by the meta models of every fold are labelled, as in
+`Infection_Prediction_Stacking_all.csv`.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.constants import VoteRule
+from isg_vip.io.model_loader import ModelType
+from isg_vip.io.output_writer import fold_vote_frame
+from isg_vip.prediction.score_store import ScoreStore
+
+
+def scored_by_all_folds(store: ScoreStore) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Metadata and samples x folds meta model scores of the samples scored by every fold.
+    """
+    scores = store.meta_scores.T
+    keep = ~np.isnan(scores).any(axis=1)
+    return store.metadata[keep].reset_index(drop=True), scores[keep]
+
+
+def final_positive(
+    scores: np.ndarray, positive: np.ndarray, vote: str, mean_cutoff: float = 0.5
+) -> np.ndarray:
+    """
+    Final label of each sample.
+
+    :param scores: samples x folds meta model scores
+    :param positive: samples x folds labels
+    :param vote: one of `VoteRule.ALL`
+    :param mean_cutoff: cutoff of the mean score (`VoteRule.MEAN`)
+    :raises ValueError: on an unknown vote rule
+    """
+    if vote == VoteRule.MAJORITY:
+        return 2 * np.count_nonzero(positive, axis=1) > positive.shape[1]
+    if vote == VoteRule.UNANIMOUS:
+        return positive.all(axis=1)
+    if vote == VoteRule.MEAN:
+        return scores.mean(axis=1) >= mean_cutoff
+    raise ValueError(f"Unknown vote rule: {vote}")
+
+
+def relabel(
+    store: ScoreStore,
+    thresholds: Optional[np.ndarray] = None,
+    vote: str = VoteRule.MAJORITY,
+    mean_cutoff: float = 0.5,
+) -> pd.DataFrame:
+    """
+    Per-fold and final labels with other thresholds or vote rule, in the layout of
+    `Infection_Prediction_Stacking_all.csv` (the same table with the default arguments).
+
+    :param thresholds: threshold of each fold, or a single one for every fold (default:
+        the thresholds of the meta models)
+    :raises ValueError: if there is not one threshold per fold
+    """
+    if thresholds is None:
+        thresholds = store.thresholds[ModelType.META]
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+    if len(thresholds) not in (1, store.n_folds):
+        raise ValueError(
+            f"{len(thresholds)} thresholds given: 1 or one per fold ({store.n_folds}) expected."
+        )
+
+    metadata, scores = scored_by_all_folds(store)
+    positive = scores >= thresholds
+    df = fold_vote_frame(metadata, scores, positive)
+    if vote != VoteRule.MAJORITY:
+        df["Final_Prediction_Label"] = np.where(
+            final_positive(scores, positive, vote, mean_cutoff), "Positive", "Negative"
+        ).astype(object)
+    return df
+
+
+def vote_statistic(scores: np.ndarray, vote: str) -> np.ndarray:
+    """
+    Per sample, the largest threshold (shared by every fold, or the cutoff of the mean
+    score) at which the sample is labelled positive by `vote`.
+
+    :param scores: samples x folds meta model scores
+    """
+    if vote == VoteRule.MAJORITY:
+        # Positive if at least n_folds // 2 + 1 folds reach the threshold
+        n_folds = scores.shape[1]
+        return np.sort(scores, axis=1)[:, n_folds - (n_folds // 2 + 1)]
+    if vote == VoteRule.UNANIMOUS:
+        return scores.min(axis=1)
+    if vote == VoteRule.MEAN:
+        return scores.mean(axis=1)
+    raise ValueError(f"Unknown vote rule: {vote}")
+
+
+def threshold_sweep(
+    store: ScoreStore,
+    thresholds: np.ndarray,
+    votes: list[str] = VoteRule.ALL,
+    truth: Optional[pd.Series] = None,
+) -> pd.DataFrame:
+    """
+    Number of positive samples at each threshold (shared by every fold) for each vote
+    rule, computed from the sorted vote statistics of the samples (no label matrix).
+
+    :param thresholds: thresholds to evaluate
+    :param truth: true label (bool) of samples by ID; adds the confusion counts,
+        sensitivity and specificity over the samples of `truth`
+    :return: one row per vote rule and threshold
+    """
+    metadata, scores = scored_by_all_folds(store)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    if truth is not None:
+        truth = truth.reindex(metadata["ID"]).to_numpy()
+        labelled = ~pd.isna(truth)
+        truth = truth[labelled].astype(bool)
+
+    frames = []
+    for vote in votes:
+        statistic = vote_statistic(scores, vote)
+        df = pd.DataFrame({"Vote": vote, "Threshold": thresholds})
+        df["Positive"] = _count_at_least(statistic, thresholds)
+        df["Positive_fraction"] = df["Positive"] / len(statistic)
+        if truth is not None:
+            labelled_statistic = statistic[labelled]
+            n_true = np.count_nonzero(truth)
+            n_false = len(truth) - n_true
+            df["TP"] = _count_at_least(labelled_statistic[truth], thresholds)
+            df["FP"] = _count_at_least(labelled_statistic[~truth], thresholds)
+            df["FN"] = n_true - df["TP"]
+            df["TN"] = n_false - df["FP"]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                df["Sensitivity"] = df["TP"] / n_true
+                df["Specificity"] = df["TN"] / n_false
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _count_at_least(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Number of `values` >= each threshold."""
+    return len(values) - np.searchsorted(np.sort(values), thresholds, side="left")
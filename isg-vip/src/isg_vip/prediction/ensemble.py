@@ -1,8 +1,7 @@
 # SPDX-License-Identifier: GPL-3.0-only
 # SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
 
-from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import lightgbm as lgb
 import numpy as np
@@ -10,8 +9,14 @@ import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
 from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
-from isg_vip.io.output_writer import write_to_csv
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+from isg_vip.preprocessing.category_lookup import CategoryCodes
 from isg_vip.preprocessing.normalizer import cal_z
+from isg_vip.utils.tracing import span
+
+_PREDICT_ROWS = 1 << 14
+"""Rows of a compact (float32) input scored at once by scikit-learn models."""
 
 
 class CustomNormalizer(BaseEstimator, TransformerMixin):
@@ -24,40 +29,90 @@ class CustomNormalizer(BaseEstimator, TransformerMixin):
         self.gene_stds_ = {}
 
     def transform(self, X):
-        X = X.copy()
         # normalize total expression
-        X["sum_all_log"] = X["all_sum"].apply(lambda x: np.log2(x + 1))
-        X["sum_all_log_z"] = (X["sum_all_log"] - self.mean_) / self.std_
-        X.drop(columns=["all_sum", "sum_all_log"], inplace=True)
-
-        # standardize each gene
-        for col in self.gene_means_:
-            X[col] = (X[col] - self.gene_means_[col]) / self.gene_stds_[col]
+        sum_all_log = X["all_sum"].apply(lambda x: np.log2(x + 1))
+        sum_all_log_z = (sum_all_log - self.mean_) / self.std_
+
+        # standardize each gene; all genes in one block, computed in float32 for a
+        # compact feature matrix (see `build_feature_matrix`)
+        columns = [col for col in X.columns if col != "all_sum"]
+        missing = [col for col in self.gene_means_ if col not in X.columns]
+        if missing:
+            raise KeyError(f"Genes not in the feature matrix: {missing}")
+        genes = [col for col in columns if col in self.gene_means_]
+        dtype = np.float32 if (X.dtypes[genes] == np.float32).all() else np.float64
+        gene_means = np.array([self.gene_means_[col] for col in genes], dtype=np.float64)
+        gene_stds = np.array([self.gene_stds_[col] for col in genes], dtype=np.float64)
+        # Column-major, so that the DataFrame block is row-major as after pd.concat (the
+        # row means of `mean_ISGscore` are summed in the same order)
+        values = np.empty((len(X), len(genes)), dtype=dtype, order="F")
+        for i, col in enumerate(genes):
+            values[:, i] = X[col].to_numpy()
+        values -= gene_means.astype(dtype)
+        values /= gene_stds.astype(dtype)
+
+        # Other columns are inserted around the standardized block, which is not copied
+        X_out = pd.DataFrame(values, index=X.index, columns=genes, copy=False)
+        for i, col in enumerate(columns):
+            if col not in self.gene_means_:
+                X_out.insert(i, col, X[col])
+        X_out["sum_all_log_z"] = sum_all_log_z.astype(dtype)
 
         # map species to order
-        group_info_ = self.group_info[self.group_info["species"].isin(X["h_species"])]
+        group_info_ = self.group_info[self.group_info["species"].isin(X_out["h_species"])]
         mapper = group_info_.drop_duplicates("species").set_index("species")["order"]
-        X["order"] = X["h_species"].map(mapper)
+        X_out["order"] = X_out["h_species"].map(mapper)
 
         # calculate mean ISG score
-        X["mean_ISGscore"] = X[self.isg_list].mean(axis=1)
-        return X
+        X_out["mean_ISGscore"] = X_out[self.isg_list].mean(axis=1)
+        return X_out
 
 
-def get_train_categories_from_encoder(encoder, columns):
-    """Extract learned categories from the encoder and map them to column names."""
-    categories = {}
-    for col, cats in zip(columns, encoder.categories_):
-        categories[col] = list(cats)
-    return categories
-
+def encode_features(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    X_test: pd.DataFrame,
+    m_type: ModelType,
+    fold: int,
+    category_codes: Optional[CategoryCodes] = None,
+) -> pd.DataFrame:
+    """
+    One-hot encode categorical columns and drop rows with missing values.
+
+    Unseen categories are encoded as "unknown" through the precompiled encoder lookup.
+    `category_codes` (the factorized `columns_to_process` of `X_test`) can be shared
+    between models scoring the same input.
+    """
+    with span("encode", model=m_type.value, fold=fold) as s:
+        lookup = artifacts.get_encoder_lookup(m_type, fold)
+        if category_codes is None:
+            category_codes = CategoryCodes.from_frame(X_test, columns_to_process)
+
+        # Numeric columns and one-hot columns are written into one block, in float32 for a
+        # compact feature matrix. The block is column-major, as the array pandas builds
+        # from concatenated frames (scikit-learn sums depend on the memory layout).
+        numeric_columns = [col for col in X_test.columns if col not in exclude_columns]
+        numeric_dtypes = X_test.dtypes[numeric_columns]
+        dtype = np.float32 if (numeric_dtypes == np.float32).all() else np.float64
+        n_numeric = len(numeric_columns)
+        values = np.empty((len(X_test), n_numeric + lookup.n_outputs), dtype=dtype, order="F")
+        for i, col in enumerate(numeric_columns):
+            values[:, i] = X_test[col].to_numpy(dtype=dtype)
+        lookup.transform(category_codes, out=values[:, n_numeric:])
+        X_test_final = pd.DataFrame(
+            values,
+            index=X_test.index,
+            columns=numeric_columns + lookup.feature_names,
+            copy=False,
+        )
 
-def replace_unseen_categories(data, columns: list[str], train_categories):
-    data = data.copy()
-    for col in columns:
-        valid = set(train_categories[col])
-        data[col] = data[col].where(data[col].isin(valid), "unknown")
-    return data
+        # Drop rows with missing values
+        missing_values = X_test.index[np.isnan(values[:, :n_numeric]).any(axis=1)]
+        if len(missing_values):
+            X_test_final = X_test_final.drop(index=missing_values)
+        s.data(X_test_final)
+        return X_test_final
 
 
 def prediction(
@@ -68,34 +123,29 @@ def prediction(
     X_test: pd.DataFrame,
     m_type: ModelType,
     fold: int,
+    category_codes: Optional[CategoryCodes] = None,
 ):
-    encoder = artifacts.get_encoder(m_type, fold)
-    train_categories = get_train_categories_from_encoder(encoder, columns_to_process)
-    X_test = replace_unseen_categories(
-        X_test, columns=columns_to_process, train_categories=train_categories
-    )
-
-    # Encode categorical columns
-    X_test_encoded = encoder.transform(X_test[columns_to_process])
-    X_test_encoded = pd.DataFrame(
-        X_test_encoded,
-        index=X_test.index,
-        columns=encoder.get_feature_names_out(columns_to_process),
+    X_test_final = encode_features(
+        artifacts, columns_to_process, exclude_columns, X_test, m_type, fold, category_codes
     )
 
-    # Combine with numeric columns
-    X_test_numeric = X_test.drop(columns=exclude_columns)
-    X_test_final = pd.concat([X_test_numeric, X_test_encoded], axis=1)
-
-    # Drop rows with missing values
-    missing_values = X_test_final[X_test_final.isnull().any(axis=1)].index
-    X_test_final = X_test_final.drop(index=missing_values)
-
     # Predict probabilities
-    if isinstance(final_model, lgb.Booster):
-        y_test_pred_prob = final_model.predict(X_test_final)
-    else:
-        y_test_pred_prob = final_model.predict_proba(X_test_final)[:, 1]
+    with span("predict", model=m_type.value, fold=fold) as s:
+        s.data(X_test_final)
+        if isinstance(final_model, lgb.Booster):
+            y_test_pred_prob = final_model.predict(X_test_final)
+        elif (X_test_final.dtypes == np.float32).all() and len(X_test_final) > _PREDICT_ROWS:
+            # scikit-learn converts float32 input to float64: convert by blocks of rows
+            y_test_pred_prob = np.concatenate(
+                [
+                    final_model.predict_proba(X_test_final.iloc[start : start + _PREDICT_ROWS])[
+                        :, 1
+                    ]
+                    for start in range(0, len(X_test_final), _PREDICT_ROWS)
+                ]
+            )
+        else:
+            y_test_pred_prob = final_model.predict_proba(X_test_final)[:, 1]
 
     # Apply threshold to get labels
     best_threshold_train = artifacts.get_threshold(m_type)[fold]
@@ -104,111 +154,146 @@ def prediction(
     return y_test_pred_label, y_test_pred_prob
 
 
-def train_stacking_model(
+def prediction_all_folds(
     artifacts: ISGModelArtifacts,
-    dir_name: Path,
     columns_to_process: list[str],
     exclude_columns: list[str],
-    X_test: pd.DataFrame,
-    n: int,
+    X_tests: list[pd.DataFrame],
+    m_type: ModelType,
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+    category_codes: Optional[list[CategoryCodes]] = None,
 ):
-    # Create meta features for each fold
-    X_test_meta = (
-        pd.read_csv(dir_name / f"Infection_Prediction_{n}.csv")
-        .pivot(index="ID", columns="Model", values="Prediction_score")
-        .fillna(0)
-    )
+    """
+    Run `prediction` for every fold (`X_tests[n]` is the input of fold n).
+
+    With `tree_engine` or `linear_scorer`, the models of all folds are evaluated in a
+    single call. `category_codes` (from `CategoryCodes.from_frames(X_tests, ...)`) lets
+    several model types reuse one factorization of the batch.
+    """
+    thresholds = artifacts.get_threshold(m_type)
+    if category_codes is None:
+        category_codes = CategoryCodes.from_frames(X_tests, columns_to_process)
+
+    if linear_scorer is not None:
+        with span("predict", model=m_type.value, engine="fused_lr") as s:
+            s.set(rows=sum(len(X_test) for X_test in X_tests))
+            y_test_pred_probs = linear_scorer.predict(X_tests, category_codes)
+        return [
+            ((y_test_pred_prob >= thresholds[n]).astype(int), y_test_pred_prob)
+            for n, y_test_pred_prob in enumerate(y_test_pred_probs)
+        ]
+
+    if tree_engine is None:
+        return [
+            prediction(
+                artifacts,
+                artifacts.get_model(m_type, n),
+                columns_to_process,
+                exclude_columns,
+                X_test,
+                m_type,
+                n,
+                category_codes[n],
+            )
+            for n, X_test in enumerate(X_tests)
+        ]
+
+    X_test_finals = [
+        encode_features(
+            artifacts, columns_to_process, exclude_columns, X_test, m_type, n, category_codes[n]
+        )
+        for n, X_test in enumerate(X_tests)
+    ]
+    with span("predict", model=m_type.value, engine="numpy") as s:
+        s.set(rows=sum(len(X_test_final) for X_test_final in X_test_finals))
+        y_test_pred_probs = tree_engine.predict(X_test_finals)
+    return [
+        ((y_test_pred_prob >= thresholds[n]).astype(int), y_test_pred_prob)
+        for n, y_test_pred_prob in enumerate(y_test_pred_probs)
+    ]
+
+
+def scored_mask(X_test: pd.DataFrame, columns_to_process: list[str]) -> np.ndarray:
+    """
+    Rows of a normalized input which are scored by `prediction`, as a boolean mask: rows
+    with missing values are dropped, while unseen or missing categories are encoded as
+    "unknown".
+    """
+    valid = np.ones(len(X_test), dtype=bool)
+    for col in X_test.columns:
+        if col not in columns_to_process:
+            valid &= X_test[col].notna().to_numpy()
+    return valid
+
+
+def base_score_stats(X_test_meta: pd.DataFrame) -> dict[str, tuple[float, float]]:
+    """
+    Mean and standard deviation of each base model score over all rows of `X_test_meta`,
+    as computed by `z_score_base_scores`.
+    """
+    X_test_meta = X_test_meta.astype(float)
+    return {
+        model: (X_test_meta[model].mean(), X_test_meta[model].std())
+        for model in ["LightGBM", "LogisticRegression"]
+    }
+
+
+def z_score_base_scores(
+    X_test_meta: pd.DataFrame, stats: Optional[dict[str, tuple[float, float]]] = None
+) -> pd.DataFrame:
+    """
+    z-score the base model scores over all rows of `X_test_meta`.
+
+    :param stats: mean and standard deviation of each model to use instead (see
+        `base_score_stats`), e.g. of a batch split in shards
+    """
     for model in ["LightGBM", "LogisticRegression"]:
-        X_test_meta = cal_z(X_test_meta.astype(float), model)
-
-    encoder = artifacts.get_encoder(ModelType.META, n)
-    train_categories = get_train_categories_from_encoder(encoder, columns_to_process)
-    X_test = replace_unseen_categories(
-        X_test, columns=columns_to_process, train_categories=train_categories
-    )
-    missing_values = X_test[X_test.isnull().any(axis=1)].index
-    X_test_final = X_test.drop(index=missing_values)
-
-    # Merge with additional features
-    X_test_meta = X_test_meta.merge(X_test_final[["ID", "h_species", "order"]], on="ID", how="left")
-
-    # Run prediction with trained meta model
-    final_model_meta = artifacts.get_model(ModelType.META, n)
-    y_test_pred_label_meta, y_test_pred_prob_meta = prediction(
-        artifacts,
-        final_model_meta,
-        columns_to_process,
-        exclude_columns,
-        X_test_meta,
-        ModelType.META,
-        n,
-    )
+        mean, std = stats[model] if stats is not None else (None, None)
+        X_test_meta = cal_z(X_test_meta.astype(float), model, mean, std)
+    return X_test_meta
 
-    return final_model_meta, y_test_pred_label_meta, y_test_pred_prob_meta, X_test_meta
 
-
-def execute_prediction(
+def score_meta_model(
     artifacts: ISGModelArtifacts,
-    dir_name: Path,
     columns_to_process: list[str],
     exclude_columns: list[str],
-    copiedX: pd.DataFrame,
-    meta_info_: pd.DataFrame,
+    X_test_metas: list[pd.DataFrame],
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    chunk_size: Optional[int] = None,
 ):
-    # Save results for each fold
-    for n in range(5):
-        normalizer = artifacts.get_normalizer(n)
-        X_test = normalizer.transform(copiedX)
-        meta_model, y_test_pred_meta, y_test_pred_prob_meta, X_test_meta = train_stacking_model(
+    """
+    Run the meta model of every fold, `chunk_size` rows at a time.
+
+    Rows are scored independently, so the results do not depend on `chunk_size`; it only
+    bounds the size of the encoded meta features.
+    """
+    n_rows = {len(X_test_meta) for X_test_meta in X_test_metas}
+    if chunk_size is None or len(n_rows) != 1 or n_rows.pop() <= chunk_size:
+        return prediction_all_folds(
             artifacts,
-            dir_name,
             columns_to_process,
             exclude_columns,
-            X_test,
-            n,
+            X_test_metas,
+            ModelType.META,
+            tree_engine=tree_engine,
         )
 
-        df_long = pd.DataFrame(
-            {
-                "ID": X_test_meta["ID"],
-                "Model": "Stacking",
-                "Prediction_score": y_test_pred_prob_meta,
-                "Prediction_Label": y_test_pred_meta,
-            }
-        )
-        df_long["Prediction_Label"] = df_long["Prediction_Label"].replace(
-            {0: "Negative", 1: "Positive"}
-        )
-
-        merged_df = pd.merge(meta_info_, df_long, on="ID", how="inner").sort_values(by="ID")
-        write_to_csv(merged_df, dir_name / f"Infection_Prediction_Stacking_{n}_external.csv")
-
-    # TODO: ひとつ前のfor loopと内容が同じなので統合可能なはず。要確認。
-    # Combine all folds and create final label by majority vote
-    all_dfs = []
-    for n in range(5):
-        normalizer = artifacts.get_normalizer(n)
-        X_test = normalizer.transform(copiedX)
-        meta_model, y_test_pred_meta, y_test_pred_prob_meta, X_test_meta = train_stacking_model(
+    chunk_results = [
+        prediction_all_folds(
             artifacts,
-            dir_name,
             columns_to_process,
             exclude_columns,
-            X_test,
-            n,
+            [X_test_meta.iloc[start : start + chunk_size] for X_test_meta in X_test_metas],
+            ModelType.META,
+            tree_engine=tree_engine,
         )
-
-        df_long = pd.DataFrame(
-            {
-                "ID": X_test_meta["ID"],
-                f"Prediction_score_fold{n}": y_test_pred_prob_meta,
-                f"Prediction_Label_fold{n}": y_test_pred_meta,
-            }
+        for start in range(0, len(X_test_metas[0]), chunk_size)
+    ]
+    return [
+        (
+            np.concatenate([results[n][0] for results in chunk_results]),
+            np.concatenate([results[n][1] for results in chunk_results]),
         )
-        df_long[f"Prediction_Label_fold{n}"] = df_long[f"Prediction_Label_fold{n}"].replace(
-            {0: "Negative", 1: "Positive"}
-        )
-
-        all_dfs.append(df_long)
-
-    return all_dfs
+        for n in range(len(X_test_metas))
+    ]
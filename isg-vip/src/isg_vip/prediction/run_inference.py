@@ -1,80 +1,78 @@
 # SPDX-License-Identifier: GPL-3.0-only
 # SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
 
-from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
 from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
-from isg_vip.io.output_writer import write_to_csv
-from isg_vip.prediction.ensemble import (
-    get_train_categories_from_encoder,
-    prediction,
-    replace_unseen_categories,
-)
+from isg_vip.prediction.ensemble import prediction_all_folds
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+from isg_vip.preprocessing.category_lookup import CategoryCodes
+from isg_vip.utils.tracing import span
 
+BASE_SCORE_COLUMNS = [
+    "LightGBM score",
+    "LightGBM label",
+    "LogisticRegression score",
+    "LogisticRegression label",
+]
+"""Columns of the arrays returned by `base_model_scores`."""
 
-def predict_each_fold(
+
+def normalize_each_fold(artifacts: ISGModelArtifacts, copiedX: pd.DataFrame) -> list[pd.DataFrame]:
+    """Apply the normalizer of every fold to the feature matrix."""
+    X_tests = []
+    for n in range(5):
+        with span("normalize", fold=n) as s:
+            X_tests.append(artifacts.get_normalizer(n).transform(copiedX))
+            s.data(X_tests[n])
+    return X_tests
+
+
+def base_model_scores(
     artifacts: ISGModelArtifacts,
-    dir_name: Path,
     columns_to_process: list[str],
     exclude_columns: list[str],
-    meta_info_: pd.DataFrame,
-    copiedX: pd.DataFrame,
-):
-    """Predict specific times"""
-    for n in range(5):
-        # Normalize
-        normalizer = artifacts.get_normalizer(n)
-        X_test = normalizer.transform(copiedX)
-
-        # LightGBM prediction
-        final_model_lgb = artifacts.get_model(ModelType.LGB, n)
-        y_test_pred_label_lgb, y_test_pred_prob_lgb = prediction(
-            artifacts,
-            final_model_lgb,
-            columns_to_process,
-            exclude_columns,
-            X_test,
-            ModelType.LGB,
-            n,
-        )
+    X_tests: list[pd.DataFrame],
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+) -> list[np.ndarray]:
+    """
+    Score the LightGBM and LogisticRegression models of every fold.
 
-        # Logistic Regression prediction
-        final_model_lr = artifacts.get_model(ModelType.LR, n)
-        y_test_pred_label_lr, y_test_pred_prob_lr = prediction(
-            artifacts,
-            final_model_lr,
-            columns_to_process,
-            exclude_columns,
-            X_test,
-            ModelType.LR,
-            n,
-        )
+    :param X_tests: outputs of `normalize_each_fold`
+    :return: per fold, one row per row of `X_tests[n]` selected by `scored_mask`, and the
+        columns `BASE_SCORE_COLUMNS`
+    """
+    # Factorize categorical columns once for all folds and models
+    category_codes = CategoryCodes.from_frames(X_tests, columns_to_process)
 
-        # Ensure consistency by mapping out-of-vocabulary labels to 'unknown'
-        encoder = artifacts.get_encoder(ModelType.LGB, n)
-        train_categories = get_train_categories_from_encoder(encoder, columns_to_process)
-        X_test = replace_unseen_categories(
-            X_test, columns=columns_to_process, train_categories=train_categories
-        )
-        missing_values = X_test[X_test.isnull().any(axis=1)].index
-        X_test_final = X_test.drop(index=missing_values)
+    # LightGBM prediction
+    lgb_results = prediction_all_folds(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        X_tests,
+        ModelType.LGB,
+        tree_engine=tree_engine,
+        category_codes=category_codes,
+    )
 
-        # Build results DataFrame
-        df_long = pd.DataFrame(
-            {
-                "ID": list(X_test_final["ID"]) * 2,
-                "Model": ["LightGBM"] * len(X_test_final)
-                + ["LogisticRegression"] * len(X_test_final),
-                "Prediction_score": list(y_test_pred_prob_lgb) + list(y_test_pred_prob_lr),
-                "Prediction_Label": list(y_test_pred_label_lgb) + list(y_test_pred_label_lr),
-            }
-        )
-        df_long["Prediction_Label"] = df_long["Prediction_Label"].replace(
-            {0: "Negative", 1: "Positive"}
-        )
+    # Logistic Regression prediction
+    lr_results = prediction_all_folds(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        X_tests,
+        ModelType.LR,
+        linear_scorer=linear_scorer,
+        category_codes=category_codes,
+    )
 
-        # Merge & save
-        merged_df = pd.merge(meta_info_, df_long, on="ID", how="inner")
-        write_to_csv(merged_df, dir_name / f"Infection_Prediction_{n}.csv")
+    return [
+        np.column_stack([prob_lgb, label_lgb, prob_lr, label_lr]).astype(np.float64)
+        for (label_lgb, prob_lgb), (label_lr, prob_lr) in zip(lgb_results, lr_results)
+    ]
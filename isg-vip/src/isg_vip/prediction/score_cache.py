@@ -0,0 +1,202 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""On-disk cache of the base model scores of each sample.
+
+A sample is identified by a hash of its feature vector (per-gene values, `all_sum`,
+`h_species`, `order`; not its ID), the model checksum and the evaluators. Only samples
+missing from the cache go through LightGBM/LogisticRegression. The meta model input is
+z-scored over the whole batch, so it is always recomputed from the cached and fresh
+scores.
+
+Scores are computed row by row, so a cached score is the score of a fresh run, except
+for scikit-learn LogisticRegression whose BLAS sums depend on the number of rows and may
+differ in the last digit; with `FusedLinearScorer` outputs are identical.
+"""
+
+import copy
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.model_loader import ISGModelArtifacts
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.run_inference import BASE_SCORE_COLUMNS, base_model_scores
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+"""Increase when the key or the stored values change."""
+
+_ENTRY_BYTES = 256
+"""Approximate size of one entry on disk (key, scores of 5 folds, index)."""
+
+_SQL_VARIABLES = 900
+"""Keys per query (below the SQLite limit on bound variables)."""
+
+
+class ScoreCache:
+    """
+    SQLite file of base model scores, evicting the least recently used samples beyond
+    `max_bytes`.
+    """
+
+    def __init__(self, path: Path, model_checksum: str, max_bytes: int = 256 << 20):
+        """
+        :param path: cache file (created if missing)
+        :param model_checksum: see `model_checksum`
+        :param max_bytes: approximate maximum size of the cache file
+        """
+        if max_bytes < _ENTRY_BYTES:
+            raise ValueError(f"Score cache size is too small: {max_bytes} bytes")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_bytes // _ENTRY_BYTES
+        self._namespace = f"{CACHE_FORMAT_VERSION}:{model_checksum}"
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS scores "
+                "(key BLOB PRIMARY KEY, value BLOB NOT NULL, used INTEGER NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS scores_used ON scores (used)")
+
+    def for_evaluator(self, evaluator: str) -> "ScoreCache":
+        """Same cache file, keyed for scores computed by `evaluator`."""
+        view = copy.copy(self)
+        view._namespace = f"{self._namespace}:{evaluator}"
+        return view
+
+    def keys(self, X: pd.DataFrame) -> list[bytes]:
+        """Key of each row of a feature matrix (output of `build_feature_matrix`)."""
+        features = X.drop(columns="ID")
+        categorical = features.select_dtypes(exclude="number")
+        numeric = features.drop(columns=categorical.columns)
+
+        header = hashlib.blake2b(digest_size=16)
+        header.update(self._namespace.encode())
+        header.update("\0".join(map(str, features.columns)).encode())
+
+        values = np.ascontiguousarray(numeric.to_numpy(dtype=np.float64))
+        labels = (
+            categorical.astype(str).agg("\0".join, axis=1) if len(categorical.columns) else None
+        )
+        keys = []
+        for i in range(len(X)):
+            digest = header.copy()
+            digest.update(values[i].tobytes())
+            if labels is not None:
+                digest.update(labels.iat[i].encode())
+            keys.append(digest.digest())
+        return keys
+
+    def get(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        """Cached scores (folds x `BASE_SCORE_COLUMNS`, NaN for unscored folds) by key."""
+        found = {}
+        with self._lock, self._connection:
+            for start in range(0, len(keys), _SQL_VARIABLES):
+                chunk = list(set(keys[start : start + _SQL_VARIABLES]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, value FROM scores WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = np.frombuffer(value, dtype=np.float64).reshape(
+                        -1, len(BASE_SCORE_COLUMNS)
+                    )
+                self._connection.execute(
+                    f"UPDATE scores SET used = ? WHERE key IN ({placeholders})",
+                    [time.time_ns(), *chunk],
+                )
+        return found
+
+    def put(self, entries: dict[bytes, np.ndarray]):
+        """Store scores, then evict the least recently used entries beyond the size limit."""
+        used = time.time_ns()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO scores (key, value, used) VALUES (?, ?, ?)",
+                [
+                    (key, np.ascontiguousarray(value, dtype=np.float64).tobytes(), used)
+                    for key, value in entries.items()
+                ],
+            )
+            (n_entries,) = self._connection.execute("SELECT COUNT(*) FROM scores").fetchone()
+            if n_entries > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM scores WHERE key IN "
+                    "(SELECT key FROM scores ORDER BY used LIMIT ?)",
+                    (n_entries - self.max_entries,),
+                )
+                logger.info(f"Score cache: evicted {n_entries - self.max_entries} samples.")
+
+    def close(self):
+        self._connection.close()
+
+
+def base_model_scores_cached(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    X: pd.DataFrame,
+    X_tests: list[pd.DataFrame],
+    valid: np.ndarray,
+    score_cache: Optional[ScoreCache],
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+) -> np.ndarray:
+    """
+    `base_model_scores` at the position of the scored rows, scoring only the rows of `X`
+    missing from `score_cache`.
+
+    :param X: feature matrix normalized into `X_tests` (same rows)
+    :param valid: folds x rows, rows scored by the base models of each fold
+        (see `scored_mask`)
+    :return: folds x rows x `BASE_SCORE_COLUMNS`, NaN for the rows not scored
+    :raises ValueError: if the base models did not score the rows of `valid`
+    """
+    n_folds = len(X_tests)
+    scores = np.full((n_folds, len(X), len(BASE_SCORE_COLUMNS)), np.nan)
+    fresh = np.arange(len(X))
+    fresh_tests = X_tests
+    if score_cache is not None:
+        keys = score_cache.keys(X)
+        cached = score_cache.get(keys)
+        is_cached = np.array([key in cached for key in keys], dtype=bool)
+        for i in np.flatnonzero(is_cached):
+            scores[:, i] = cached[keys[i]]
+        fresh = np.flatnonzero(~is_cached)
+        fresh_tests = [X_test.iloc[fresh] for X_test in X_tests]
+        logger.info(f"Score cache: {len(X) - len(fresh)} cached, {len(fresh)} to score.")
+
+    if len(fresh):
+        fresh_scores = base_model_scores(
+            artifacts,
+            columns_to_process,
+            exclude_columns,
+            fresh_tests,
+            tree_engine=tree_engine,
+            linear_scorer=linear_scorer,
+        )
+        for n, fold_scores in enumerate(fresh_scores):
+            rows = fresh[valid[n, fresh]]
+            if len(fold_scores) != len(rows):
+                raise ValueError(
+                    f"Base models of fold {n}: {len(fold_scores)} scores for "
+                    f"{len(rows)} scored rows."
+                )
+            scores[n, rows] = fold_scores
+        if score_cache is not None:
+            score_cache.put({keys[i]: scores[:, i] for i in fresh})
+
+    return scores
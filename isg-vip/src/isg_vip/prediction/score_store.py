@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Raw per-fold model scores of a batch, kept for relabelling (`--scores_out`).
+
+The scores are stored in a NumPy `.npz` archive, without pickled objects: ::
+
+    ID, h_species, order     samples (found in the metadata), sorted by ID
+    base_models              "LightGBM", "LogisticRegression"
+    base_scores              folds x samples x base models
+    meta_scores              folds x samples
+    thresholds_{lgb,lr,meta} decision threshold of each fold
+
+Scores are NaN where a model did not score the sample. `isg-vip relabel` derives new
+labels from these scores without running the models again.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.constants import MetadataTsvCols
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+
+FORMAT_VERSION = 1
+"""Version of the layout of the archive."""
+
+METADATA_COLUMNS = [MetadataTsvCols.ID, MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]
+
+
+@dataclass
+class ScoreStore:
+    """Per-fold base and meta model scores of the samples of a batch."""
+
+    metadata: pd.DataFrame
+    """`ID`, `h_species` and `order` of each sample, sorted by ID."""
+    base_models: list[str]
+    base_scores: np.ndarray
+    """Folds x samples x `base_models` probabilities (NaN: not scored)."""
+    meta_scores: np.ndarray
+    """Folds x samples meta model probabilities (NaN: not scored)."""
+    thresholds: dict[ModelType, np.ndarray]
+    """Decision threshold of each fold, by model type."""
+
+    @staticmethod
+    def model_thresholds(artifacts: ISGModelArtifacts) -> dict[ModelType, np.ndarray]:
+        """Thresholds of the loaded models, as stored in a `ScoreStore`."""
+        return {
+            m_type: np.asarray(artifacts.get_threshold(m_type), dtype=np.float64)
+            for m_type in ModelType
+        }
+
+    def save(self, path: Path) -> None:
+        """Write the scores to `path` (a `.npz` archive, whatever the suffix)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Missing metadata values are stored as empty strings, written the same in CSV
+        metadata = {
+            col: self.metadata[col].astype(object).where(self.metadata[col].notna(), "")
+            for col in METADATA_COLUMNS
+        }
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(FORMAT_VERSION),
+                **{col: values.to_numpy(dtype=str) for col, values in metadata.items()},
+                base_models=np.array(self.base_models, dtype=str),
+                base_scores=self.base_scores,
+                meta_scores=self.meta_scores,
+                **{f"thresholds_{m_type.value}": t for m_type, t in self.thresholds.items()},
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "ScoreStore":
+        """
+        Read scores written by `save`.
+
+        :raises FileNotFoundError: if `path` does not exist
+        :raises ValueError: if `path` is not a score archive of this version
+        """
+        try:
+            archive = np.load(path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            if not Path(path).exists():
+                raise FileNotFoundError(f"Score file not found: {path}") from e
+            raise ValueError(f"{path} is not a score file: {e}") from e
+        with archive:
+            if "format_version" not in archive.files:
+                raise ValueError(f"{path} is not a score file.")
+            version = int(archive["format_version"])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported score file version {version}.")
+            return cls(
+                metadata=pd.DataFrame(
+                    {col: archive[col].astype(object) for col in METADATA_COLUMNS}
+                ),
+                base_models=[str(name) for name in archive["base_models"]],
+                base_scores=archive["base_scores"],
+                meta_scores=archive["meta_scores"],
+                thresholds={m_type: archive[f"thresholds_{m_type.value}"] for m_type in ModelType},
+            )
+
+    @property
+    def n_folds(self) -> int:
+        return self.meta_scores.shape[0]
@@ -0,0 +1,389 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Batch prediction split in shards of samples, e.g. over several machines.
+
+The meta model input is z-scored over the whole batch (see `z_score_base_scores`), so a
+sharded batch is predicted in four steps:
+
+1. per shard (`isg-vip --shard i/N`): base models on the samples of the shard, written
+   to a partial file (`ShardScores`);
+2. reduce (`isg-vip shard reduce`): mean and standard deviation of the meta model input
+   of each fold over the samples of every shard (`reduce_zscore_stats`);
+3. per shard (`isg-vip shard meta`): meta models, with the input z-scored by these
+   statistics (`score_shard_meta`);
+4. merge (`isg-vip shard merge`): the tables of the whole batch (`merge_shards`).
+
+The statistics are computed from the base model scores of every shard, sorted by ID, with
+the pandas operations of a single run. pandas sums these rows pairwise in row order, so
+counts, sums and sums of squares merged across shards would round differently and could
+change the meta model labels; the two score columns (16 bytes per sample and fold) are
+all the reduce step reads. Samples are assigned to shards by ID (see `in_shard`) and every
+row is scored independently, so the merged tables are those of a single run (with
+`FusedLinearScorer`, as for `predict_in_chunks`).
+"""
+
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.constants import MetadataTsvCols
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+from isg_vip.prediction.batch import PredictionTables
+from isg_vip.prediction.batch_index import BASE_MODELS, BatchIndex
+from isg_vip.prediction.ensemble import base_score_stats, score_meta_model
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.score_cache import ScoreCache
+from isg_vip.prediction.score_store import ScoreStore
+from isg_vip.prediction.streaming import score_base_in_chunks
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+
+FORMAT_VERSION = 1
+"""Version of the layout of the partial files."""
+
+METADATA_COLUMNS = [MetadataTsvCols.ID, MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]
+
+ZScoreStats = list[dict[str, tuple[float, float]]]
+"""Per fold, mean and standard deviation of each base model score (see `base_score_stats`)."""
+
+
+def _to_array(values: pd.Series) -> np.ndarray:
+    """
+    Column stored without pickled objects: text (missing values as empty strings), or
+    numbers as they are (e.g. numeric sample IDs, which are sorted as numbers).
+    """
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.to_numpy()
+    return values.astype(object).where(values.notna(), "").to_numpy(dtype=str)
+
+
+def _from_array(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind != "U":
+        return values
+    out = values.astype(object)
+    out[values == ""] = np.nan
+    return out
+
+
+@dataclass
+class ShardScores:
+    """
+    Base model results of the samples of a shard, and their meta model results once
+    scored (`score_shard_meta`). Rows are in the order of the scored feature matrix.
+    """
+
+    shard: tuple[int, int]
+    """`(i, N)`: shard i of N."""
+    metadata: pd.DataFrame
+    """`ID`, `h_species` and `order` of each row."""
+    metadata_rows: np.ndarray
+    """Row of each sample in the sample metadata (the order of `Infection_Prediction_{n}`)."""
+    valid: np.ndarray
+    """Folds x rows scored by the base models."""
+    base_scores: np.ndarray
+    """Folds x rows x `BASE_SCORE_COLUMNS`."""
+    hosts: list[pd.DataFrame]
+    """Per fold, the host columns of the normalized input."""
+    thresholds: dict[ModelType, np.ndarray]
+    """Output of `ScoreStore.model_thresholds`."""
+    meta_labels: Optional[np.ndarray] = None
+    """Folds x rows meta model labels (NaN: not scored)."""
+    meta_scores: Optional[np.ndarray] = None
+    """Folds x rows meta model scores (NaN: not scored)."""
+
+    @property
+    def n_folds(self) -> int:
+        return len(self.base_scores)
+
+    def index(self) -> BatchIndex:
+        """Row positions of the samples, with the masks of the scored models."""
+        index = BatchIndex(self.metadata[MetadataTsvCols.ID].to_numpy(), self.metadata)
+        for m_type, _ in BASE_MODELS:
+            index.set_mask(m_type, self.valid)
+        if self.meta_scores is not None:
+            index.set_mask(ModelType.META, ~np.isnan(self.meta_scores))
+        return index
+
+    def save(self, path: Path) -> None:
+        """Write the results to `path` (a `.npz` archive, whatever the suffix)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "format_version": np.array(FORMAT_VERSION),
+            "shard": np.array(self.shard),
+            "metadata_rows": self.metadata_rows,
+            "valid": self.valid,
+            "base_scores": self.base_scores,
+        }
+        for col in METADATA_COLUMNS:
+            arrays[col] = _to_array(self.metadata[col])
+        for col in self.hosts[0].columns:
+            arrays[f"hosts_{col}"] = np.stack([_to_array(hosts[col]) for hosts in self.hosts])
+        for m_type, thresholds in self.thresholds.items():
+            arrays[f"thresholds_{m_type.value}"] = thresholds
+        if self.meta_scores is not None:
+            arrays["meta_labels"] = self.meta_labels
+            arrays["meta_scores"] = self.meta_scores
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "ShardScores":
+        """
+        Read results written by `save`.
+
+        :raises FileNotFoundError: if `path` does not exist
+        :raises ValueError: if `path` is not a partial file of this version
+        """
+        try:
+            archive = np.load(path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            if not Path(path).exists():
+                raise FileNotFoundError(f"Partial file not found: {path}") from e
+            raise ValueError(f"{path} is not a partial file: {e}") from e
+        with archive:
+            if "format_version" not in archive.files or "shard" not in archive.files:
+                raise ValueError(f"{path} is not a partial file.")
+            version = int(archive["format_version"])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported partial file version {version}.")
+            host_columns = [key for key in archive.files if key.startswith("hosts_")]
+            hosts = {key[len("hosts_") :]: _from_array(archive[key]) for key in host_columns}
+            n_folds = len(archive["base_scores"])
+            scored = "meta_scores" in archive.files
+            index, count = (int(value) for value in archive["shard"])
+            return cls(
+                shard=(index, count),
+                metadata=pd.DataFrame({col: _from_array(archive[col]) for col in METADATA_COLUMNS}),
+                metadata_rows=archive["metadata_rows"],
+                valid=archive["valid"],
+                base_scores=archive["base_scores"],
+                hosts=[
+                    pd.DataFrame({col: values[n] for col, values in hosts.items()})
+                    for n in range(n_folds)
+                ],
+                thresholds={m_type: archive[f"thresholds_{m_type.value}"] for m_type in ModelType},
+                meta_labels=archive["meta_labels"] if scored else None,
+                meta_scores=archive["meta_scores"] if scored else None,
+            )
+
+
+def score_shard_base(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    meta_info_: pd.DataFrame,
+    gene_count_file: Path,
+    gene_list_path: Path,
+    shard: tuple[int, int],
+    chunk_size: Optional[int] = None,
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+    score_cache: Optional[ScoreCache] = None,
+    compact: bool = False,
+) -> ShardScores:
+    """
+    Step 1: base models on the samples of `shard`, `chunk_size` samples at a time (all at
+    once if None).
+
+    :param meta_info_: output of `load_sample_metadata` (all samples)
+    :raises ValueError: if the shard has fewer than 2 samples, or a sample ID is duplicated
+    """
+    index, base_scores, hosts = score_base_in_chunks(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        meta_info_,
+        gene_count_file,
+        gene_list_path,
+        chunk_size,
+        tree_engine=tree_engine,
+        linear_scorer=linear_scorer,
+        score_cache=score_cache,
+        compact=compact,
+        shard=shard,
+    )
+    if len(index) < 2:
+        # A single row would be normalized with another summation order (see
+        # `predict_in_chunks`)
+        raise ValueError(
+            f"Shard {shard[0]}/{shard[1]} has {len(index)} sample: at least 2 are required, "
+            "use fewer shards."
+        )
+    return ShardScores(
+        shard=shard,
+        metadata=meta_info_.iloc[index.meta_rows].reset_index(drop=True),
+        metadata_rows=index.meta_rows,
+        valid=index.masks[ModelType.LGB],
+        base_scores=base_scores,
+        hosts=hosts,
+        thresholds=ScoreStore.model_thresholds(artifacts),
+    )
+
+
+def _check_shards(shards: list[tuple[int, int]]):
+    """
+    :raises ValueError: unless `shards` are the shards 0 to N-1 of N, once each
+    """
+    if not shards:
+        raise ValueError("No partial file.")
+    n_shards = {count for _, count in shards}
+    if len(n_shards) != 1:
+        raise ValueError(f"Partial files of different numbers of shards: {sorted(n_shards)}")
+    count = n_shards.pop()
+    found = sorted(index for index, _ in shards)
+    if found != list(range(count)):
+        missing = sorted(set(range(count)) - set(found))
+        duplicated = sorted({i for i in found if found.count(i) > 1})
+        raise ValueError(
+            f"Partial files of {count} shards expected once each: missing {missing}, "
+            f"duplicated {duplicated}."
+        )
+
+
+def reduce_zscore_stats(partials: Iterable[ShardScores]) -> tuple[ZScoreStats, list[int]]:
+    """
+    Step 2: z-score statistics of the meta model input of each fold over every shard,
+    equal to those of a single run over the whole batch.
+
+    :param partials: results of step 1 of every shard (read one at a time)
+    :return: per fold, the statistics and the number of rows they are computed over
+    :raises ValueError: unless `partials` are the shards 0 to N-1 of N, once each
+    """
+    shards = []
+    fold_ids = None
+    fold_scores = None
+    for partial in partials:
+        shards.append(partial.shard)
+        if fold_ids is None:
+            fold_ids = [[] for _ in range(partial.n_folds)]
+            fold_scores = [[] for _ in range(partial.n_folds)]
+        index = partial.index()
+        for n in range(partial.n_folds):
+            rows, X_test_meta = index.base_score_frame(partial.base_scores[n], n)
+            fold_ids[n].append(index.ids[rows])
+            fold_scores[n].append(X_test_meta.to_numpy())
+    _check_shards(shards)
+
+    stats = []
+    counts = []
+    for ids, scores in zip(fold_ids, fold_scores):
+        # Rows sorted by ID, built as by `BatchIndex.base_score_frame`
+        order = np.argsort(np.concatenate(ids), kind="stable")
+        X_test_meta = pd.DataFrame(
+            np.concatenate(scores)[order], columns=[name for _, name in BASE_MODELS]
+        )
+        stats.append(base_score_stats(X_test_meta))
+        counts.append(len(X_test_meta))
+    return stats, counts
+
+
+def write_zscore_stats(stats: ZScoreStats, counts: list[int], path: Path) -> None:
+    """Write the output of `reduce_zscore_stats` as TSV (values round-trip exactly)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame(
+        [
+            {"fold": n, "model": model, "count": count, "mean": mean, "std": std}
+            for n, (fold_stats, count) in enumerate(zip(stats, counts))
+            for model, (mean, std) in fold_stats.items()
+        ]
+    )
+    df.to_csv(path, sep="\t", index=False, float_format="%.17g")
+
+
+def read_zscore_stats(path: Path) -> ZScoreStats:
+    """
+    Read statistics written by `write_zscore_stats`.
+
+    :raises FileNotFoundError: if `path` does not exist
+    :raises ValueError: if a fold lacks the statistics of a base model
+    """
+    if not Path(path).exists():
+        raise FileNotFoundError(f"z-score statistics not found: {path}")
+    df = pd.read_csv(path, sep="\t", float_precision="round_trip")
+    stats = []
+    for n, fold_stats in df.groupby("fold", sort=True):
+        values = {row.model: (row.mean, row.std) for row in fold_stats.itertuples()}
+        missing = [name for _, name in BASE_MODELS if name not in values]
+        if n != len(stats) or missing:
+            raise ValueError(f"{path}: incomplete statistics of fold {n}.")
+        stats.append(values)
+    return stats
+
+
+def score_shard_meta(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    partial: ShardScores,
+    stats: ZScoreStats,
+    meta_tree_engine: Optional[TreeEnsembleEngine] = None,
+) -> ShardScores:
+    """
+    Step 3: meta models on the samples of a shard, with the input z-scored by the
+    statistics of the whole batch.
+
+    :param partial: result of step 1
+    :param stats: output of `reduce_zscore_stats`
+    :return: `partial` with the meta model results
+    :raises ValueError: if the statistics are not those of the folds of `partial`
+    """
+    if len(stats) != partial.n_folds:
+        raise ValueError(f"z-score statistics of {len(stats)} folds, {partial.n_folds} expected.")
+    index = partial.index()
+    X_test_metas = [
+        index.meta_features(
+            partial.base_scores[n], partial.hosts[n], columns_to_process, n, stats[n]
+        )
+        for n in range(partial.n_folds)
+    ]
+    meta_results = score_meta_model(
+        artifacts, columns_to_process, exclude_columns, X_test_metas, tree_engine=meta_tree_engine
+    )
+
+    meta_labels = []
+    meta_scores = []
+    for n, (labels, probs) in enumerate(meta_results):
+        rows = X_test_metas[n][MetadataTsvCols.ID].to_numpy()
+        meta_labels.append(index.scatter(ModelType.META, n, labels, rows))
+        meta_scores.append(index.scatter(ModelType.META, n, probs, rows))
+    return replace(partial, meta_labels=np.stack(meta_labels), meta_scores=np.stack(meta_scores))
+
+
+def merge_shards(partials: list[ShardScores]) -> PredictionTables:
+    """
+    Step 4: every table of the whole batch, with the raw scores.
+
+    :param partials: results of step 3 of every shard
+    :raises ValueError: unless `partials` are the shards 0 to N-1 of N, once each, with
+        their meta model results
+    """
+    _check_shards([partial.shard for partial in partials])
+    unscored = [partial.shard[0] for partial in partials if partial.meta_scores is None]
+    if unscored:
+        raise ValueError(f"Shards without meta model results: {sorted(unscored)}")
+
+    metadata = pd.concat([partial.metadata for partial in partials], ignore_index=True)
+    metadata_rows = np.concatenate([partial.metadata_rows for partial in partials])
+    meta_info_ = metadata.iloc[np.argsort(metadata_rows, kind="stable")].reset_index(drop=True)
+    index = BatchIndex(metadata[MetadataTsvCols.ID].to_numpy(), meta_info_)
+
+    valid = np.concatenate([partial.valid for partial in partials], axis=1)
+    base_scores = np.concatenate([partial.base_scores for partial in partials], axis=1)
+    meta_labels = np.concatenate([partial.meta_labels for partial in partials], axis=1)
+    meta_scores = np.concatenate([partial.meta_scores for partial in partials], axis=1)
+    for m_type, _ in BASE_MODELS:
+        index.set_mask(m_type, valid)
+    index.set_mask(ModelType.META, ~np.isnan(meta_scores))
+
+    n_folds = len(base_scores)
+    return PredictionTables(
+        base=[index.base_table(base_scores[n], n) for n in range(n_folds)],
+        stacking=[index.stacking_table(meta_labels[n], meta_scores[n], n) for n in range(n_folds)],
+        predictions=index.predictions(meta_labels, meta_scores),
+        scores=index.score_store(base_scores, meta_scores, partials[0].thresholds),
+    )
@@ -0,0 +1,263 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Chunked (streaming) batch prediction.
+
+The meta model input is z-scored with the mean/std of the base model scores over the
+whole batch, so the batch is processed in two passes:
+
+1. per chunk of samples: build the features, score the base models and keep only the
+   per-sample results (scores, labels, host species/order).
+2. once every chunk is scored: write `Infection_Prediction_{n}.csv`, z-score the
+   complete score table in memory and run the meta model by chunks.
+
+Only one chunk of per-gene data is held at a time. The per-sample results of the chunks
+are concatenated into the rows of one `BatchIndex`, and the tables are gathered from them
+by row position. The statistics are computed from the
+complete score table with the same pandas operations as the in-memory run, so the meta
+model sees the same input. Scikit-learn LogisticRegression scores may differ in the last
+digit, as BLAS sums depend on the number of rows; with `FusedLinearScorer` every output
+file is identical to the in-memory run.
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.constants import MetadataTsvCols, OutputFormat, PerGeneCountTsvCols
+from isg_vip.io.data_loader import (
+    in_shard,
+    iter_per_gene_count_chunks,
+    normalize_per_gene_count,
+    read_per_gene_count,
+)
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+from isg_vip.io.output_writer import write_table
+from isg_vip.prediction.batch_index import BASE_MODELS, BatchIndex
+from isg_vip.prediction.ensemble import score_meta_model, scored_mask
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.run_inference import normalize_each_fold
+from isg_vip.prediction.score_cache import ScoreCache, base_model_scores_cached
+from isg_vip.prediction.score_store import ScoreStore
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+from isg_vip.preprocessing.feature_builder import build_feature_matrix
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_count_chunks(
+    gene_count_file: Path,
+    gene_list_path: Path,
+    chunk_size: Optional[int],
+    tmp_dir: Optional[Path],
+    shard: Optional[tuple[int, int]],
+) -> Iterator[pd.DataFrame]:
+    """Loaded per-gene counts by chunks of samples, or all at once if `chunk_size` is None."""
+    if chunk_size is not None:
+        yield from iter_per_gene_count_chunks(
+            gene_count_file, gene_list_path, chunk_size, tmp_dir, shard=shard
+        )
+        return
+
+    info = read_per_gene_count(gene_count_file)
+    if shard is not None:
+        info = info[in_shard(info[PerGeneCountTsvCols.SAMPLE_ID], shard)]
+        if info.empty:
+            return
+    yield normalize_per_gene_count(info, gene_list_path)
+
+
+def _iter_feature_chunks(
+    meta_info_: pd.DataFrame,
+    gene_count_file: Path,
+    gene_list_path: Path,
+    chunk_size: Optional[int],
+    tmp_dir: Optional[Path],
+    compact: bool = False,
+    shard: Optional[tuple[int, int]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Feature matrices of the chunks, with at least 2 samples each (unless the whole batch
+    has only 1): row means of a single-row frame are summed in a different order by
+    pandas, which would change the last digit of `mean_ISGscore`.
+    """
+    pending = None
+    for i, info in enumerate(
+        _iter_count_chunks(gene_count_file, gene_list_path, chunk_size, tmp_dir, shard)
+    ):
+        if info.empty:
+            logger.info(f"Chunk {i}: no sample passed the control count filter.")
+            continue
+        X = build_feature_matrix(info, meta_info_, compact=compact)
+        if X.empty:
+            logger.info(f"Chunk {i}: no sample found in the metadata.")
+            continue
+
+        if pending is None:
+            pending = X
+        elif len(pending) < 2 or len(X) < 2:
+            pending = pd.concat([pending, X], ignore_index=True)
+        else:
+            yield pending
+            pending = X
+
+    if pending is not None:
+        yield pending
+
+
+def score_base_in_chunks(
+    artifacts: ISGModelArtifacts,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    meta_info_: pd.DataFrame,
+    gene_count_file: Path,
+    gene_list_path: Path,
+    chunk_size: Optional[int],
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+    tmp_dir: Optional[Path] = None,
+    score_cache: Optional[ScoreCache] = None,
+    compact: bool = False,
+    shard: Optional[tuple[int, int]] = None,
+) -> tuple[BatchIndex, np.ndarray, list[pd.DataFrame]]:
+    """
+    Score the base models on the samples of `gene_count_file`, `chunk_size` samples at a
+    time (all at once if None).
+
+    :param shard: only score the samples of this shard (see `in_shard`)
+    :return: the index of the scored samples (with the masks of the base models), their
+        folds x rows x `BASE_SCORE_COLUMNS` scores, and per fold the `columns_to_process`
+        of the normalized input
+    :raises ValueError: if no sample is left to predict, or a sample ID is duplicated
+    """
+    n_folds = artifacts._N_FOLDS
+    chunk_ids = []
+    chunk_valid = []
+    chunk_scores = []
+    fold_hosts = [[] for _ in range(n_folds)]
+
+    for X in _iter_feature_chunks(
+        meta_info_, gene_count_file, gene_list_path, chunk_size, tmp_dir, compact, shard
+    ):
+        X_tests = normalize_each_fold(artifacts, X)
+        valid = np.stack([scored_mask(X_test, columns_to_process) for X_test in X_tests])
+        chunk_scores.append(
+            base_model_scores_cached(
+                artifacts,
+                columns_to_process,
+                exclude_columns,
+                X,
+                X_tests,
+                valid,
+                score_cache,
+                tree_engine=tree_engine,
+                linear_scorer=linear_scorer,
+            )
+        )
+        chunk_ids.append(X[MetadataTsvCols.ID].to_numpy())
+        chunk_valid.append(valid)
+        for n in range(n_folds):
+            fold_hosts[n].append(X_tests[n][columns_to_process])
+        logger.info(f"{len(X)} samples scored.")
+
+    if not chunk_ids:
+        in_shard_ = f" (shard {shard[0]}/{shard[1]})" if shard is not None else ""
+        raise ValueError(f"No sample to predict in {gene_count_file}{in_shard_}.")
+
+    index = BatchIndex(np.concatenate(chunk_ids), meta_info_)
+    valid = np.concatenate(chunk_valid, axis=1)
+    for m_type, _ in BASE_MODELS:
+        index.set_mask(m_type, valid)
+    hosts = [pd.concat(frames, ignore_index=True) for frames in fold_hosts]
+    return index, np.concatenate(chunk_scores, axis=1), hosts
+
+
+def predict_in_chunks(
+    artifacts: ISGModelArtifacts,
+    dir_name: Path,
+    columns_to_process: list[str],
+    exclude_columns: list[str],
+    meta_info_: pd.DataFrame,
+    gene_count_file: Path,
+    gene_list_path: Path,
+    chunk_size: int,
+    tree_engine: Optional[TreeEnsembleEngine] = None,
+    meta_tree_engine: Optional[TreeEnsembleEngine] = None,
+    linear_scorer: Optional[FusedLinearScorer] = None,
+    tmp_dir: Optional[Path] = None,
+    score_cache: Optional[ScoreCache] = None,
+    output_format: str = OutputFormat.CSV,
+    compact: bool = False,
+    scores_out: Optional[Path] = None,
+) -> list[pd.DataFrame]:
+    """
+    Predict the samples of `gene_count_file`, `chunk_size` samples at a time, writing
+    the per-fold tables to `dir_name`.
+
+    :param score_cache: base model scores of previously seen samples
+    :param output_format: file format and suffix of the tables (see `write_table`)
+    :param compact: float32 features with categorical host columns (see `--compact`)
+    :param scores_out: file to write the raw per-fold scores to (see `ScoreStore`)
+
+    :return: the content of `Infection_Prediction_Stacking_all.csv`
+    :raises ValueError: if no sample is left to predict, or a sample ID is duplicated
+    """
+    n_folds = artifacts._N_FOLDS
+
+    # Pass 1: base models
+    index, base_scores, hosts = score_base_in_chunks(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        meta_info_,
+        gene_count_file,
+        gene_list_path,
+        chunk_size,
+        tree_engine=tree_engine,
+        linear_scorer=linear_scorer,
+        tmp_dir=tmp_dir,
+        score_cache=score_cache,
+        compact=compact,
+    )
+    for n in range(n_folds):
+        write_table(
+            index.base_table(base_scores[n], n),
+            dir_name,
+            f"Infection_Prediction_{n}",
+            output_format,
+        )
+
+    # Pass 2: meta model, z-scored over the whole batch
+    X_test_metas = [
+        index.meta_features(base_scores[n], hosts[n], columns_to_process, n) for n in range(n_folds)
+    ]
+    meta_results = score_meta_model(
+        artifacts,
+        columns_to_process,
+        exclude_columns,
+        X_test_metas,
+        tree_engine=meta_tree_engine,
+        chunk_size=chunk_size,
+    )
+
+    meta_labels = []
+    meta_scores = []
+    for n, (labels, probs) in enumerate(meta_results):
+        rows = X_test_metas[n][MetadataTsvCols.ID].to_numpy()
+        meta_labels.append(index.scatter(ModelType.META, n, labels, rows))
+        meta_scores.append(index.scatter(ModelType.META, n, probs, rows))
+        write_table(
+            index.stacking_table(meta_labels[n], meta_scores[n], n),
+            dir_name,
+            f"Infection_Prediction_Stacking_{n}_external",
+            output_format,
+        )
+    meta_labels = np.stack(meta_labels)
+    meta_scores = np.stack(meta_scores)
+    if scores_out is not None:
+        thresholds = ScoreStore.model_thresholds(artifacts)
+        index.score_store(base_scores, meta_scores, thresholds).save(scores_out)
+    return index.predictions(meta_labels, meta_scores)
@@ -0,0 +1,325 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Pure-NumPy evaluation of the tree ensemble fold models.
+
+The trees of every fold model (LightGBM Booster or scikit-learn RandomForestClassifier)
+are compiled into flat node arrays and evaluated for a whole batch, all folds at once,
+with vectorized traversal. No OpenMP or LightGBM runtime is involved at prediction time.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+
+# Same as LightGBM kZeroThreshold (declared as a float literal: 1e-35f)
+_LGB_ZERO_THRESHOLD = float(np.float32(1e-35))
+
+_MISSING_NONE = 0
+_MISSING_ZERO = 1
+_MISSING_NAN = 2
+
+_LGB_MISSING_TYPES = {"None": _MISSING_NONE, "Zero": _MISSING_ZERO, "NaN": _MISSING_NAN}
+
+# Upper bound of (rows x trees) node indices held at once during traversal
+_BLOCK_NODES = 1 << 22
+
+
+@dataclass
+class _CompiledTrees:
+    """Flat node arrays of one fold model. Leaves point to themselves."""
+
+    feature: np.ndarray
+    threshold: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    default_left: np.ndarray
+    missing_type: np.ndarray
+    value: np.ndarray
+    roots: np.ndarray
+    max_depth: int
+    n_features: int
+    # Output transform
+    average: bool = False
+    sigmoid: float = 0.0
+    # scikit-learn trees compare float32-cast inputs
+    float32_input: bool = False
+    feature_names: Sequence[str] = ()
+
+
+class _NodeBuilder:
+    def __init__(self):
+        self.feature = []
+        self.threshold = []
+        self.left = []
+        self.right = []
+        self.default_left = []
+        self.missing_type = []
+        self.value = []
+
+    def add(self, feature=0, threshold=np.inf, default_left=True, missing_type=0, value=0.0):
+        idx = len(self.feature)
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(idx)
+        self.right.append(idx)
+        self.default_left.append(default_left)
+        self.missing_type.append(missing_type)
+        self.value.append(value)
+        return idx
+
+    def build(self, roots, max_depth, n_features, **kwargs) -> _CompiledTrees:
+        return _CompiledTrees(
+            feature=np.asarray(self.feature, dtype=np.intp),
+            threshold=np.asarray(self.threshold, dtype=np.float64),
+            left=np.asarray(self.left, dtype=np.intp),
+            right=np.asarray(self.right, dtype=np.intp),
+            default_left=np.asarray(self.default_left, dtype=bool),
+            missing_type=np.asarray(self.missing_type, dtype=np.int8),
+            value=np.asarray(self.value, dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            n_features=n_features,
+            **kwargs,
+        )
+
+
+def _compile_lgb_booster(booster: Any) -> _CompiledTrees:
+    """Compile a LightGBM Booster from its `dump_model()` representation."""
+    model = booster.dump_model()
+    if model["num_tree_per_iteration"] != 1:
+        raise NotImplementedError("Only single-output LightGBM models are supported.")
+
+    objective = model["objective"].split()
+    sigmoid = 0.0
+    if objective[0] in ("binary", "cross_entropy", "xentropy"):
+        sigmoid = 1.0
+        for param in objective[1:]:
+            if param.startswith("sigmoid:"):
+                sigmoid = float(param.split(":", 1)[1])
+    elif objective[0] not in ("regression", "regression_l2", "l2", "mean_squared_error", "mse"):
+        raise NotImplementedError(f"Unsupported LightGBM objective: {model['objective']}")
+    elif "sqrt" in objective[1:]:
+        raise NotImplementedError(f"Unsupported LightGBM objective: {model['objective']}")
+
+    builder = _NodeBuilder()
+    roots = []
+    max_depth = 0
+
+    def _walk(node: dict, depth: int) -> int:
+        nonlocal max_depth
+        max_depth = max(max_depth, depth)
+        if "leaf_value" in node:
+            return builder.add(value=float(node["leaf_value"]))
+        if node["decision_type"] != "<=":
+            raise NotImplementedError("Categorical LightGBM splits are not supported.")
+        idx = builder.add(
+            feature=node["split_feature"],
+            threshold=float(node["threshold"]),
+            default_left=node["default_left"],
+            missing_type=_LGB_MISSING_TYPES[node["missing_type"]],
+        )
+        builder.left[idx] = _walk(node["left_child"], depth + 1)
+        builder.right[idx] = _walk(node["right_child"], depth + 1)
+        return idx
+
+    for tree in model["tree_info"]:
+        roots.append(_walk(tree["tree_structure"], 0))
+
+    return builder.build(
+        roots,
+        max_depth,
+        model["max_feature_idx"] + 1,
+        average=model["average_output"],
+        sigmoid=sigmoid,
+        feature_names=(),
+    )
+
+
+def _compile_sklearn_forest(forest: Any) -> _CompiledTrees:
+    """Compile a fitted binary scikit-learn forest classifier."""
+    if len(forest.classes_) != 2:
+        raise NotImplementedError("Only binary scikit-learn classifiers are supported.")
+
+    builder = _NodeBuilder()
+    roots = []
+    max_depth = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        offset = len(builder.feature)
+        # scikit-learn (>= 1.4) stores class fractions, returned as is by predict_proba
+        value = tree.value[:, 0, 1]
+
+        is_leaf = tree.children_left == -1
+        missing_go_to_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count))
+        builder.feature.extend(np.where(is_leaf, 0, tree.feature).tolist())
+        builder.threshold.extend(np.where(is_leaf, np.inf, tree.threshold).tolist())
+        node_ids = np.arange(offset, offset + tree.node_count)
+        builder.left.extend(np.where(is_leaf, node_ids, tree.children_left + offset).tolist())
+        builder.right.extend(np.where(is_leaf, node_ids, tree.children_right + offset).tolist())
+        builder.default_left.extend(np.asarray(missing_go_to_left, dtype=bool).tolist())
+        builder.missing_type.extend([_MISSING_NAN] * tree.node_count)
+        builder.value.extend(value.tolist())
+
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+
+    return builder.build(
+        roots,
+        max_depth,
+        forest.n_features_in_,
+        average=True,
+        float32_input=True,
+        feature_names=tuple(getattr(forest, "feature_names_in_", ())),
+    )
+
+
+def compile_model(model: Any) -> _CompiledTrees:
+    """Compile a LightGBM Booster/LGBMClassifier or a scikit-learn forest."""
+    booster = getattr(model, "booster_", model)
+    if hasattr(booster, "dump_model"):
+        return _compile_lgb_booster(booster)
+    if hasattr(model, "estimators_"):
+        return _compile_sklearn_forest(model)
+    raise TypeError(f"Unsupported tree model: {type(model).__name__}")
+
+
+class TreeEnsembleEngine:
+    """
+    Vectorized NumPy evaluator for the tree models of all folds.
+
+    Predictions match `Booster.predict` / `predict_proba(X)[:, 1]` within floating point
+    rounding of the summation (< 1e-12).
+    """
+
+    def __init__(self, fold_models: Sequence[_CompiledTrees]):
+        self.fold_models = tuple(fold_models)
+
+        # Concatenate all folds into one node table
+        offsets = np.cumsum([0] + [len(m.feature) for m in self.fold_models[:-1]])
+        cat = lambda attr: np.concatenate(  # noqa: E731
+            [getattr(m, attr) for m in self.fold_models]
+        )
+        shift = lambda attr: np.concatenate(  # noqa: E731
+            [getattr(m, attr) + o for m, o in zip(self.fold_models, offsets)]
+        )
+        self._feature = cat("feature")
+        self._threshold = cat("threshold")
+        self._left = shift("left")
+        self._right = shift("right")
+        self._default_left = cat("default_left")
+        self._missing_type = cat("missing_type")
+        self._value = cat("value")
+        self._roots = shift("roots")
+        self._tree_fold = np.concatenate(
+            [np.full(len(m.roots), n, dtype=np.intp) for n, m in enumerate(self.fold_models)]
+        )
+        self._fold_tree_slices = []
+        start = 0
+        for m in self.fold_models:
+            self._fold_tree_slices.append(slice(start, start + len(m.roots)))
+            start += len(m.roots)
+        self._max_depth = max(m.max_depth for m in self.fold_models)
+        self._has_zero_missing = bool(np.any(self._missing_type == _MISSING_ZERO))
+
+    @classmethod
+    def from_models(cls, models: Sequence[Any]) -> "TreeEnsembleEngine":
+        return cls([compile_model(m) for m in models])
+
+    @classmethod
+    def from_artifacts(
+        cls, artifacts: ISGModelArtifacts, model_type: ModelType
+    ) -> "TreeEnsembleEngine":
+        return cls.from_models(
+            [artifacts.get_model(model_type, n) for n in range(artifacts._N_FOLDS)]
+        )
+
+    def _prepare(self, fold: int, X: Any) -> np.ndarray:
+        compiled = self.fold_models[fold]
+        if isinstance(X, pd.DataFrame):
+            if compiled.feature_names and list(X.columns) != list(compiled.feature_names):
+                raise ValueError(f"Fold {fold}: feature names do not match those seen during fit.")
+            X = X.to_numpy()
+        # float32 inputs (compact mode) are kept as is: thresholds are compared in float64
+        X = np.asarray(X)
+        dtype = np.float32 if X.dtype == np.float32 else np.float64
+        X = X.astype(dtype, copy=False)
+        if X.ndim != 2 or X.shape[1] != compiled.n_features:
+            raise ValueError(
+                f"Fold {fold}: expected {compiled.n_features} features, got shape {X.shape}."
+            )
+        if compiled.float32_input:
+            X = X.astype(np.float32).astype(dtype)
+        else:
+            # LightGBM drops |x| <= kZeroThreshold from dense rows (treated as 0)
+            X = np.where(np.abs(X) <= _LGB_ZERO_THRESHOLD, dtype(0.0), X)
+        return X
+
+    def predict(self, Xs: Sequence[Any]) -> list[np.ndarray]:
+        """
+        Score one input matrix per fold in a single traversal.
+
+        :param Xs: fold-ordered 2D arrays or DataFrames (columns in model feature order)
+        :return: fold-ordered 1D arrays of predicted scores
+        """
+        if len(Xs) != len(self.fold_models):
+            raise ValueError(f"Expected {len(self.fold_models)} inputs, got {len(Xs)}.")
+        prepared = [self._prepare(n, X) for n, X in enumerate(Xs)]
+        n_rows = max(X.shape[0] for X in prepared)
+        n_features = max(X.shape[1] for X in prepared)
+
+        # (folds, rows, features) tensor; rows beyond a fold's length are padding
+        stacked = np.zeros((len(prepared), n_rows, n_features), dtype=np.result_type(*prepared))
+        for n, X in enumerate(prepared):
+            stacked[n, : X.shape[0], : X.shape[1]] = X
+        check_missing = self._has_zero_missing or bool(np.isnan(stacked).any())
+
+        n_trees = len(self._roots)
+        block = max(1, _BLOCK_NODES // n_trees)
+        leaf_values = np.empty((n_rows, n_trees), dtype=np.float64)
+        for start in range(0, n_rows, block):
+            rows = np.arange(start, min(start + block, n_rows))
+            leaf_values[rows] = self._value[self._traverse(stacked, rows, check_missing)]
+
+        results = []
+        for n, (compiled, X) in enumerate(zip(self.fold_models, prepared)):
+            fold_values = leaf_values[: X.shape[0], self._fold_tree_slices[n]]
+            # Accumulate in tree order as LightGBM/scikit-learn do
+            score = np.zeros(X.shape[0], dtype=np.float64)
+            for t in range(fold_values.shape[1]):
+                score += fold_values[:, t]
+            if compiled.average:
+                score /= fold_values.shape[1]
+            if compiled.sigmoid:
+                score = 1.0 / (1.0 + np.exp(-compiled.sigmoid * score))
+            results.append(score)
+        return results
+
+    def _traverse(self, stacked: np.ndarray, rows: np.ndarray, check_missing: bool) -> np.ndarray:
+        n_folds, n_rows, n_features = stacked.shape
+        flat = stacked.reshape(-1)
+        # Offset of (fold of tree, row) in the flattened tensor
+        base = (self._tree_fold[None, :] * n_rows + rows[:, None]) * n_features
+        node = np.broadcast_to(self._roots, base.shape).copy()
+        for depth in range(self._max_depth):
+            x = flat.take(base + self._feature.take(node))
+            threshold = self._threshold.take(node)
+            if check_missing:
+                missing_type = self._missing_type.take(node)
+                is_nan = np.isnan(x)
+                x = np.where(is_nan & (missing_type != _MISSING_NAN), 0.0, x)
+                use_default = (
+                    (missing_type == _MISSING_ZERO) & (np.abs(x) <= _LGB_ZERO_THRESHOLD)
+                ) | ((missing_type == _MISSING_NAN) & is_nan)
+                go_left = np.where(use_default, self._default_left.take(node), x <= threshold)
+            else:
+                go_left = x <= threshold
+            node = np.where(go_left, self._left.take(node), self._right.take(node))
+            # Stop once every tree reached a leaf
+            if depth % 4 == 3 and np.array_equal(self._left.take(node), node):
+                break
+        return node
@@ -0,0 +1,199 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Python API of ISG-VIP, working on DataFrames already in memory."""
+
+from pathlib import Path
+from typing import Optional, Sequence
+
+import pandas as pd
+
+from isg_vip.io.data_loader import normalize_per_gene_count, rename_sample_metadata
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType, model_checksum
+from isg_vip.pipelines import COLUMNS_TO_PROCESS, EXCLUDE_COLUMNS, GENE_LIST_PATH, MODEL_DIR
+from isg_vip.prediction.batch import (
+    PredictionTables,
+    predict_feature_batches,
+    predict_feature_tables,
+)
+from isg_vip.prediction.linear_engine import FusedLinearScorer
+from isg_vip.prediction.score_cache import ScoreCache
+from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+from isg_vip.preprocessing.feature_builder import build_feature_matrix
+
+
+class Predictor:
+    """
+    Loaded models and the evaluators used to score them. No file is read or written by
+    the prediction methods.
+
+    `counts` are the rows of `per_gene_count.tsv` (`sample_id`, `hum_symbol`, `raw_count`,
+    `type`) and `metadata` the rows of `sample_metadata.tsv` (`sample_id`, `species_host`,
+    `order_host`). Other columns are ignored. ::
+
+        predictor = Predictor.load(tree_engine="numpy", fused_lr=True)
+        predictions = predictor.predict(counts, metadata)
+
+    The meta model input is z-scored over the samples of a call, so a call needs at least
+    2 samples and gives the same results as the command line on these samples.
+    """
+
+    def __init__(
+        self,
+        artifacts: ISGModelArtifacts,
+        tree_engine: str = "native",
+        fused_lr: bool = False,
+        gene_list_path: Path = GENE_LIST_PATH,
+        score_cache: Optional[ScoreCache] = None,
+        compact: bool = False,
+    ):
+        """
+        :param artifacts: loaded models
+        :param tree_engine: "native" (LightGBM/scikit-learn) or "numpy" (see `--tree_engine`)
+        :param fused_lr: score the LogisticRegression models as one matrix product
+            (see `--fused_lr`)
+        :param gene_list_path: genes of the model input
+        :param score_cache: reuse the base model scores of previously seen samples
+            (see `--score_cache`)
+        :param compact: float32 features with categorical host columns (see `--compact`)
+        """
+        if tree_engine not in ("native", "numpy"):
+            raise ValueError(f"Unknown tree engine: {tree_engine}")
+
+        self.artifacts = artifacts
+        self.gene_list_path = gene_list_path
+        self.compact = compact
+
+        self.tree_engine: Optional[TreeEnsembleEngine] = None
+        self.meta_tree_engine: Optional[TreeEnsembleEngine] = None
+        if tree_engine == "numpy":
+            self.tree_engine = TreeEnsembleEngine.from_artifacts(artifacts, ModelType.LGB)
+            self.meta_tree_engine = TreeEnsembleEngine.from_artifacts(artifacts, ModelType.META)
+
+        self.linear_scorer: Optional[FusedLinearScorer] = None
+        if fused_lr:
+            self.linear_scorer = FusedLinearScorer.from_artifacts(artifacts, COLUMNS_TO_PROCESS)
+
+        self.score_cache: Optional[ScoreCache] = None
+        if score_cache is not None:
+            # Scores of the evaluators may differ in the last digit
+            evaluator = f"tree_engine={tree_engine},fused_lr={fused_lr}"
+            if compact:
+                evaluator += ",compact"
+            self.score_cache = score_cache.for_evaluator(evaluator)
+
+    @classmethod
+    def load(
+        cls,
+        model_dir: Path = MODEL_DIR,
+        bundle_path: Optional[Path] = None,
+        checksums_path: Optional[Path] = None,
+        n_jobs: int = 1,
+        score_cache_path: Optional[Path] = None,
+        score_cache_bytes: int = 256 << 20,
+        **kwargs,
+    ) -> "Predictor":
+        """
+        Load the models (see `ISGModelArtifacts.load`) and create a predictor.
+
+        :param score_cache_path: score cache file, keyed by the checksum of the models
+        :param score_cache_bytes: approximate maximum size of the score cache
+        :param kwargs: passed to `Predictor`
+        """
+        artifacts = ISGModelArtifacts.load(
+            model_dir, bundle_path=bundle_path, checksums_path=checksums_path, n_jobs=n_jobs
+        )
+        if score_cache_path is not None:
+            kwargs["score_cache"] = ScoreCache(
+                score_cache_path, model_checksum(model_dir, checksums_path), score_cache_bytes
+            )
+        return cls(artifacts, **kwargs)
+
+    def features(
+        self, counts: pd.DataFrame, metadata: pd.DataFrame
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Model input of the samples in both `counts` and `metadata`.
+
+        Samples with a control gene count of 10000 or less are skipped.
+
+        :return: feature matrix and renamed metadata (`ID`, `h_species`, `order`)
+        """
+        info = normalize_per_gene_count(counts, self.gene_list_path)
+        meta_info_ = rename_sample_metadata(metadata)
+        return build_feature_matrix(info, meta_info_, compact=self.compact), meta_info_
+
+    def predict(self, counts: pd.DataFrame, metadata: pd.DataFrame) -> pd.DataFrame:
+        """
+        Per-fold meta model scores and labels, final mean score and majority vote label
+        (`Infection_Prediction_Stacking_all.csv`).
+
+        :raises ValueError: if fewer than 2 samples can be predicted
+        """
+        return self.predict_features([self._checked_features(counts, metadata)])[0]
+
+    def predict_tables(self, counts: pd.DataFrame, metadata: pd.DataFrame) -> PredictionTables:
+        """
+        Every table written by the command line, including the base and meta model
+        results of each fold.
+
+        :raises ValueError: if fewer than 2 samples can be predicted
+        """
+        X, meta_info_ = self._checked_features(counts, metadata)
+        return predict_feature_tables(
+            self.artifacts,
+            COLUMNS_TO_PROCESS,
+            EXCLUDE_COLUMNS,
+            X,
+            meta_info_,
+            tree_engine=self.tree_engine,
+            meta_tree_engine=self.meta_tree_engine,
+            linear_scorer=self.linear_scorer,
+            score_cache=self.score_cache,
+        )
+
+    def predict_many(
+        self, inputs: Sequence[tuple[pd.DataFrame, pd.DataFrame]]
+    ) -> list[pd.DataFrame]:
+        """
+        `predict` for several independent `(counts, metadata)` inputs, scored together.
+
+        :raises ValueError: if fewer than 2 samples of an input can be predicted
+        """
+        return self.predict_features(
+            [self._checked_features(counts, metadata) for counts, metadata in inputs]
+        )
+
+    def predict_features(
+        self, batches: Sequence[tuple[pd.DataFrame, pd.DataFrame]]
+    ) -> list[pd.DataFrame]:
+        """`predict_many` for outputs of `features`."""
+        return predict_feature_batches(
+            self.artifacts,
+            COLUMNS_TO_PROCESS,
+            EXCLUDE_COLUMNS,
+            batches,
+            tree_engine=self.tree_engine,
+            meta_tree_engine=self.meta_tree_engine,
+            linear_scorer=self.linear_scorer,
+            score_cache=self.score_cache,
+        )
+
+    def _checked_features(
+        self, counts: pd.DataFrame, metadata: pd.DataFrame
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        X, meta_info_ = self.features(counts, metadata)
+        check_sample_count(X)
+        return X, meta_info_
+
+
+def check_sample_count(X: pd.DataFrame):
+    """
+    :raises ValueError: if `X` has fewer than 2 samples; the meta model input is z-scored
+        over the samples, which is undefined for a single one.
+    """
+    if len(X) < 2:
+        raise ValueError(
+            f"At least 2 samples with metadata and enough control counts are required "
+            f"({len(X)} found)."
+        )
@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN_CATEGORY = "unknown"
+"""Training category used for values unseen by an encoder."""
+
+
+@dataclass(frozen=True)
+class CategoryCodes:
+    """
+    Categorical columns of a batch, factorized once.
+
+    Frames factorized together share `uniques`, so a single lookup per encoder column
+    maps every frame.
+    """
+
+    codes: dict[str, np.ndarray]
+    """Code of each row in `uniques[column]` (-1 for missing values)."""
+    uniques: dict[str, pd.Index]
+
+    @classmethod
+    def from_frames(
+        cls, frames: Sequence[pd.DataFrame], columns: Sequence[str]
+    ) -> list["CategoryCodes"]:
+        """Factorize `columns` of every frame in one pass per column."""
+        lengths = [len(df) for df in frames]
+        bounds = np.cumsum([0] + lengths)
+        codes = {}
+        uniques = {}
+        for col in columns:
+            values = np.concatenate([df[col].to_numpy(dtype=object) for df in frames])
+            codes[col], uniques[col] = pd.factorize(values)
+        return [
+            cls(
+                codes={col: codes[col][bounds[i] : bounds[i + 1]] for col in columns},
+                uniques=uniques,
+            )
+            for i in range(len(frames))
+        ]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: Sequence[str]) -> "CategoryCodes":
+        return cls.from_frames([df], columns)[0]
+
+
+class EncoderLookup:
+    """
+    Precompiled category -> one-hot column index of a fitted OneHotEncoder.
+
+    `transform` gives the same matrix as `encoder.transform` once the categories the
+    encoder has not learned are replaced by "unknown": unseen and missing values go to
+    the "unknown" column, or to no column when the encoder has not learned "unknown".
+    """
+
+    def __init__(self, encoder: Any):
+        if getattr(encoder, "drop_idx_", None) is not None or getattr(
+            encoder, "_infrequent_enabled", False
+        ):
+            raise NotImplementedError(
+                "Encoders with dropped/infrequent categories are not supported."
+            )
+
+        self.columns = list(encoder.feature_names_in_)
+        self.feature_names = list(encoder.get_feature_names_out(self.columns))
+        self.n_outputs = len(self.feature_names)
+        self.categories = {}
+        self.offsets = {}
+        self.unknown_index = {}
+        offset = 0
+        for col, cats in zip(self.columns, encoder.categories_):
+            categories = pd.Index(cats)
+            self.categories[col] = categories
+            self.offsets[col] = offset
+            self.unknown_index[col] = int(categories.get_indexer([UNKNOWN_CATEGORY])[0])
+            offset += len(categories)
+
+    def category_index(self, category_codes: CategoryCodes, col: str) -> np.ndarray:
+        """
+        Index of each row's category within the encoder categories of `col`
+        (-1 when it has no one-hot column).
+        """
+        index = self.categories[col].get_indexer(category_codes.uniques[col])
+        # Last entry is used for missing values (code == -1)
+        index = np.append(index, -1)
+        index[index < 0] = self.unknown_index[col]
+        return index[category_codes.codes[col]]
+
+    def transform(
+        self, category_codes: CategoryCodes, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Dense one-hot matrix (rows x `feature_names`).
+
+        :param out: array to fill (e.g. the columns of a larger feature block), of any
+            float dtype; a new float64 array by default
+        """
+        n_rows = len(category_codes.codes[self.columns[0]])
+        if out is None:
+            encoded = np.zeros((n_rows, self.n_outputs), dtype=np.float64)
+        else:
+            encoded = out
+            encoded[...] = 0.0
+        rows = np.arange(n_rows)
+        for col in self.columns:
+            index = self.category_index(category_codes, col)
+            has_column = index >= 0
+            encoded[rows[has_column], index[has_column] + self.offsets[col]] = 1.0
+        return encoded
@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from isg_vip.io.constants import (
+    LoadedPerGeneCountTsvCols,
+    MetadataTsvCols,
+    PerGeneCountTsvCols,
+)
+from isg_vip.utils.tracing import span
+
+
+def build_feature_matrix(info: DataFrame, meta_info: DataFrame, compact: bool = False) -> DataFrame:
+    """
+    Build the model input matrix from loaded per-gene counts and sample metadata.
+
+    The result has one row per sample found in both inputs (ordered by ID) and the columns
+    `ID`, `all_sum`, one `norm_cntl_log` column per gene (sorted by name), `h_species`
+    and `order`. Gene values are written into a single preallocated block instead of
+    going through pivot_table/update/concat.
+
+    :param info: output of `load_per_gene_count`
+    :type info: DataFrame
+    :param meta_info: output of `load_sample_metadata`
+    :type meta_info: DataFrame
+    :param compact: float32 values and categorical `h_species`/`order` (half the memory
+        of the feature matrix and of everything derived from it, see `--compact`)
+    :type compact: bool
+    :return: feature matrix `X`
+    :rtype: DataFrame
+    """
+    with span("build_feature_matrix") as s:
+        dtype = np.float32 if compact else np.float64
+        sample_codes, sample_ids = pd.factorize(info[PerGeneCountTsvCols.ID], sort=True)
+        gene_codes, genes = pd.factorize(info[PerGeneCountTsvCols.HUM_SYMBOL], sort=True)
+
+        # all_sum is constant within a sample; keep the groupby mean to match previous outputs
+        all_sum = (
+            info[LoadedPerGeneCountTsvCols.ALL_SUM]
+            .groupby(sample_codes, sort=True)
+            .mean()
+            .to_numpy()
+        )
+
+        # Sum duplicated (sample, gene) records, as pivot_table(aggfunc="sum") did
+        gene_sum = (
+            info[LoadedPerGeneCountTsvCols.NORM_CNTL_LOG]
+            .groupby([sample_codes, gene_codes], sort=False)
+            .sum()
+        )
+        values = np.zeros((len(sample_ids), len(genes)), dtype=dtype)
+        values[
+            gene_sum.index.get_level_values(0).to_numpy(),
+            gene_sum.index.get_level_values(1).to_numpy(),
+        ] = gene_sum.to_numpy()
+
+        # Inner join on ID, keeping the sample order of the count table
+        joined = pd.merge(
+            DataFrame({MetadataTsvCols.ID: sample_ids, "_row": np.arange(len(sample_ids))}),
+            meta_info[[MetadataTsvCols.ID, MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]],
+            on=MetadataTsvCols.ID,
+            how="inner",
+        )
+        rows = joined["_row"].to_numpy()
+
+        X = DataFrame(values[rows], columns=list(genes))
+        X.insert(0, MetadataTsvCols.ID, joined[MetadataTsvCols.ID].to_numpy())
+        X.insert(1, LoadedPerGeneCountTsvCols.ALL_SUM, all_sum[rows].astype(dtype))
+        for col in [MetadataTsvCols.H_SPECIES, MetadataTsvCols.ORDER]:
+            host = joined[col].to_numpy()
+            X[col] = pd.Categorical(host) if compact else host
+        s.data(X)
+        return X
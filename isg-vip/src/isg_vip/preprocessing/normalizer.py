@@ -1,15 +1,23 @@
 # SPDX-License-Identifier: GPL-3.0-only
 # SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
 
+from typing import Optional
+
 from pandas import DataFrame
 
 
-def cal_z(df: DataFrame, col_name: str):
+def cal_z(df: DataFrame, col_name: str, mean: Optional[float] = None, std: Optional[float] = None):
     """
     convert `col_name` z-score normalization
 
     :param df: modified dataframe
     :param col_name: target column for convert z-score
+    :param mean: mean to subtract (default: mean of the column)
+    :param std: standard deviation to divide by (default: standard deviation of the column)
     """
-    df[col_name] = (df[col_name] - df[col_name].mean()) / df[col_name].std()
+    if mean is None:
+        mean = df[col_name].mean()
+    if std is None:
+        std = df[col_name].std()
+    df[col_name] = (df[col_name] - mean) / std
     return df
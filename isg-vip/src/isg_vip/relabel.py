@@ -0,0 +1,151 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""`isg-vip relabel`: labels with other thresholds or vote rules, from stored scores.
+
+The scores are written by a prediction run with `--scores_out`; no model is loaded. ::
+
+    isg-vip --scores_out output/scores.npz
+    isg-vip relabel --scores output/scores.npz --vote unanimous --thresholds 0.4
+    isg-vip relabel --scores output/scores.npz --sweep 0 1 0.01 --labels truth.tsv
+"""
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+from isg_vip.io.constants import MetadataTsvCols, OutputFormat, VoteRule
+from isg_vip.pipelines import OUTPUT_DIR
+from isg_vip.utils.logger import setup_logger
+
+_LABELS = {"positive": True, "negative": False, "1": True, "0": False, "true": True, "false": False}
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="isg-vip relabel",
+        description="Relabel the samples of a prediction run from its stored scores "
+        "(--scores_out), with other thresholds or vote rules, or sweep the thresholds.",
+    )
+    parser.add_argument(
+        "--scores",
+        required=True,
+        help="Score file written by `isg-vip --scores_out`.",
+    )
+    parser.add_argument(
+        "--output",
+        required=False,
+        default=OUTPUT_DIR,
+        help="Output directory.",
+    )
+    parser.add_argument(
+        "--output_format",
+        required=False,
+        choices=OutputFormat.ALL,
+        default=OutputFormat.CSV,
+        help="Format of the result tables (see `isg-vip --output_format`).",
+    )
+    parser.add_argument(
+        "--thresholds",
+        required=False,
+        type=float,
+        nargs="+",
+        default=None,
+        help="Meta model threshold of each fold, or one threshold for every fold "
+        "(default: the thresholds of the models).",
+    )
+    parser.add_argument(
+        "--vote",
+        required=False,
+        choices=VoteRule.ALL,
+        default=VoteRule.MAJORITY,
+        help="Rule combining the labels of the folds into the final label.",
+    )
+    parser.add_argument(
+        "--mean_cutoff",
+        required=False,
+        type=float,
+        default=0.5,
+        help="Cutoff of the mean score of the folds (--vote mean).",
+    )
+    parser.add_argument(
+        "--sweep",
+        required=False,
+        type=float,
+        nargs=3,
+        default=None,
+        metavar=("START", "STOP", "STEP"),
+        help="Also count the positive samples of every vote rule at each threshold from "
+        "START to STOP (included), shared by every fold (Threshold_sweep table).",
+    )
+    parser.add_argument(
+        "--labels",
+        required=False,
+        default=None,
+        help="TSV of sample_id and label (Positive/Negative or 1/0): adds the confusion "
+        "counts, sensitivity and specificity to the threshold sweep.",
+    )
+    args = parser.parse_args(argv)
+    if args.sweep is not None and (args.sweep[2] <= 0 or args.sweep[1] < args.sweep[0]):
+        parser.error("--sweep: START <= STOP and STEP > 0 expected.")
+    if args.labels is not None and args.sweep is None:
+        parser.error("--labels is only used with --sweep.")
+    return args
+
+
+def read_labels(path: Path):
+    """
+    True label of each sample, by ID.
+
+    :raises ValueError: if a label is not Positive/Negative, 1/0 or True/False
+    """
+    import pandas as pd
+
+    labels = pd.read_csv(path, sep="\t", usecols=[MetadataTsvCols.SAMPLE_ID, "label"], dtype=str)
+    values = labels["label"].str.strip().str.lower()
+    unknown = sorted(set(values.dropna()) - set(_LABELS))
+    if unknown:
+        raise ValueError(f"Unknown labels in {path}: {unknown[:5]}")
+    return pd.Series(values.map(_LABELS).to_numpy(), index=labels[MetadataTsvCols.SAMPLE_ID])
+
+
+def sweep_thresholds(start: float, stop: float, step: float):
+    """Thresholds from `start` to `stop` (included) by `step`."""
+    import numpy as np
+
+    n = int(np.floor((stop - start) / step + 1e-9)) + 1
+    # Rounded, so that e.g. 0.3 is not 0.30000000000000004
+    return np.round(start + step * np.arange(n), 12)
+
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    logger_ = setup_logger(None, level=logging.INFO)
+
+    from isg_vip.io.output_writer import final_prediction_frame, write_table
+    from isg_vip.prediction.decision import relabel, threshold_sweep
+    from isg_vip.prediction.score_store import ScoreStore
+
+    output_dir = Path(args.output)
+    try:
+        store = ScoreStore.load(Path(args.scores))
+        predictions = relabel(store, args.thresholds, args.vote, args.mean_cutoff)
+        sweep = None
+        if args.sweep is not None:
+            truth = read_labels(Path(args.labels)) if args.labels else None
+            sweep = threshold_sweep(store, sweep_thresholds(*args.sweep), truth=truth)
+    except (FileNotFoundError, ValueError) as e:
+        logger_.critical(e)
+        exit(1)
+
+    logger_.info(f"{len(predictions)} samples relabelled (vote: {args.vote}).")
+    write_table(predictions, output_dir, "Infection_Prediction_Relabel_all", args.output_format)
+    write_table(
+        final_prediction_frame(predictions),
+        output_dir,
+        "Infection_Prediction_Relabel_final",
+        args.output_format,
+    )
+    if sweep is not None:
+        write_table(sweep, output_dir, "Threshold_sweep", args.output_format)
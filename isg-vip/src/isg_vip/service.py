@@ -0,0 +1,335 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""`isg-vip serve`: long-lived prediction service keeping the models loaded.
+
+Requests are JSON objects posted to `/predict` over a Unix socket or localhost HTTP:
+
+    {"counts": [{"sample_id": ..., "hum_symbol": ..., "raw_count": ..., "type": ...}, ...],
+     "metadata": [{"sample_id": ..., "species_host": ..., "order_host": ...}, ...]}
+
+`counts` and `metadata` hold the rows of `per_gene_count.tsv` and `sample_metadata.tsv`
+(a list of records or a mapping of column name to values). The response is
+`{"predictions": [...]}`, one record per sample with the columns of
+`Infection_Prediction_Stacking_all.csv`. Requests arriving together are micro-batched:
+their samples are scored in single model calls, while the meta model z-scores are
+computed per request as in a run on that request alone.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+
+from isg_vip.pipelines import (
+    add_model_arguments,
+    load_artifacts,
+    open_score_cache,
+    suppress_warnings,
+)
+from isg_vip.utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from isg_vip.predictor import Predictor
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    def __init__(self, X: "pd.DataFrame", meta_info_: "pd.DataFrame"):
+        self.X = X
+        self.meta_info_ = meta_info_
+        self.future: Future = Future()
+
+
+class PredictionService:
+    """
+    A predictor, and a worker thread scoring queued requests in micro-batches.
+
+    A micro-batch is closed when it holds `max_batch_size` samples or `max_wait` seconds
+    after its first request.
+    """
+
+    def __init__(
+        self,
+        predictor: "Predictor",
+        max_batch_size: int = 1024,
+        max_wait: float = 0.005,
+    ):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="isg-vip-batcher", daemon=True)
+        self._worker.start()
+
+    def predict(self, payload: dict) -> list[dict]:
+        """
+        Score one request (blocks until its micro-batch is done).
+
+        :raises ValueError: if the request is malformed
+        """
+        from isg_vip.predictor import check_sample_count
+
+        X, meta_info_ = self.predictor.features(*_parse_payload(payload))
+        if X.empty:
+            return []
+        check_sample_count(X)
+
+        request = _Request(X, meta_info_)
+        self._queue.put(request)
+        return _to_records(request.future.result())
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            n_samples = len(request.X)
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while n_samples < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+                n_samples += len(request.X)
+
+            self._score(batch)
+            if stop:
+                return
+
+    def _score(self, batch: list[_Request]):
+        try:
+            results = self._predict_batches(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            # Isolate the failing request(s)
+            for request in batch:
+                self._score([request])
+            return
+
+        logger.debug(f"Scored {len(batch)} requests ({sum(len(r.X) for r in batch)} samples).")
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+    def _predict_batches(self, batch: list[_Request]) -> list["pd.DataFrame"]:
+        return self.predictor.predict_features(
+            [(request.X, request.meta_info_) for request in batch]
+        )
+
+
+def _parse_payload(payload: Any) -> tuple["pd.DataFrame", "pd.DataFrame"]:
+    import pandas as pd
+
+    if not isinstance(payload, dict) or "counts" not in payload or "metadata" not in payload:
+        raise ValueError("Request must be a JSON object with 'counts' and 'metadata'.")
+    try:
+        counts = pd.DataFrame(payload["counts"])
+        metadata = pd.DataFrame(payload["metadata"])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid table: {e}") from e
+    if counts.empty:
+        raise ValueError("'counts' is empty.")
+    return counts, metadata
+
+
+def _to_records(df: "pd.DataFrame") -> list[dict]:
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "isg-vip"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(HTTPStatus.OK, {"status": "ok"})
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            predictions = self.server.service.predict(payload)
+        except (ValueError, KeyError) as e:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.exception("Prediction failed.")
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+            return
+        self._send(HTTPStatus.OK, {"predictions": predictions})
+
+    def _send(self, status: HTTPStatus, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(socket_path: Path):
+    """
+    Remove the socket left at `socket_path` by a previous server, if any.
+
+    :raises ValueError: if `socket_path` exists and is not a socket
+    """
+    if socket_path.is_socket():
+        socket_path.unlink()
+    elif socket_path.exists() or socket_path.is_symlink():
+        raise ValueError(f"Not a socket, refusing to replace it: {socket_path}")
+
+
+def create_server(service: PredictionService, socket_path: Optional[Path], host: str, port: int):
+    """
+    HTTP server on `socket_path` (Unix socket) if given, else on `host:port`.
+
+    :raises ValueError: if `socket_path` exists and is not a socket
+    """
+    if socket_path is not None:
+        remove_stale_socket(socket_path)
+        server = _UnixServer(str(socket_path), _Handler)
+    else:
+        server = _TCPServer((host, port), _Handler)
+    server.service = service
+    return server
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="isg-vip serve",
+        description="Keep the ISG-VIP models loaded and serve predictions over HTTP.",
+    )
+    parser.add_argument(
+        "--socket",
+        required=False,
+        default=None,
+        help="Listen on this Unix socket instead of TCP.",
+    )
+    parser.add_argument(
+        "--host",
+        required=False,
+        default="127.0.0.1",
+        help="TCP address to listen on.",
+    )
+    parser.add_argument(
+        "--port",
+        required=False,
+        type=int,
+        default=8765,
+        help="TCP port to listen on.",
+    )
+    parser.add_argument(
+        "--max_batch_size",
+        required=False,
+        type=int,
+        default=1024,
+        help="Maximum number of samples scored in one micro-batch.",
+    )
+    parser.add_argument(
+        "--batch_wait_ms",
+        required=False,
+        type=float,
+        default=5.0,
+        help="How long a micro-batch waits for more requests after the first one.",
+    )
+    add_model_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    logger_ = setup_logger(None, level=logging.INFO)
+    suppress_warnings()
+
+    from isg_vip.predictor import Predictor
+
+    # Checked before the models are loaded
+    socket_path = Path(args.socket) if args.socket else None
+    if socket_path is not None:
+        try:
+            remove_stale_socket(socket_path)
+        except ValueError as e:
+            logger_.critical(e)
+            exit(1)
+
+    checksums = Path(args.checksums) if args.checksums else None
+    artifacts = load_artifacts(
+        Path(args.model_bundle) if args.model_bundle else None,
+        checksums,
+        args.load_jobs,
+        logger_,
+    )
+    score_cache = open_score_cache(
+        Path(args.score_cache) if args.score_cache else None, args.score_cache_size, checksums
+    )
+    service = PredictionService(
+        Predictor(
+            artifacts,
+            tree_engine=args.tree_engine,
+            fused_lr=args.fused_lr,
+            score_cache=score_cache,
+            compact=args.compact,
+        ),
+        max_batch_size=args.max_batch_size,
+        max_wait=args.batch_wait_ms / 1000,
+    )
+
+    server = create_server(service, socket_path, args.host, args.port)
+    where = socket_path if socket_path is not None else f"http://{args.host}:{args.port}"
+    logger_.info(f"Serving predictions on {where} (pid {os.getpid()}).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path is not None and socket_path.is_socket():
+            socket_path.unlink()
@@ -0,0 +1,180 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""`isg-vip shard`: steps of a prediction run split in shards of samples, e.g. over
+several machines, giving the tables of a single run over the whole batch. ::
+
+    isg-vip --shard 0/4 --partial_out work/base_0.npz           # on each machine
+    isg-vip shard reduce --partials work/base_*.npz --stats_out work/zscore.tsv
+    isg-vip shard meta --partial work/base_0.npz --stats work/zscore.tsv \\
+        --partial_out work/scored_0.npz                          # on each machine
+    isg-vip shard merge --partials work/scored_*.npz --output output
+
+See `isg_vip.prediction.sharding`.
+"""
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+from isg_vip.io.constants import OutputFormat
+from isg_vip.pipelines import (
+    COLUMNS_TO_PROCESS,
+    EXCLUDE_COLUMNS,
+    OUTPUT_DIR,
+    add_model_arguments,
+    load_artifacts,
+    suppress_warnings,
+)
+from isg_vip.utils.logger import setup_logger
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="isg-vip shard",
+        description="Steps of a prediction run split in shards of samples (the first step "
+        "is `isg-vip --shard i/N --partial_out FILE`).",
+    )
+    steps = parser.add_subparsers(dest="step", required=True)
+
+    reduce = steps.add_parser(
+        "reduce",
+        help="Compute the z-score statistics of the meta model input over every shard.",
+    )
+    reduce.add_argument(
+        "--partials",
+        required=True,
+        nargs="+",
+        help="Partial files of every shard, written by `isg-vip --shard`.",
+    )
+    reduce.add_argument(
+        "--stats_out",
+        required=True,
+        help="z-score statistics file (TSV).",
+    )
+
+    meta = steps.add_parser(
+        "meta",
+        help="Score the meta models of a shard with the statistics of every shard.",
+    )
+    meta.add_argument(
+        "--partial",
+        required=True,
+        help="Partial file of the shard, written by `isg-vip --shard`.",
+    )
+    meta.add_argument(
+        "--stats",
+        required=True,
+        help="z-score statistics file, written by `isg-vip shard reduce`.",
+    )
+    meta.add_argument(
+        "--partial_out",
+        required=True,
+        help="Partial file of the shard with the meta model results (.npz).",
+    )
+    add_model_arguments(meta, base_models=False)
+
+    merge = steps.add_parser(
+        "merge",
+        help="Write the tables of the whole batch from the scored shards.",
+    )
+    merge.add_argument(
+        "--partials",
+        required=True,
+        nargs="+",
+        help="Partial files of every shard, written by `isg-vip shard meta`.",
+    )
+    merge.add_argument(
+        "--output",
+        required=False,
+        default=OUTPUT_DIR,
+        help="Output directory.",
+    )
+    merge.add_argument(
+        "--output_format",
+        required=False,
+        choices=OutputFormat.ALL,
+        default=OutputFormat.CSV,
+        help="Format of the result tables (see `isg-vip --output_format`).",
+    )
+    merge.add_argument(
+        "--scores_out",
+        required=False,
+        default=None,
+        help="Also write the raw per-fold scores to this file (see `isg-vip --scores_out`).",
+    )
+    merge.add_argument(
+        "--write_jobs",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of processes formatting large CSV tables (see `isg-vip --write_jobs`).",
+    )
+
+    args = parser.parse_args(argv)
+    if args.step == "merge" and args.write_jobs < 1:
+        parser.error("--write_jobs must be a positive integer.")
+    return args
+
+
+def reduce_step(args, logger_: logging.Logger):
+    from isg_vip.prediction.sharding import ShardScores, reduce_zscore_stats, write_zscore_stats
+
+    stats, counts = reduce_zscore_stats(ShardScores.load(Path(path)) for path in args.partials)
+    write_zscore_stats(stats, counts, Path(args.stats_out))
+    logger_.info(f"z-score statistics of {max(counts)} samples written to {args.stats_out}")
+
+
+def meta_step(args, logger_: logging.Logger):
+    from isg_vip.io.model_loader import ModelType
+    from isg_vip.prediction.sharding import ShardScores, read_zscore_stats, score_shard_meta
+    from isg_vip.prediction.tree_engine import TreeEnsembleEngine
+
+    partial = ShardScores.load(Path(args.partial))
+    stats = read_zscore_stats(Path(args.stats))
+    suppress_warnings()
+    artifacts = load_artifacts(
+        Path(args.model_bundle) if args.model_bundle else None,
+        Path(args.checksums) if args.checksums else None,
+        args.load_jobs,
+        logger_,
+    )
+    meta_tree_engine = None
+    if args.tree_engine == "numpy":
+        meta_tree_engine = TreeEnsembleEngine.from_artifacts(artifacts, ModelType.META)
+    partial = score_shard_meta(
+        artifacts,
+        COLUMNS_TO_PROCESS,
+        EXCLUDE_COLUMNS,
+        partial,
+        stats,
+        meta_tree_engine=meta_tree_engine,
+    )
+    partial.save(Path(args.partial_out))
+    logger_.info(f"Shard {partial.shard[0]}/{partial.shard[1]}: meta models scored.")
+
+
+def merge_step(args, logger_: logging.Logger):
+    from isg_vip.io.csv_writer import set_write_jobs
+    from isg_vip.prediction.sharding import ShardScores, merge_shards
+
+    set_write_jobs(args.write_jobs)
+    tables = merge_shards([ShardScores.load(Path(path)) for path in args.partials])
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tables.write(output_dir, args.output_format)
+    if args.scores_out is not None:
+        tables.scores.save(Path(args.scores_out))
+
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    logger_ = setup_logger(None, level=logging.INFO)
+
+    step = {"reduce": reduce_step, "meta": meta_step, "merge": merge_step}[args.step]
+    try:
+        step(args, logger_)
+    except (FileNotFoundError, ValueError) as e:
+        logger_.critical(e)
+        exit(1)
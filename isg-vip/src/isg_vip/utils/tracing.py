@@ -0,0 +1,208 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Timeline of the prediction stages, in the Chrome trace event format.
+
+The stages are wrapped in `span`, which records nothing unless a `Tracer` is active: ::
+
+    with Tracer() as tracer:
+        predictor.predict(counts, metadata)
+    tracer.write("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+
+Each span records its duration, the rows and bytes of the data it handles and, while
+tracemalloc is tracing, the peak memory allocated during the span. Memory is traced for
+the whole process: spans running in parallel threads (e.g. `--load_jobs`) share it.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+_active: Optional["Tracer"] = None
+
+
+class Span:
+    """Arguments of a recorded span, completed by the traced code."""
+
+    def __init__(self, args: dict):
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def data(self, data: Any):
+        """Record the rows and bytes of a DataFrame or array."""
+        self.args["rows"] = len(data)
+        if hasattr(data, "memory_usage"):
+            self.args["bytes"] = int(data.memory_usage(index=True).sum())
+        elif hasattr(data, "nbytes"):
+            self.args["bytes"] = int(data.nbytes)
+
+
+class _NullSpan(Span):
+    def __init__(self):
+        super().__init__({})
+
+    def set(self, **args):
+        pass
+
+    def data(self, data: Any):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects the spans run while it is active (`with tracer:`)."""
+
+    def __init__(self, trace_memory: bool = True):
+        """
+        :param trace_memory: record the peak memory of each span with tracemalloc, which
+            slows down the traced code
+        """
+        self.trace_memory = trace_memory
+        self.events: list[dict] = []
+        self._origin = time.perf_counter_ns()
+        self._local = threading.local()
+        self._threads: dict[int, str] = {}
+        self._started_tracemalloc = False
+        self._previous: Optional[Tracer] = None
+
+    def __enter__(self) -> "Tracer":
+        global _active
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._previous, _active = _active, self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = self._previous
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+            thread = threading.current_thread()
+            self._threads[thread.ident] = thread.name
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[Span]:
+        stack = self._stack()
+        memory = self.trace_memory and tracemalloc.is_tracing()
+        if memory:
+            # The peak is reset for this span: carry it over to the enclosing spans
+            current, peak = tracemalloc.get_traced_memory()
+            for frame in stack:
+                frame[1] = max(frame[1], peak)
+            tracemalloc.reset_peak()
+        frame = [current if memory else 0, 0]
+        stack.append(frame)
+
+        recorded = Span(dict(args))
+        start = time.perf_counter_ns()
+        try:
+            yield recorded
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            if memory:
+                _, peak = tracemalloc.get_traced_memory()
+                frame[1] = max(frame[1], peak)
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], frame[1])
+                recorded.args["peak_memory_bytes"] = frame[1] - frame[0]
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": "isg_vip",
+                    "ph": "X",
+                    "ts": (start - self._origin) / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": recorded.args,
+                }
+            )
+
+    def trace_events(self) -> list[dict]:
+        """Recorded spans, with the names of their threads."""
+        thread_names = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in self._threads.items()
+        ]
+        return thread_names + sorted(self.events, key=lambda event: event["ts"])
+
+    def write(self, path: Path):
+        """Write the trace as JSON (Chrome trace event format)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def span(name: str, **args) -> Iterator[Span]:
+    """
+    Record `name` in the active tracer, if any.
+
+    :param args: arguments of the span, e.g. the fold; rows and bytes are added through
+        `Span.data`
+    """
+    tracer = _active
+    if tracer is None:
+        yield _NULL_SPAN
+        return
+    with tracer.span(name, **args) as s:
+        yield s
+
+
+@contextmanager
+def trace_to(path: Optional[Path]) -> Iterator[None]:
+    """Trace the block and write the trace to `path`, even on error (None: disabled)."""
+    if path is None:
+        yield
+        return
+
+    tracer = Tracer()
+    try:
+        with tracer:
+            yield
+    finally:
+        tracer.write(path)
+
+
+@contextmanager
+def profiled(path: Optional[Path]) -> Iterator[None]:
+    """Run the block under cProfile and dump its statistics to `path` (None: disabled)."""
+    if path is None:
+        yield
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
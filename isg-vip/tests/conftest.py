@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+import importlib.util
+import warnings
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+from isg_vip.pipelines import GENE_LIST_PATH, MODEL_DIR
+
+BENCHMARKS_DIR = Path(__file__).resolve().parents[1] / "benchmarks"
+
+
+def load_benchmark(name: str):
+    """Module of `benchmarks/<name>.py`, whose helpers the tests reuse."""
+    spec = importlib.util.spec_from_file_location(name, BENCHMARKS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def artifacts() -> ISGModelArtifacts:
+    """Models of `model_dir` (the tests using them are skipped if they are missing)."""
+    try:
+        ISGModelArtifacts._source_paths(MODEL_DIR)
+    except FileNotFoundError as e:
+        pytest.skip(f"Model files not available: {e}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ISGModelArtifacts.load(MODEL_DIR)
+
+
+@pytest.fixture(scope="session")
+def cohort(artifacts) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    `per_gene_count.tsv` and `sample_metadata.tsv` rows of 300 synthetic samples over the
+    genes and hosts of the models (see `benchmarks/pipeline_stages.py`).
+    """
+    pipeline_stages = load_benchmark("pipeline_stages")
+    genes = pd.read_csv(GENE_LIST_PATH, header=None)[0].unique().tolist()
+    normalizer = artifacts.get_normalizer(0)
+    known_species = set(artifacts.get_encoder(ModelType.LGB, 0).categories_[0]) - {"unknown"}
+    group_info = normalizer.group_info.drop_duplicates("species")
+    group_info = group_info[group_info["species"].isin(known_species)]
+    species_order = dict(zip(group_info["species"], group_info["order"]))
+    return pipeline_stages.synthetic_cohort(
+        300, genes, set(normalizer.isg_list), species_order, seed=1
+    )
@@ -0,0 +1,92 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Scores of the default (float64) and compact (`--compact`) feature modes."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from isg_vip.io.model_loader import ModelType
+from isg_vip.pipelines import COLUMNS_TO_PROCESS, EXCLUDE_COLUMNS
+from isg_vip.prediction.ensemble import scored_mask
+from isg_vip.predictor import Predictor
+
+COMPACT_TOLERANCE = 1e-5
+"""Maximum absolute difference of the base model scores (see `benchmarks/compact_mode.py`)."""
+
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+
+@pytest.fixture(scope="module")
+def tables(artifacts, cohort):
+    return Predictor(artifacts).predict_tables(*cohort)
+
+
+@pytest.fixture(scope="module")
+def compact_tables(artifacts, cohort):
+    return Predictor(artifacts, compact=True).predict_tables(*cohort)
+
+
+def reference_base_scores(artifacts, X: pd.DataFrame, m_type: ModelType, fold: int) -> pd.Series:
+    """
+    Scores of a base model computed with scikit-learn and LightGBM on pandas frames: the
+    encoder itself, with unseen categories replaced by "unknown", and the numeric columns
+    concatenated with the one-hot columns.
+    """
+    X_test = artifacts.get_normalizer(fold).transform(X)
+    X_test = X_test[scored_mask(X_test, COLUMNS_TO_PROCESS)]
+    encoder = artifacts.get_encoder(m_type, fold)
+    categories = X_test[COLUMNS_TO_PROCESS].copy()
+    for col, known in zip(COLUMNS_TO_PROCESS, encoder.categories_):
+        categories[col] = categories[col].where(categories[col].isin(known), "unknown")
+    one_hot = encoder.transform(categories)
+    if hasattr(one_hot, "toarray"):
+        one_hot = one_hot.toarray()
+    features = pd.concat(
+        [
+            X_test[[col for col in X_test.columns if col not in EXCLUDE_COLUMNS]],
+            pd.DataFrame(
+                one_hot,
+                index=X_test.index,
+                columns=encoder.get_feature_names_out(COLUMNS_TO_PROCESS),
+            ),
+        ],
+        axis=1,
+    )
+    model = artifacts.get_model(m_type, fold)
+    if m_type == ModelType.LGB:
+        scores = model.predict(features)
+    else:
+        scores = model.predict_proba(features)[:, 1]
+    return pd.Series(scores, index=X_test["ID"].to_numpy())
+
+
+@pytest.mark.parametrize("fold", range(5))
+@pytest.mark.parametrize(
+    "m_type, model", [(ModelType.LGB, "LightGBM"), (ModelType.LR, "LogisticRegression")]
+)
+def test_default_mode_scores_exact(artifacts, cohort, tables, m_type, model, fold):
+    """Default mode scores are those of the models on float64 frames, to the last bit."""
+    X, _ = Predictor(artifacts).features(*cohort)
+    expected = reference_base_scores(artifacts, X, m_type, fold)
+    base = tables.base[fold]
+    base = base[base["Model"] == model]
+    assert len(base) > 0
+    actual = base["Prediction_score"].to_numpy()
+    np.testing.assert_array_equal(actual, expected.loc[base["ID"]].to_numpy())
+
+
+def test_compact_mode_within_tolerance(tables, compact_tables):
+    pairs = [
+        *zip(tables.base, compact_tables.base),
+        *zip(tables.stacking, compact_tables.stacking),
+        (tables.predictions, compact_tables.predictions),
+    ]
+    for expected, actual in pairs:
+        assert list(actual.columns) == list(expected.columns)
+        assert actual["ID"].tolist() == expected["ID"].tolist()
+    for expected, actual in zip(tables.base, compact_tables.base):
+        np.testing.assert_allclose(
+            actual["Prediction_score"], expected["Prediction_score"], rtol=0, atol=COMPACT_TOLERANCE
+        )
@@ -0,0 +1,29 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""Commands which do not predict anything import no heavy module, within the import-time
+budget of `benchmarks/import_budget.py`."""
+
+import os
+from pathlib import Path
+
+import pytest
+from conftest import load_benchmark
+
+import isg_vip
+
+import_budget = load_benchmark("import_budget")
+
+
+@pytest.mark.parametrize("command", import_budget.COMMANDS, ids=" ".join)
+def test_import_budget(monkeypatch, command):
+    # The commands run in a new interpreter, which must find this source tree
+    src_dir = str(Path(isg_vip.__file__).resolve().parents[1])
+    monkeypatch.setenv(
+        "PYTHONPATH", os.pathsep.join(filter(None, [src_dir, os.environ.get("PYTHONPATH")]))
+    )
+
+    runs = [import_budget.measure(command) for _ in range(3)]
+    heavy = set(import_budget.HEAVY_MODULES) & runs[0][1]
+    assert not heavy, f"isg_vip {' '.join(command)} imports {sorted(heavy)}"
+    assert min(ms for ms, _ in runs) <= import_budget.BUDGET_MS
@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: GPL-3.0-only
+# SPDX-FileCopyrightText: Copyright 2026 Hiroaki Unno & Jumpei Ito
+
+"""`ISGModelArtifacts.load` with a compiled model bundle: reused while the model files are
+unchanged, rebuilt when they change or when the bundle cannot be read."""
+
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from isg_vip.io.model_loader import ISGModelArtifacts, ModelType
+from isg_vip.pipelines import MODEL_DIR
+
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+
+@pytest.fixture
+def model_dir(tmp_path) -> Path:
+    try:
+        ISGModelArtifacts._source_paths(MODEL_DIR)
+    except FileNotFoundError as e:
+        pytest.skip(f"Model files not available: {e}")
+    return Path(shutil.copytree(MODEL_DIR, tmp_path / "model_dir"))
+
+
+@pytest.fixture
+def bundle_path(model_dir, tmp_path) -> Path:
+    bundle_path = tmp_path / "model_bundle.bin"
+    ISGModelArtifacts.compile_bundle(model_dir, bundle_path)
+    return bundle_path
+
+
+@pytest.fixture
+def compiled(monkeypatch) -> list:
+    """Bundles compiled by `ISGModelArtifacts.load`."""
+    compiled = []
+    compile_bundle = ISGModelArtifacts.compile_bundle.__func__
+
+    def counting_compile_bundle(cls, model_dir, bundle_path, *args, **kwargs):
+        compiled.append(bundle_path)
+        return compile_bundle(cls, model_dir, bundle_path, *args, **kwargs)
+
+    monkeypatch.setattr(ISGModelArtifacts, "compile_bundle", classmethod(counting_compile_bundle))
+    return compiled
+
+
+def test_bundle_reused(model_dir, bundle_path, compiled):
+    # Same content with a new modification time: hashed again, still valid
+    threshold_path = model_dir / "thresholds_lgb.npy"
+    stat = threshold_path.stat()
+    os.utime(threshold_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    artifacts = ISGModelArtifacts.load(model_dir, bundle_path=bundle_path)
+    assert compiled == []
+    np.testing.assert_array_equal(
+        artifacts.get_threshold(ModelType.LGB), np.load(model_dir / "thresholds_lgb.npy")
+    )
+
+
+def test_bundle_rebuilt_when_model_file_changes(model_dir, bundle_path, compiled):
+    threshold_path = model_dir / "thresholds_lgb.npy"
+    thresholds = np.load(threshold_path) * 0.5
+    np.save(threshold_path, thresholds)
+
+    artifacts = ISGModelArtifacts.load(model_dir, bundle_path=bundle_path)
+    assert compiled == [bundle_path]
+    np.testing.assert_array_equal(artifacts.get_threshold(ModelType.LGB), thresholds)
+
+    # The rebuilt bundle is reused
+    ISGModelArtifacts.load(model_dir, bundle_path=bundle_path)
+    assert compiled == [bundle_path]
+
+
+@pytest.mark.parametrize("keep", [0, 4, 12, 0.01, 0.5, 0.99])
+def test_truncated_bundle_rebuilt(model_dir, bundle_path, compiled, keep):
+    data = bundle_path.read_bytes()
+    size = keep if isinstance(keep, int) else int(len(data) * keep)
+    bundle_path.write_bytes(data[:size])
+
+    with pytest.raises(ValueError):
+        ISGModelArtifacts.from_bundle(bundle_path, model_dir=model_dir)
+    ISGModelArtifacts.load(model_dir, bundle_path=bundle_path)
+    assert compiled == [bundle_path]
+    ISGModelArtifacts.from_bundle(bundle_path, model_dir=model_dir)
+
+
+def test_corrupt_bundle_rebuilt(model_dir, bundle_path, compiled):
+    data = bytearray(bundle_path.read_bytes())
+    # Overwrite the start of the pickle, after the header and the buffer table
+    header_size = int.from_bytes(data[8:16], "little")
+    n_buffers = int.from_bytes(data[24 + header_size : 32 + header_size], "little")
+    pickle_start = 32 + header_size + 16 * n_buffers
+    data[pickle_start : pickle_start + 16] = b"\xff" * 16
+    bundle_path.write_bytes(bytes(data))
+
+    ISGModelArtifacts.load(model_dir, bundle_path=bundle_path)
+    assert compiled == [bundle_path]